@@ -0,0 +1,2 @@
+# Benchmarks for security_manager, run each one from the repo root as a module,
+# e.g. python -m benchmarks.bench_task_memory
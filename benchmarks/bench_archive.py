@@ -0,0 +1,65 @@
+# Load time with and without the archive, for a fixed number of open tasks and
+# a growing history of completed ones. Also reports the archive's compressed
+# size and the time to stream a query over it.
+#
+#   python -m benchmarks.bench_archive --open 10000 --history 0,100000,1000000
+
+import argparse
+import csv
+import datetime
+import os
+import tempfile
+
+from security_manager import FIELDNAMES
+from task_archive import archiveUser, archiveInfo, iterArchive
+from task_journal import TaskJournal
+from task_store import TaskStore
+from benchmarks.common import syntheticRows, timeIt
+
+
+def writeUserFile(path, open_count, history_count):
+    '''A user file with open tasks due from 2026 and completed ones due in 2024'''
+    with open(path, "w", newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDNAMES)
+        for number, row in enumerate(syntheticRows(open_count + history_count)):
+            if number < history_count:
+                row[1] = row[1][:6] + "2024"
+                row[4] = "Completed"
+            else:
+                row[1] = row[1][:6] + "2026"
+                row[4] = "Not Yet" if row[4] == "Completed" else row[4]
+            writer.writerow(row)
+
+
+def load(path):
+    return TaskJournal(path).load(TaskStore)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--open", type=int, default=10_000, help="open tasks in every file")
+    parser.add_argument("--history", default="0,100000,1000000", help="comma separated completed task counts")
+    parser.add_argument("--compression", default="gzip", choices=["gzip", "lzma"])
+    args = parser.parse_args()
+
+    today = datetime.date(2025, 6, 1)
+    print(f"{'completed':>10} {'load (s)':>10} {'archived load (s)':>18} {'archive (s)':>12} "
+          f"{'csv bytes':>12} {'archive bytes':>14} {'query (s)':>10}")
+    print("-" * 92)
+    with tempfile.TemporaryDirectory() as folder:
+        for history in map(int, args.history.split(",")):
+            path = os.path.join(folder, f"user{history}.csv")
+            writeUserFile(path, args.open, history)
+            size = os.path.getsize(path)
+            before = timeIt(lambda: load(path))
+            archive = timeIt(lambda: archiveUser(path, days=30, compression=args.compression, today=today))
+            after = timeIt(lambda: load(path), repeat=3)
+            compressed = archiveInfo(path)["bytes"]
+            query = timeIt(lambda: sum(1 for _ in iterArchive(path, lambda row: row.priority == "A", rows=True)))
+            print(f"{history:>10,} {before:>10.3f} {after:>18.3f} {archive:>12.3f} "
+                  f"{size:>12,} {compressed:>14,} {query:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# Closing out a scan campaign one task at a time against one where operation.
+#
+# One at a time is what the menu does: find each task, change or delete it and
+# save, for every task. The where operations change all of them in one pass
+# over the store and save once.
+#
+#   python -m benchmarks.bench_bulk --tasks 1000,5000,10000
+
+import argparse
+import datetime
+import os
+import tempfile
+
+from security_manager import taskToRow
+from task_journal import TaskJournal, journalPath
+from task_store import TaskStore
+from benchmarks.common import writeSyntheticFile, timeIt
+
+
+CUTOFF = datetime.date(2025, 1, 1)
+
+
+def oneAtATime(path):
+    journal = TaskJournal(path)
+    tasks = journal.load(TaskStore)
+    for task in tasks.findTasks(category="Desktop", priority="C"):
+        if task.getStatus() != "Completed":
+            task.setStatus("Completed")
+            journal.saveChanges(tasks)
+    for task in tasks.findTasks(status="Completed", due_before=CUTOFF):
+        del tasks[tasks.positionOf(task)]
+        journal.saveChanges(tasks)
+    journal.close()
+    return len(tasks)
+
+
+def bulk(path):
+    journal = TaskJournal(path)
+    tasks = journal.load(TaskStore)
+    tasks.updateWhere({"status": "Completed"}, category="Desktop", priority="C")
+    tasks.deleteWhere(status="Completed", due_before=CUTOFF)
+    journal.saveChanges(tasks)
+    journal.close()
+    return len(tasks)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", default="1000,5000,10000", help="comma separated task counts")
+    args = parser.parse_args()
+
+    print(f"{'tasks':>8} {'one at a time (s)':>18} {'where (s)':>10} {'speedup':>8}")
+    print("-" * 48)
+    with tempfile.TemporaryDirectory() as folder:
+        for count in map(int, args.tasks.split(",")):
+            path = os.path.join(folder, f"user{count}.csv")
+            results = {}
+            times = {}
+            for name, function in (("one", oneAtATime), ("bulk", bulk)):
+                writeSyntheticFile(path, count)
+                if os.path.exists(journalPath(path)): # left by the run before
+                    os.remove(journalPath(path))
+                times[name] = timeIt(lambda: function(path))
+                results[name] = [taskToRow(task) for task in TaskJournal(path).load()]
+            assert results["one"] == results["bulk"]
+            print(f"{count:>8,} {times['one']:>18.3f} {times['bulk']:>10.3f} {times['one'] / times['bulk']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# Bytes written to disk per edit as the number of tasks grows.
+#
+# Each size gets a synthetic user file, loaded into a TaskStore like main()
+# does. Random tasks then get a new status through their setters and the
+# dirty tasks are saved with TaskJournal.saveChanges, with the journal
+# compacted whenever it passes its size threshold. The bytes per edit
+# (including the compactions) are compared with rewriting the whole user
+# file after every edit.
+#
+#   python -m benchmarks.bench_edit_bytes --sizes 1000,10000,100000 --edits 2000
+
+import argparse
+import os
+import random
+import tempfile
+
+from security_manager import STATUSES
+from task_journal import TaskJournal
+from task_metrics import METRICS
+from task_store import TaskStore
+from benchmarks.common import writeSyntheticFile
+
+
+SIZES = [1000, 10_000, 100_000, 1_000_000]
+
+
+def measure(folder, size, edits, seed=1):
+    '''Average bytes written per edit with saveChanges, and the size of a full rewrite'''
+    path = writeSyntheticFile(os.path.join(folder, f"bench{size}.csv"), size)
+    rewrite = os.path.getsize(path)
+    journal = TaskJournal(path)
+    store = journal.load(TaskStore)
+    rng = random.Random(seed)
+
+    METRICS.reset()
+    METRICS.enabled = True
+    try:
+        for _ in range(edits):
+            task = store[rng.randrange(size)]
+            task.setStatus(rng.choice([status for status in STATUSES if status != task.getStatus()]))
+            journal.saveChanges(store)
+            journal.compactIfNeeded(store)
+        journal.close()
+        written = METRICS.getBytes("journal.append") + METRICS.getBytes("writeToFile")
+        compactions = METRICS.getCount("journal.compact")
+    finally:
+        METRICS.enabled = False
+        METRICS.reset()
+    return written / edits, rewrite, compactions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)), help="comma separated task counts")
+    parser.add_argument("--edits", type=int, default=2000, help="edits saved per size")
+    args = parser.parse_args()
+
+    print(f"{'tasks':>10} {'bytes/edit':>12} {'compactions':>12} {'full rewrite':>14}")
+    print("-" * 51)
+    with tempfile.TemporaryDirectory() as folder:
+        for size in map(int, args.sizes.split(",")):
+            per_edit, rewrite, compactions = measure(folder, size, args.edits)
+            print(f"{size:>10,} {per_edit:>12,.0f} {compactions:>12} {rewrite:>14,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+# Throughput of the fleet report as worker processes are added.
+#
+#   python -m benchmarks.bench_fleet_report --users 2000 --tasks 200
+
+import argparse
+import os
+import tempfile
+
+from user_reports import fleetReport
+from benchmarks.common import writeSyntheticFile, timeIt
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000, help="number of synthetic user files")
+    parser.add_argument("--tasks", type=int, default=200, help="tasks in each user file")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        for number in range(args.users):
+            writeSyntheticFile(os.path.join(folder, f"user{number:05d}.csv"), args.tasks, seed=number)
+
+        workers = 1
+        counts = []
+        while workers < args.max_workers:
+            counts.append(workers)
+            workers *= 2
+        counts.append(args.max_workers)
+
+        total = args.users * args.tasks
+        print(f"{args.users:,} users x {args.tasks:,} tasks")
+        print(f"{'workers':>8} {'seconds':>9} {'tasks/s':>12} {'speedup':>8} {'efficiency':>11}")
+        print("-" * 52)
+        serial = None
+        for count in counts:
+            seconds = timeIt(lambda: fleetReport(folder, workers=count), repeat=2)
+            serial = serial or seconds
+            speedup = serial / seconds
+            print(f"{count:>8} {seconds:>9.3f} {total / seconds:>12,.0f} {speedup:>8.2f} {speedup / count:>11.0%}")
+
+
+if __name__ == "__main__":
+    main()
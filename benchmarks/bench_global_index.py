@@ -0,0 +1,90 @@
+# Cross-user query with the global index against parsing every user file.
+# The query times include opening the index and reading its shards, as every
+# query command does. Also reports the time to build the index, to refresh it
+# after one user changed and to update it through writeToFile (which appends
+# to the user's shard log).
+#
+#   python -m benchmarks.bench_global_index --users 2000 --tasks 200
+
+import argparse
+import datetime
+import os
+import tempfile
+
+from security_manager import readFromFile, writeToFile, parseDueDate
+from task_index import buildIndex, GlobalIndex, IndexWatcher
+from user_reports import findUserFiles
+from benchmarks.common import writeSyntheticFile, timeIt
+
+
+TODAY = datetime.date(2026, 1, 1)
+
+
+def scan(folder):
+    '''The question answered without the index: users with overdue open priority A desktop tasks'''
+    found = {}
+    for path in findUserFiles(folder):
+        for position, task in enumerate(readFromFile(path)):
+            if task.getPriority() == "A" and task.getCategory() == "Desktop" and task.getStatus() != "Completed":
+                due_date = parseDueDate(task.getDueDate())
+                if due_date is not None and due_date < TODAY:
+                    found.setdefault(os.path.splitext(os.path.basename(path))[0], []).append(position)
+    return found
+
+
+QUERY = {"priority": "A", "category": "Desktop", "exclude": {"status": "Completed"}, "due_before": TODAY}
+
+
+def find(folder):
+    return GlobalIndex(folder).find(**QUERY)
+
+
+def count(folder):
+    return GlobalIndex(folder).count(**QUERY)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000, help="number of synthetic user files")
+    parser.add_argument("--tasks", type=int, default=200, help="tasks in each user file")
+    parser.add_argument("--shards", type=int, default=64)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        for number in range(args.users):
+            writeSyntheticFile(os.path.join(folder, f"user{number:05d}.csv"), args.tasks, seed=number)
+        print(f"{args.users:,} users x {args.tasks:,} tasks, {args.shards} shards")
+
+        build = timeIt(lambda: buildIndex(folder, args.shards))
+        load = timeIt(lambda: GlobalIndex(folder).getUsers()) # reads every shard
+        found = find(folder)
+        assert found == scan(folder)
+        assert count(folder) == {user: len(positions) for user, positions in found.items()}
+        counted = timeIt(lambda: count(folder), repeat=5)
+        indexed = timeIt(lambda: find(folder), repeat=5)
+        scanned = timeIt(lambda: scan(folder))
+        index = GlobalIndex(folder)
+        unchanged = timeIt(index.refresh)
+
+        path = os.path.join(folder, "user00000.csv")
+        tasks = readFromFile(path)
+        watcher = IndexWatcher(folder)
+        hooked = timeIt(lambda: writeToFile(path, tasks))
+        watcher.close()
+        plain = timeIt(lambda: writeToFile(path, tasks))
+        writeSyntheticFile(path, args.tasks, seed=args.users) # changed behind the index's back
+        stale = timeIt(index.refresh)
+
+        print(f"{'build (s)':<32} {build:>10.3f}")
+        print(f"{'open, read every shard (s)':<32} {load:>10.3f}")
+        print(f"{'open + count (ms)':<32} {counted * 1000:>10.2f}  ({sum(map(len, found.values())):,} tasks)")
+        print(f"{'open + find positions (ms)':<32} {indexed * 1000:>10.2f}")
+        print(f"{'query parsing every file (ms)':<32} {scanned * 1000:>10.2f}")
+        print(f"{'refresh, nothing changed (ms)':<32} {unchanged * 1000:>10.2f}")
+        print(f"{'refresh, one user changed (ms)':<32} {stale * 1000:>10.2f}")
+        print(f"{'writeToFile with index (ms)':<32} {hooked * 1000:>10.2f}")
+        print(f"{'writeToFile without (ms)':<32} {plain * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
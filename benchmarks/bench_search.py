@@ -0,0 +1,58 @@
+# Keyword search with the SearchIndex compared to scanning every task's
+# details, plus the time to build, save and load the index.
+#
+#   python -m benchmarks.bench_search --tasks 1000000
+
+import argparse
+import os
+import tempfile
+
+from benchmarks.common import writeSyntheticFile, timeIt
+from task_journal import TaskJournal
+from task_search import SearchIndex, tokenize
+from task_store import TaskStore
+
+
+QUERIES = ["antivirus", "patch firewall", "back rout", "audit pin 12345"]
+
+
+def scan(tasks, query):
+    '''The search without an index: every word of the query must start a word of the details'''
+    terms = tokenize(query)
+    found = []
+    for task in tasks:
+        words = tokenize(task.getTaskDetails())
+        if all(any(word.startswith(term) for word in words) for term in terms):
+            found.append(task)
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = writeSyntheticFile(os.path.join(folder, "bench.csv"), args.tasks)
+        store = TaskJournal(path).load(TaskStore)
+
+        index = None
+        def build():
+            nonlocal index
+            index = SearchIndex(store)
+        print(f"build index       {timeIt(build):>10.3f} s   ({index.getWordCount():,} words)")
+        print(f"save index        {timeIt(lambda: index.save(path)):>10.3f} s")
+        print(f"load index        {timeIt(lambda: SearchIndex.load(store, path).close()):>10.3f} s")
+
+        print(f"\n{'query':<20} {'matches':>9} {'index (ms)':>11} {'scan (ms)':>10}")
+        print("-" * 53)
+        for query in QUERIES:
+            matches = len(index.search(query))
+            indexed = timeIt(lambda: index.search(query), repeat=5) * 1000
+            scanned = timeIt(lambda: scan(store, query)) * 1000
+            print(f"{query:<20} {matches:>9,} {indexed:>11.2f} {scanned:>10.0f}")
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
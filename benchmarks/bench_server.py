@@ -0,0 +1,125 @@
+# Load generator for task_server: latency percentiles and throughput.
+#
+# Starts the server in its own process on a Unix socket, then runs a number of
+# clients at once, each sending a mix of view, filter, update and add requests.
+# For comparison it also times what every main() session pays up front, loading
+# a user file from disk.
+#
+#   python -m benchmarks.bench_server --users 50 --tasks 1000 --clients 20 --requests 500
+
+import argparse
+import asyncio
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from task_journal import TaskJournal
+from task_server import TaskClient
+from benchmarks.common import PRIORITIES, STATUSES, writeSyntheticFile, timeIt
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# share of each kind of request in the mix
+MIX = [("view", 50), ("filter", 20), ("update", 20), ("add", 10)]
+
+
+def percentile(sorted_values, percent):
+    '''Value below which percent of the (already sorted) values fall'''
+    return sorted_values[round(percent / 100 * (len(sorted_values) - 1))]
+
+
+def randomRequest(rng, users, tasks):
+    op = rng.choices([op for op, _ in MIX], [weight for _, weight in MIX])[0]
+    fields = {"user": rng.choice(users)}
+    if op == "view":
+        fields.update(offset=rng.randrange(max(1, tasks - 20)), limit=20, sort=rng.choice([None, "due", "priority"]))
+    elif op == "filter":
+        fields.update(priority=rng.choice(PRIORITIES), exclude={"status": "Completed"}, limit=20)
+    elif op == "update":
+        fields.update(task=rng.randint(1, tasks), status=rng.choice(STATUSES))
+    else:
+        fields.update(details="Benchmark Task", due_date="01/01/2026", priority="A", category="Desktop", status="Not Yet")
+    return op, fields
+
+
+async def runClient(path, users, tasks, requests, seed, latencies):
+    rng = random.Random(seed)
+    client = await TaskClient.connect(path)
+    try:
+        for _ in range(requests):
+            op, fields = randomRequest(rng, users, tasks)
+            start = time.perf_counter()
+            response = await client.request(op, **fields)
+            latencies.append(time.perf_counter() - start)
+            if not response["ok"]:
+                raise RuntimeError(f"{op} failed: {response['error']}")
+    finally:
+        await client.close()
+
+
+async def runLoad(path, users, tasks, clients, requests):
+    # every user is loaded once before timing, so the numbers are for hot data
+    warm_up = await TaskClient.connect(path)
+    for user in users:
+        await warm_up.request("view", user=user, limit=1)
+    await warm_up.close()
+
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        runClient(path, users, tasks, requests, seed, latencies) for seed in range(clients)
+    ))
+    return sorted(latencies), time.perf_counter() - start
+
+
+def waitForSocket(path, server, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(path):
+        if server.poll() is not None or time.monotonic() > deadline:
+            raise RuntimeError("the server didn't start")
+        time.sleep(0.05)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--tasks", type=int, default=1000, help="tasks per user")
+    parser.add_argument("--clients", type=int, default=20, help="clients sending requests at once")
+    parser.add_argument("--requests", type=int, default=500, help="requests per client")
+    parser.add_argument("--flush-interval", type=float, default=1.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        users = [f"user{number:04d}" for number in range(args.users)]
+        for seed, user in enumerate(users):
+            writeSyntheticFile(os.path.join(folder, f"{user}.csv"), args.tasks, seed)
+        load_time = timeIt(lambda: TaskJournal(os.path.join(folder, f"{users[0]}.csv")).load(), 5)
+
+        path = os.path.join(folder, "tasks.sock")
+        server = subprocess.Popen(
+            [sys.executable, "-m", "task_server", "--socket", path, "--folder", folder,
+             "--flush-interval", str(args.flush_interval)],
+            cwd=ROOT, stdout=subprocess.DEVNULL
+        )
+        try:
+            waitForSocket(path, server)
+            latencies, elapsed = asyncio.run(runLoad(path, users, args.tasks, args.clients, args.requests))
+        finally:
+            server.send_signal(signal.SIGTERM) # saves everything before exiting
+            server.wait()
+
+    total = len(latencies)
+    print(f"{args.users} users x {args.tasks:,} tasks, {args.clients} clients x {args.requests} requests")
+    print(f"loading one user file (every main() session): {load_time * 1000:.2f} ms")
+    print(f"requests/s: {total / elapsed:,.0f}")
+    print(f"latency p50: {percentile(latencies, 50) * 1000:.3f} ms")
+    print(f"latency p99: {percentile(latencies, 99) * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# Startup time of the security_manager entry points, from python -X importtime
+# and the wall clock time of whole runs.
+#
+# Import time is what our modules (and the standard library modules they pull
+# in) add on top of a bare interpreter. The quick read-only --list command has a
+# budget and must not load the modules that are only needed later (storage
+# backends other than csv, reporting, the menu's store, search and writer,
+# argparse and so on).
+#
+# test_security_manager always checks the lazy modules, and the best of a few
+# runs against the 50 ms the command must stay well under, since one run on a
+# busy machine easily takes half as long again. Set
+# SECURITY_MANAGER_STRICT_STARTUP=1 to hold it to the budget itself.
+#
+#   python -m benchmarks.bench_startup --runs 20
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, "security_manager.py")
+
+# import time in ms that python security_manager.py --list may add to a bare interpreter
+LIST_IMPORT_BUDGET_MS = 30
+
+# what the test suite allows unless SECURITY_MANAGER_STRICT_STARTUP is set, under the 50 ms --list must stay under
+LIST_IMPORT_LIMIT_MS = 45
+
+# modules that only load on first use, never for --list
+LAZY_MODULES = [
+    "argparse", "tempfile", "json", "sqlite3", "multiprocessing", "glob", "traceback",
+    "task_store", "task_search", "task_writer", "task_batch", "task_archive", "task_index", "user_reports"
+]
+
+COMMANDS = {
+    "import security_manager": ["-c", "import security_manager"],
+    "--list USER": [SCRIPT, "--list", "alice"],
+    "menu modules": ["-c", "import security_manager, task_storage, task_store, task_search, task_writer"],
+}
+
+
+def importTimes(arguments, cwd=None):
+    '''Run python -X importtime with the arguments, returns module -> (self, cumulative) microseconds'''
+    result = subprocess.run([sys.executable, "-X", "importtime"] + arguments, cwd=cwd, stdin=subprocess.DEVNULL,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+                            env=dict(os.environ, PYTHONPATH=ROOT))
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def addedImportTime(arguments, cwd=None):
+    '''Import time in ms of the modules a command loads that a bare interpreter doesn't, and those modules'''
+    bare = importTimes(["-c", "pass"])
+    times = importTimes(arguments, cwd)
+    added = {name: stats for name, stats in times.items() if name not in bare}
+    return sum(own for own, _ in added.values()) / 1000, added
+
+
+def makeUserFolder(folder, tasks=20):
+    '''A users/ folder with one user, alice, to list'''
+    from benchmarks.common import writeSyntheticFile # imported here so the test's own startup stays small
+    os.makedirs(os.path.join(folder, "users"), exist_ok=True)
+    writeSyntheticFile(os.path.join(folder, "users", "alice.csv"), tasks)
+
+
+def wallTime(arguments, cwd, runs):
+    '''Best wall clock time in ms of running python with the arguments'''
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + arguments, cwd=cwd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                       env=dict(os.environ, PYTHONPATH=ROOT), check=True)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=20, help="runs of each command, the best is shown")
+    parser.add_argument("--top", type=int, default=8, help="slowest modules to show for each command")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        makeUserFolder(folder)
+        bare = wallTime(["-c", "pass"], folder, args.runs)
+        print(f"bare interpreter: {bare:.1f} ms")
+        print(f"{'command':<26} {'wall (ms)':>10} {'over bare':>10} {'imports (ms)':>13} {'modules':>8}")
+        print("-" * 71)
+        slowest = {}
+        for name, arguments in COMMANDS.items():
+            wall = wallTime(arguments, folder, args.runs)
+            added, modules = min((addedImportTime(arguments, folder) for _ in range(3)), key=lambda result: result[0])
+            print(f"{name:<26} {wall:>10.1f} {wall - bare:>10.1f} {added:>13.1f} {len(modules):>8}")
+            slowest[name] = sorted(modules.items(), key=lambda item: -item[1][0])[:args.top]
+        print(f"\n--list import budget: {LIST_IMPORT_BUDGET_MS} ms (test suite limit {LIST_IMPORT_LIMIT_MS} ms)")
+        for name, modules in slowest.items():
+            print(f"\nslowest imports for {name} (self ms):")
+            for module, (own, _) in modules:
+                print(f"  {module:<24} {own / 1000:>6.2f}")
+
+
+if __name__ == "__main__":
+    main()
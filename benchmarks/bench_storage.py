@@ -0,0 +1,70 @@
+# Add, update, delete and filter latency of the CSV and SQLite storage backends.
+#
+#   python -m benchmarks.bench_storage --tasks 10000 --ops 200
+
+import argparse
+import datetime
+import os
+import random
+import tempfile
+import time
+
+from security_manager import SecurityTask
+from task_storage import CsvBackend, SqliteBackend
+from benchmarks.common import syntheticRows
+
+
+def latency(function, ops):
+    '''Mean milliseconds per call of function(number) over ops calls'''
+    start = time.perf_counter()
+    for number in range(ops):
+        function(number)
+    return (time.perf_counter() - start) * 1000 / ops
+
+
+def benchBackend(backend, tasks, ops, seed=1):
+    rng = random.Random(seed)
+    user = "bench"
+    backend.writeTasks(user, tasks)
+    new_task = SecurityTask("Benchmark Task", "01/01/2026", "A", "Desktop", "Not Yet")
+    size = len(tasks)
+
+    def update(number):
+        backend.replaceTask(user, rng.randrange(size), new_task)
+
+    def delete(number):
+        backend.removeTask(user, rng.randrange(size - number - 1))
+
+    return {
+        "add": latency(lambda number: backend.appendTask(user, new_task), ops),
+        "update": latency(update, ops),
+        "delete": latency(delete, ops),
+        "filter": latency(lambda number: backend.queryTasks(
+            user, priority="A", exclude={"status": "Completed"}, due_before=datetime.date(2025, 1, 1)
+        ), max(1, ops // 10))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=10000)
+    parser.add_argument("--ops", type=int, default=200, help="operations timed for each kind of change")
+    args = parser.parse_args()
+
+    tasks = [SecurityTask(*row) for row in syntheticRows(args.tasks)]
+    with tempfile.TemporaryDirectory() as folder:
+        backends = {
+            "csv": CsvBackend(os.path.join(folder, "users")),
+            "sqlite": SqliteBackend(os.path.join(folder, "tasks.db"))
+        }
+        print(f"{args.tasks:,} tasks, mean ms per operation")
+        print(f"{'backend':<8} {'add':>9} {'update':>9} {'delete':>9} {'filter':>9}")
+        print("-" * 48)
+        for name, backend in backends.items():
+            results = benchBackend(backend, tasks, args.ops)
+            backend.close()
+            print(f"{name:<8} {results['add']:>9.3f} {results['update']:>9.3f} {results['delete']:>9.3f} {results['filter']:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+# Benchmark suite for the load, change and save cycle of security_manager.
+#
+# For user files from 10 to 1,000,000 synthetic tasks it times readFromFile,
+# loading the way main() does (journal replay into a TaskStore), writeToFile,
+# viewing a page (in order and sorted by due date), and the update and delete
+# paths of the menu including saving the change to the journal. It also
+# measures memory per loaded task. Results are written as JSON, and can be
+# compared against an earlier run to flag regressions.
+#
+#   python -m benchmarks.bench_suite --output results.json
+#   python -m benchmarks.bench_suite --sizes 10,1000,100000 --compare baseline.json --threshold 0.25
+
+import argparse
+import datetime
+import gc
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from unittest.mock import patch
+
+from security_manager import PAGE_SIZE, STATUSES, readFromFile, writeToFile, viewTasks, updateTask, deleteTask
+from task_journal import TaskJournal
+from task_store import TaskStore
+from benchmarks.common import writeSyntheticFile, timeIt
+
+
+SIZES = [10, 100, 1000, 10_000, 100_000, 1_000_000]
+
+
+def repeatsFor(size):
+    '''Fewer repeats for the big files so the whole suite stays a few minutes'''
+    return max(1, min(5, 200_000 // size))
+
+
+def meanPerCall(function, calls):
+    '''Mean seconds of function(number) for number in range(calls)'''
+    start = time.perf_counter()
+    for number in range(calls):
+        function(number)
+    return (time.perf_counter() - start) / calls
+
+
+def bytesPerTask(path, size):
+    gc.collect()
+    tracemalloc.start()
+    tasks = readFromFile(path)
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del tasks
+    return allocated / size
+
+
+def benchSize(folder, size, ops=50, seed=1):
+    '''Time every operation for a user file with size tasks, returns {metric: value}'''
+    path = writeSyntheticFile(os.path.join(folder, f"bench{size}.csv"), size, seed)
+    repeat = repeatsFor(size)
+    rng = random.Random(seed)
+    results = {}
+
+    results["read"] = timeIt(lambda: readFromFile(path), repeat)
+    results["load"] = timeIt(lambda: TaskJournal(path).load(TaskStore), repeat)
+    tasks = readFromFile(path)
+    results["write"] = timeIt(lambda: writeToFile(path, tasks), repeat)
+
+    out = io.StringIO()
+    with redirect_stdout(out):
+        results["view_page"] = timeIt(lambda: viewTasks(tasks, offset=0, limit=PAGE_SIZE), repeat)
+        results["view_sorted_page"] = timeIt(lambda: viewTasks(tasks, offset=0, limit=PAGE_SIZE, sort_key="due"), repeat)
+
+    # the menu's update and delete paths: change the task, then save it as main() does
+    calls = min(ops, size)
+    journal = TaskJournal(path)
+    store = journal.load(TaskStore)
+
+    def update(number):
+        index = rng.randrange(len(store))
+        updateTask(store[index], 'e')
+        journal.recordUpdate(index, store[index])
+        journal.compactIfNeeded(store)
+
+    def delete(number):
+        index = rng.randrange(len(store))
+        deleteTask(store, index + 1)
+        journal.recordDelete(index)
+        journal.compactIfNeeded(store)
+
+    with redirect_stdout(out):
+        with patch("builtins.input", side_effect=lambda prompt="": rng.choice(STATUSES)):
+            results["update"] = meanPerCall(update, calls)
+        with patch("builtins.input", return_value="y"):
+            results["delete"] = meanPerCall(delete, calls)
+    journal.close()
+
+    results["bytes_per_task"] = bytesPerTask(path, size)
+    return results
+
+
+def runSuite(sizes, ops=50):
+    with tempfile.TemporaryDirectory() as folder:
+        results = {}
+        for size in sizes:
+            results[str(size)] = benchSize(folder, size, ops)
+            print(f"  {size:>9,} tasks done", file=sys.stderr)
+    return {
+        "meta": {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "ops": ops
+        },
+        "results": results
+    }
+
+
+def compareResults(baseline, current, threshold=0.2):
+    '''List (size, metric, baseline value, current value, change) for every metric that got worse by more than threshold'''
+    regressions = []
+    for size, metrics in current["results"].items():
+        for metric, value in metrics.items():
+            old = baseline["results"].get(size, {}).get(metric)
+            if not old:
+                continue
+            change = value / old - 1 # every metric is a time or a size, so lower is better
+            if change > threshold:
+                regressions.append((size, metric, old, value, change))
+    return regressions
+
+
+def printResults(results):
+    metrics = list(next(iter(results["results"].values())))
+    print(f"{'tasks':>9} " + " ".join(f"{metric:>16}" for metric in metrics))
+    for size, values in results["results"].items():
+        cells = []
+        for metric in metrics:
+            value = values[metric]
+            cells.append(f"{value:>16.1f}" if metric == "bytes_per_task" else f"{value * 1000:>13.3f} ms")
+        print(f"{int(size):>9,} " + " ".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the load, change and save cycle for growing user files")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)), help="comma separated task counts")
+    parser.add_argument("--ops", type=int, default=50, help="updates and deletes timed per size")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="slow down (0.2 is 20%%) counted as a regression")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    results = runSuite(sizes, args.ops)
+    printResults(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compareResults(baseline, results, args.threshold)
+        if not regressions:
+            print(f"\nNo regressions over {args.threshold:.0%} against {args.compare}")
+            return 0
+        print(f"\nRegressions over {args.threshold:.0%} against {args.compare}:")
+        for size, metric, old, new, change in regressions:
+            print(f"  {int(size):>9,} tasks {metric:<18} {old:.6g} -> {new:.6g} ({change:+.0%})")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
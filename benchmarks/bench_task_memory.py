@@ -0,0 +1,65 @@
+# Memory per task and construction time of the slotted SecurityTask compared to
+# the original dict based class.
+#
+#   python -m benchmarks.bench_task_memory --tasks 1000000
+
+import argparse
+import csv
+import gc
+import io
+import tracemalloc
+
+from security_manager import SecurityTask
+from benchmarks.common import syntheticCsv, timeIt
+
+
+class LegacySecurityTask:
+    '''The original SecurityTask: five private attributes in a per instance __dict__'''
+    def __init__(self, task_details, due_date, priority, category, status):
+        self.__task_details = task_details
+        self.__due_date = due_date
+        self.__priority = priority
+        self.__category = category
+        self.__status = status
+
+
+def build(cls, data):
+    '''Build one task per row the way readFromFile does, so every field is a fresh string'''
+    reader = csv.reader(io.StringIO(data))
+    next(reader) # skip the header
+    return [cls(*row) for row in reader]
+
+
+def measure(cls, data, count):
+    '''Bytes per task still allocated after building, and the build time'''
+    gc.collect()
+    tracemalloc.start()
+    tasks = build(cls, data)
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del tasks
+    gc.collect()
+
+    seconds = timeIt(lambda: build(cls, data), repeat=3)
+    return allocated / count, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    data = syntheticCsv(args.tasks)
+    print(f"{'class':<20} {'bytes/task':>12} {'build (s)':>10}")
+    print("-" * 44)
+    results = {}
+    for cls in (LegacySecurityTask, SecurityTask):
+        per_task, seconds = measure(cls, data, args.tasks)
+        results[cls.__name__] = per_task
+        print(f"{cls.__name__:<20} {per_task:>12.1f} {seconds:>10.3f}")
+    saved = 1 - results["SecurityTask"] / results["LegacySecurityTask"]
+    print(f"\nSecurityTask uses {saved:.0%} less memory per task for {args.tasks:,} tasks")
+
+
+if __name__ == "__main__":
+    main()
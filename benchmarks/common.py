@@ -0,0 +1,55 @@
+# Helpers shared by the benchmarks: synthetic task data and timing.
+
+import csv
+import io
+import random
+import time
+
+from security_manager import FIELDNAMES
+
+
+PRIORITIES = ["A", "B", "C"]
+CATEGORIES = ["Mobile", "Desktop", "Tablet"]
+STATUSES = ["Not Yet", "In Progress", "Completed"]
+ACTIONS = ["Install", "Update", "Patch", "Review", "Enable", "Disable", "Audit", "Backup"]
+TARGETS = ["Antivirus", "Firewall", "Password", "Operating System", "Pin Code", "Vpn", "Browser", "Router"]
+
+
+def syntheticRows(count, seed=1):
+    '''Yield count random task rows in FIELDNAMES order'''
+    rng = random.Random(seed)
+    for number in range(count):
+        yield [
+            f"{rng.choice(ACTIONS)} {rng.choice(TARGETS)} {number}",
+            f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(2024, 2027)}",
+            rng.choice(PRIORITIES),
+            rng.choice(CATEGORIES),
+            rng.choice(STATUSES)
+        ]
+
+
+def syntheticCsv(count, seed=1):
+    '''A user file's contents with count random tasks, as a string'''
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(FIELDNAMES)
+    writer.writerows(syntheticRows(count, seed))
+    return out.getvalue()
+
+
+def writeSyntheticFile(path, count, seed=1):
+    '''Write a user file with count random tasks'''
+    with open(path, "w", newline='') as f:
+        f.write(syntheticCsv(count, seed))
+    return path
+
+
+def timeIt(function, repeat=1):
+    '''Best wall clock time in seconds of calling function repeat times'''
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
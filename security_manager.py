@@ -2,7 +2,14 @@
 # Date: 16/04/2025
 
 import csv
+import datetime
+import functools
+import operator
 import os
+import sys
+from collections import namedtuple
+
+from task_metrics import METRICS, timed
 
 '''
 
@@ -39,42 +46,62 @@ METHOD readFromFile(file)
 
 
 METHOD writeToFile(file, tasks)
-    OPEN file for writing
+    OPEN temp file next to file for writing
         WRITE csv header row
         FOR each task in tasks list
             WRITE task attributes to csv row
         END FOR
-    CLOSE file
+        FLUSH and FSYNC temp file
+    CLOSE temp file
+    RENAME temp file over file
+    CALL write hooks (e.g. caches) with the file and tasks
 
     
 METHOD viewTasks(list_of_tasks)
-    PRINT table header
-    PRINT divider line
-    FOR each task with index in the list of tasks
-        PRINT formatted row with task details
+    BUILD table header
+    BUILD divider line
+    FOR each task with index in the page of the list of tasks
+        BUILD formatted row with task details
     END FOR
+    PRINT the whole table at once
 
 
 // Main Program
 
+IF started with --batch user
+    APPLY the add, update and delete operations read from stdin to the user's tasks
+    SAVE the tasks once
+    EXIT
+END IF
+IF started with --list user
+    PRINT the user's tasks
+    EXIT
+END IF
+
 PROMPT user for ID or Name
-SET 'users' folder
-CREATE folder if it doesn't exist
-SET filename based on user ID or Name
+SET storage backend (csv files in 'users' folder by default)
 
-IF file doesn't exist
+IF user doesn't exist in storage
     CREATE new file with header
     SET a task list for user
 ELSE
     PRINT welcome message
-    SET task list EQUAL readFromFile(filename) method
 END IF
+IF archiving is switched on
+    MOVE completed tasks due long ago into the user's compressed archive
+END IF
+SET change log (journal) for the user
+SET task list EQUAL tasks loaded by the change log (readFromFile plus journal for csv)
+START background writer that saves changed tasks while the menu waits for input
 
 // Main Program Loop
 
 WHILE true
+    IF the background writer merged changes from another session
+        PRINT merged message
+    END IF
     DISPLAY menu options
-    PROMPT user for choice
+    PROMPT user for choice (the background writer saves while waiting)
 
     IF choice is invalid
         PRINT error message
@@ -85,12 +112,13 @@ WHILE true
         PROMPT for (task details, due date, priority, category, status)
         CREATE new SecurityTask Object with inputs
         ADD task object to tasks list
-        CALL writeToFile with filename and tasks list
+        QUEUE the change for the background writer
         PRINT success message
     
     ELSE IF choice is 2 (View tasks)
         IF task list is not empty
-            CALL viewTask method with tasks list
+            PROMPT user for view (all, overdue, due soon, sorted by due date, search)
+            CALL viewTask method with the tasks in that view
         ELSE
             PRINT no task/s message
         END IF
@@ -108,8 +136,8 @@ WHILE true
                 IF updating task details
                     PROMPT new value
                     VALIDATE input not empty
-                    UPDATE task
-                    CALL writeToFile method
+                    UPDATE task (marks it as changed)
+                    QUEUE the change for the background writer
                     PRINT success message
 
                 ELSE IF // similar for other attributes (for priority, category and status 
@@ -132,7 +160,7 @@ WHILE true
 
                 IF confirmed
                     DELETE task from list
-                    CALL writeToFile method
+                    QUEUE the change for the background writer
                     PRINT success message
                 ELSE
                     PRINT cancellation message
@@ -144,6 +172,8 @@ WHILE true
 
     ElSE IF choice is 5 (Exit)
         PRINT exit message
+        WAIT for the background writer to save every change
+        SAVE search index if it was used
         BREAK from main loop
 
     ELSE
@@ -152,89 +182,430 @@ WHILE true
 END WHILE     
                 
 '''
+# column names used for every user file
+FIELDNAMES = ["Task Details", "Due Date", "Priority", "Category", "Status"]
+
+# header names accepted for each column when reading, in FIELDNAMES order. They are
+# compared by headerKey, so case, spaces and underscores don't matter ("due_date")
+HEADER_NAMES = [[name] for name in FIELDNAMES]
+HEADER_NAMES[0].extend(["Details", "Task"])
+HEADER_NAMES[1].extend(["Due_Date", "DueDate", "Due"]) # createUserFile writes the header with an underscore
+
+# number of tasks shown at a time when viewing in main()
+PAGE_SIZE = 20
+
+# values a task can have for its priority, category and status
+PRIORITIES = ["A", "B", "C"]
+CATEGORIES = ["Mobile", "Desktop", "Tablet"]
+STATUSES = ["Not Yet", "In Progress", "Completed"]
+
+# a lightweight read only view of one row, used by iterTasks
+TaskRow = namedtuple("TaskRow", ["task_details", "due_date", "priority", "category", "status"])
+
+
+def _intern(value):
+    '''Share one copy of a repeated string like "Not Yet" or "Desktop" between all tasks'''
+    return sys.intern(value) if type(value) is str else value
+
+
 # Security Task Class (each is an instance of a task)
 class SecurityTask:
+    # slots instead of a per task __dict__ keeps each task small when loading lots of them
+    __slots__ = ("__task_details", "__due_date", "__priority", "__category", "__status", "__task_id", "__store", "__dirty")
+
     def __init__(self, task_details, due_date, priority, category, status):
         self.__task_details = task_details
         self.__due_date = due_date
-        self.__priority = priority
-        self.__category = category
-        self.__status = status
+        self.__priority = _intern(priority)
+        self.__category = _intern(category)
+        self.__status = _intern(status)
+        self.__task_id = None # set when the task is added to a TaskStore
+        self.__store = None
+        self.__dirty = False # set by the setters until the change is saved, see TaskJournal.saveChanges
+
+    def getTaskId(self):
+        return self.__task_id
+
+    def attachToStore(self, store, task_id):
+        '''Let a TaskStore know when this task changes so it can keep its indexes right'''
+        self.__store = store
+        self.__task_id = task_id
+
+    def detachFromStore(self):
+        self.__store = None
+        self.__task_id = None
+
+    def isDirty(self):
+        '''Check if the task was changed through its setters since it was last saved'''
+        return self.__dirty
+
+    def markClean(self):
+        self.__dirty = False
+
+    def __changed(self):
+        self.__dirty = True
+        if self.__store is not None:
+            self.__store.taskChanged(self)
     
     def getTaskDetails(self):
         return self.__task_details
 
     def setTaskDetails(self, taskDetails):
         self.__task_details = taskDetails
+        self.__changed()
     
     def getDueDate(self):
         return self.__due_date
     
     def setDueDate(self, dueDate):
         self.__due_date = dueDate
+        self.__changed()
     
     def getPriority(self):
         return self.__priority
     
     def setPriority(self, priority):
-        self.__priority = priority
+        self.__priority = _intern(priority)
+        self.__changed()
     
     def getCategory(self):
         return self.__category
     
     def setCategory(self, category):
-        self.__category = category
+        self.__category = _intern(category)
+        self.__changed()
 
     def getStatus(self):
         return self.__status
     
     def setStatus(self, status):
-        self.__status = status
+        self.__status = _intern(status)
+        self.__changed()
 
 
+@timed("readFromFile")
 def readFromFile(file):
-    '''Read from a file of tasks'''
+    '''Read from a file of tasks, raises ValueError for a bad header or a row with missing fields'''
     tasks = [] # empty list to put tasks to from the file
     with open(file, "r", newline='') as data_file:
-        data_csv = csv.DictReader(data_file) 
-        for line in data_csv:
-            # create a Security Task Object for each line in the file
-            task = SecurityTask(
-                line["Task Details"],
-                line["Due Date"],
-                line["Priority"],
-                line["Category"],
-                line["Status"]
-            )
-            tasks.append(task) # Add each task to a list
+        data_csv = csv.reader(data_file)
+        header = next(data_csv, None)
+        if header is not None:
+            # the header is checked once, then each row is read by position instead of into a dict
+            fields = operator.itemgetter(*columnPositions(header))
+            for line in data_csv:
+                if not line:
+                    continue # skip blank lines like DictReader does
+                try:
+                    values = fields(line)
+                except IndexError:
+                    raise ValueError(
+                        f"line {data_csv.line_num} of {file} has {len(line)} fields, expected {len(header)}"
+                        " (python task_schema.py --fix repairs it)"
+                    ) from None
+                tasks.append(SecurityTask(*values)) # create a Security Task Object for each line in the file
+        if METRICS.enabled:
+            METRICS.addBytes("readFromFile", os.fstat(data_file.fileno()).st_size)
         data_file.close() # clsoe the file
     return tasks
 
 
-def writeToFile(file, tasks):
+def headerKey(name):
+    '''A header name with case, underscores, extra spaces and any byte order mark taken out'''
+    return " ".join(name.lstrip("\ufeff").replace("_", " ").split()).casefold()
+
+
+def columnPositions(header):
+    '''Position of each FIELDNAMES column in a file's header row'''
+    keys = [headerKey(name) for name in header]
+    positions = []
+    for names in HEADER_NAMES:
+        for name in names:
+            key = headerKey(name)
+            if key in keys:
+                positions.append(keys.index(key))
+                break
+        else:
+            raise ValueError(f"missing column '{names[0]}' in header {header}")
+    return positions
+
+
+def iterTasks(file, where=None, limit=None, rows=False):
+    '''Read tasks from a file one at a time
+
+    where is checked against a TaskRow before any SecurityTask is made, e.g.
+    iterTasks(file, where=lambda row: row.status != "Completed", limit=20)
+    stops reading as soon as 20 open tasks are found. With rows=True the
+    TaskRow views are yielded instead of SecurityTask objects.
+
+    Only a user file without pending journal changes is streamed. If its journal
+    has records that aren't compacted yet, the whole list is loaded through
+    TaskJournal first (where and limit still apply), so the result is never stale.
+    '''
+    from task_journal import TaskJournal, hasJournal # imported here as task_journal imports this module
+
+    if limit is not None and limit <= 0:
+        return
+    if hasJournal(file):
+        source = (TaskRow(*taskToRow(task)) for task in TaskJournal(file).read())
+    else:
+        source = _iterRows(file)
+    found = 0
+    for row in source:
+        if where is not None and not where(row):
+            continue
+        yield row if rows else SecurityTask(*row)
+        found += 1
+        if found == limit:
+            return
+
+
+def _iterRows(file):
+    '''TaskRow for each line of a user file, read as they are needed'''
+    with open(file, "r", newline='') as data_file:
+        data_csv = csv.reader(data_file)
+        header = next(data_csv, None)
+        if header is None:
+            return
+        details, due_date, priority, category, status = columnPositions(header)
+        for line in data_csv:
+            if not line:
+                continue # skip blank lines like DictReader does
+            yield TaskRow(line[details], line[due_date], line[priority], line[category], line[status])
+
+
+class DueDate(datetime.date):
+    '''A validated DD/MM/YYYY due date'''
+    __slots__ = ()
+
+    @classmethod
+    def parse(cls, text):
+        '''Parse a DD/MM/YYYY string, raising ValueError if it isn't a real date'''
+        due_date = parseDueDate(text)
+        if due_date is None:
+            raise ValueError(f"'{text}' is not a date in DD/MM/YYYY format")
+        return due_date
+
+    def __str__(self):
+        return self.strftime("%d/%m/%Y")
+
+
+@functools.lru_cache(maxsize=65536) # the same few thousand dates repeat across every task list
+def _parseDueDate(due_date):
+    try:
+        parts = due_date.split("/")
+        if len(parts) != 3 or not all(part.strip().isdigit() for part in parts):
+            return None
+        day, month, year = parts
+        return DueDate(int(year), int(month), int(day))
+    except (ValueError, AttributeError):
+        return None
+
+
+def parseDueDate(due_date):
+    '''Turn a DD/MM/YYYY string into a DueDate, or None if it isn't a valid date (cached)'''
+    try:
+        return _parseDueDate(due_date)
+    except TypeError: # unhashable, so not a date string anyway
+        return None
+
+
+def valueSet(value):
+    '''The set of values a where condition matches, it can be one value or a collection of them'''
+    return set(value) if isinstance(value, (set, list, tuple, frozenset)) else {value}
+
+
+def taskToRow(task):
+    '''Turn a task into a list of values in FIELDNAMES order'''
+    return [
+        task.getTaskDetails(),
+        task.getDueDate(),
+        task.getPriority(),
+        task.getCategory(),
+        task.getStatus()
+    ]
+
+
+def fsyncDirectory(folder):
+    '''Flush a folder's entries to disk so a rename or new file survives a crash'''
+    if not hasattr(os, "O_DIRECTORY"): # not possible on Windows
+        return
+    fd = os.open(folder or ".", os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _currentUmask():
+    mask = os.umask(0) # the only way to read it is to set it
+    os.umask(mask)
+    return mask
+
+
+_UMASK = _currentUmask() # read once at import, before any thread could create a file while it is 0
+
+
+class AtomicFile:
+    '''Open a temp file next to path, and swap it in for path once the with block ends
+
+    The data is flushed and fsynced before the rename and the folder after it,
+    so after a crash path holds either all of the old data or all of the new.
+    The old file's permissions are kept, and a new file gets the same ones as
+    open() would give it. If the block raises, the temp file is removed and
+    path is left untouched.
+
+        with AtomicFile(path, "wb", suffix=".snap") as f:
+            f.write(data)
+    '''
+
+    def __init__(self, path, mode="w", suffix="", newline=None):
+        self.path = path
+        self.__mode = mode
+        self.__suffix = suffix
+        self.__newline = newline
+        self.__file = None
+        self.__temp_file = None
+
+    def __enter__(self):
+        import tempfile # imported here, tempfile pulls in random and shutil which cost more than the rest of startup
+        folder = os.path.dirname(self.path)
+        fd, self.__temp_file = tempfile.mkstemp(prefix=".tmp-", suffix=self.__suffix, dir=folder or ".")
+        self.__file = os.fdopen(fd, self.__mode, newline=self.__newline)
+        return self.__file
+
+    def __exit__(self, exc_type, exc, traceback):
+        try:
+            if exc_type is None:
+                self.__file.flush()
+                os.fsync(self.__file.fileno()) # make sure the data is on disk before the rename
+            self.__file.close()
+            if exc_type is None:
+                if os.path.exists(self.path):
+                    os.chmod(self.__temp_file, os.stat(self.path).st_mode) # keep the permissions of the old file
+                else: # mkstemp makes it 0600, a new file gets what open() would give it
+                    os.chmod(self.__temp_file, 0o666 & ~_UMASK)
+                os.replace(self.__temp_file, self.path)
+        except BaseException:
+            self.__removeTemp()
+            raise
+        if exc_type is not None:
+            self.__removeTemp()
+            return False
+        fsyncDirectory(os.path.dirname(self.path))
+        return False
+
+    def __removeTemp(self):
+        if os.path.exists(self.__temp_file):
+            os.remove(self.__temp_file)
+
+
+# functions called as hook(file, tasks) after writeToFile saves a file, see addWriteHook
+_write_hooks = []
+
+
+def addWriteHook(hook):
+    '''Call hook(file, tasks) every time writeToFile has saved a file, e.g. to keep a cache up to date'''
+    _write_hooks.append(hook)
+
+
+def removeWriteHook(hook):
+    if hook in _write_hooks:
+        _write_hooks.remove(hook)
+
+
+def notifyWritten(file, tasks):
+    '''Tell the write hooks that file now holds tasks
+
+    The file is already saved by then, so a hook failing is reported on stderr
+    rather than raised: whatever it keeps (a cache, an index) is derived from
+    the file and can be rebuilt, and the caller mustn't think the save failed.
+    '''
+    for hook in list(_write_hooks):
+        try:
+            hook(file, tasks)
+        except Exception:
+            reportError(f"updating {getattr(hook, '__qualname__', hook)} after saving {file}")
+
+
+def reportError(what):
+    '''Print the exception being handled to stderr, for failures that shouldn't stop what caused them'''
+    import traceback # only on the rare error
+    print(f"Error {what}:", file=sys.stderr)
+    traceback.print_exc()
+
+
+@timed("writeToFile")
+def writeToFile(file, tasks, notify=True):
     '''Writes to a file'''
-    with open(file, "w", newline='') as f:
+    # write everything to a temp file in the same folder and swap it in at the end,
+    # so if we crash half way the old file is still there untouched
+    with AtomicFile(file, suffix=".csv", newline='') as f:
         writer = csv.writer(f)
-        writer.writerow(["Task Details", "Due Date", "Priority", "Category", "Status"])
+        writer.writerow(FIELDNAMES)
         
         for task in tasks:
-            writer.writerow([
-                task.getTaskDetails(),
-                task.getDueDate(),
-                task.getPriority(),
-                task.getCategory(),
-                task.getStatus() 
-            ])
+            writer.writerow(taskToRow(task))
+
+    if METRICS.enabled:
+        METRICS.addBytes("writeToFile", os.path.getsize(file))
+    if notify: # callers that change more files afterwards call notifyWritten themselves
+        notifyWritten(file, tasks)
 
 
-def viewTasks(list_of_tasks):
+@timed("viewTasks")
+def viewTasks(list_of_tasks, numbers=None, offset=0, limit=None, sort_key=None):
     '''View tasks in a table like format'''
-    print(f"{'':<5} {'Task':<30} {'Due Date':<12} {'Priority':<10} {'Category':<10} {'Status':<12}")
-    print("-"*90)
+    from task_render import renderTasks # imported here as task_render imports this module
 
-    # iterate through the whole list and print each task
-    for index, task in enumerate(list_of_tasks, start=1):
-        print(f"{index:<5} {task.getTaskDetails():<30} {task.getDueDate():<12} {task.getPriority():<10} {task.getCategory():<10} {task.getStatus():<12}")
+    # build the table (or the page of it asked for) first and write it all at once,
+    # a filtered view can pass numbers to show each task's number in the full list
+    sys.stdout.write(renderTasks(list_of_tasks, numbers, offset, limit, sort_key))
+
+
+def pageTasks(list_of_tasks, numbers=None, sort_key=None, page_size=PAGE_SIZE):
+    '''View tasks one page at a time, asking before showing the next page'''
+    offset = 0
+    while True:
+        viewTasks(list_of_tasks, numbers, offset, page_size, sort_key)
+        offset += page_size
+        if offset >= len(list_of_tasks):
+            return
+        more = input(f"\nShowing {offset} of {len(list_of_tasks)} tasks. Press Enter for more or q to stop: ")
+        if more.strip().lower() == 'q':
+            return
+
+
+def selectView(tasks, search=None):
+    '''Ask which tasks to view, returns the tasks, the task number of each one and how to sort them'''
+    print("\na. all tasks")
+    print("b. overdue tasks")
+    print("c. tasks due in the next few days")
+    print("d. all tasks sorted by due date")
+    print("e. all tasks sorted by priority")
+    if search is not None:
+        print("f. tasks matching a search")
+    view = input("\nWhich tasks would you like to view?: ").lower()
+
+    # the due date views come from the TaskStore's sorted due date index
+    if view == 'b':
+        chosen = tasks.overdue()
+    elif view == 'c':
+        try:
+            days = int(input("How many days ahead?: "))
+        except ValueError:
+            print("Please enter a valid number.")
+            return [], [], None
+        chosen = tasks.dueWithin(days)
+    elif view == 'd':
+        chosen = tasks.sortedByDue()
+    elif view == 'e':
+        return tasks, None, "priority"
+    elif view == 'f' and search is not None:
+        chosen = search(input("Search task details for (e.g. antivirus desktop): "))
+    else:
+        return tasks, None, None
+    return chosen, [tasks.positionOf(task) + 1 for task in chosen], None
 
 
 def addTask():
@@ -264,7 +635,7 @@ def updateTask(task, what_to_update):
         new_value = input("Enter new due date: ")
         while True:
             new_value = input("Enter new due date (dd/mm/yyyy): ")
-            if len(new_value.split("/")) == 3:
+            if parseDueDate(new_value) is not None: # a real date, not just three parts
                 break
             print("Invalid date format. Please use dd/mm/yyyy format.")
         task.setDueDate(new_value)
@@ -272,7 +643,7 @@ def updateTask(task, what_to_update):
         return True
     
     elif what_to_update == 'c': # Priority
-        priorities = ["A", "B", "C"]
+        priorities = PRIORITIES
         while True:
             new_value = input(f"Enter new priority ({','.join(priorities)}): ").upper()
             if new_value in priorities:
@@ -283,7 +654,7 @@ def updateTask(task, what_to_update):
         return True
     
     elif what_to_update == 'd': # Category
-        categories = ["Mobile", "Desktop", "Tablet"]
+        categories = CATEGORIES
 
         while True:
             new_value = input(f"Enter new category ({','.join(categories)}): ").title()
@@ -295,7 +666,7 @@ def updateTask(task, what_to_update):
         return True
     
     elif what_to_update == 'e': # Status
-        statuses = ["Not Yet", "In Progress", "Completed"]
+        statuses = STATUSES
         while True:
 
             new_value = input(f"Enter new status ({','.join(statuses)}): ").title()
@@ -346,24 +717,86 @@ def createUserFile(filename):
         return []
 
 
+def listTasks(argv):
+    '''Print a user's tasks without the menu, for scripts (python security_manager.py --list alice)'''
+    from task_storage import getBackend # imported here as it imports this module
+
+    if len(argv) != 1:
+        print("usage: security_manager.py --list USER", file=sys.stderr)
+        return 2
+    user = argv[0]
+    try:
+        storage = getBackend(os.environ.get("SECURITY_MANAGER_STORAGE", "csv"), create=False)
+    except FileNotFoundError: # no database yet
+        print(f"No file found for: {user}.", file=sys.stderr)
+        return 1
+    try:
+        if not storage.exists(user):
+            print(f"No file found for: {user}.", file=sys.stderr)
+            return 1
+        tasks = storage.readTasks(user) # read only, nothing is created or saved (not even users/ or a lock file)
+        if tasks:
+            viewTasks(tasks)
+        else:
+            print("You don't have any tasks available.")
+        return 0
+    finally:
+        storage.close()
+
+
+# shown when another session changed the same user's tasks while this one was open
+MERGED_MESSAGE = "Your tasks were also changed in another session, both sets of changes have been kept."
+
+
 # -- Start Main Program --
 def main():
+    # imported here as these modules import this one
+    from task_storage import getBackend
+    from task_store import TaskStore
+    from task_search import TaskSearch
+    from task_writer import WriteBehind
         
     user = input("Enter your student/staff details (ID or Name): ".strip()) # ask user for identity
 
-    folder = "users"
-    os.makedirs(folder, exist_ok=True) # make a users folder if it doesn't exist
-    filename = os.path.join(folder, f"{user}.csv") # example fileanmae would be users/{user}.csv}
+    # users/{user}.csv files by default, SECURITY_MANAGER_STORAGE=sqlite keeps everyone in users/tasks.db
+    storage = getBackend(os.environ.get("SECURITY_MANAGER_STORAGE", "csv"))
 
-    if not os.path.exists(filename): # if there is no existing file for the user
+    if not storage.exists(user): # if there is no existing file for the user
         print(f"No file found for: {user}. Creating a new one..")
-        tasks = createUserFile(filename)
+        storage.createUser(user)
     else: # if user exists
         print(f"Welcome {user}!") # print current user
-        tasks = readFromFile(filename) # call readFromFile function to get a list of tasks from users last session
+
+    # SECURITY_MANAGER_ARCHIVE_DAYS=90 moves completed tasks due over 90 days ago into the
+    # user's compressed archive first, so the user file only holds the tasks still being worked on
+    archive_days = os.environ.get("SECURITY_MANAGER_ARCHIVE_DAYS")
+    if archive_days and storage.userFile(user):
+        try:
+            days = int(archive_days)
+            if days < 0:
+                raise ValueError(archive_days)
+        except ValueError:
+            print(f"SECURITY_MANAGER_ARCHIVE_DAYS should be a number of days, not '{archive_days}'. Nothing was archived.")
+        else:
+            from task_archive import archiveUser
+            archived = archiveUser(storage.userFile(user), days)
+            if archived:
+                print(f"Moved {archived} old completed tasks to your archive.")
+
+    # changes are saved one at a time through the change log (for csv files a journal
+    # next to the user file) instead of rewriting every task each time
+    journal = storage.changeLog(user)
+    tasks = journal.load(TaskStore) # tasks from the users last session, in an indexed store so lookups don't scan the whole list
+    search = TaskSearch(tasks, storage.userFile(user)) # word index over the task details, opened on the first search
+    # changes are saved by a background thread while the menu waits for input, so an edit never waits for the disk
+    writer = WriteBehind(journal, tasks).start()
+    writer.flushOnSignals()
 
     # -- Main Program Loop --
     while True:
+        if writer.takeMerged():
+            print(MERGED_MESSAGE)
+
         print("\nMenu Options:")
         print("1. Add a new task")
         print("2. View all tasks")
@@ -373,7 +806,8 @@ def main():
 
         # Ask user for service to use
         try:
-            choice = int(input("Enter choice: "))
+            with writer.idle(): # the only time the writer can save
+                choice = int(input("Enter choice: "))
         except ValueError:
             print("Invalid choice, Please enter a number (1-5).")
             continue
@@ -384,7 +818,7 @@ def main():
             # create a new task object and store user input
             new_task = addTask()
             tasks.append(new_task) # append new_task to the list
-            writeToFile(filename, tasks) # write the task to the file
+            writer.changed() # saved in the background
 
             # print success message
             print("Task added successfully!")
@@ -392,7 +826,11 @@ def main():
         # if user selects to view all tasks
         elif choice == 2:
             if tasks:
-                viewTasks(tasks)
+                chosen, numbers, sort_key = selectView(tasks, search.search)
+                if chosen:
+                    pageTasks(chosen, numbers, sort_key)
+                else:
+                    print("\nNo tasks to show for that view.")
             else:
                 print("\nYou don't have any tasks available. Please add some and try again.")
             print()
@@ -401,7 +839,7 @@ def main():
         elif choice == 3:
             # view the list of task for the user to pick which one to update
             if tasks:
-                viewTasks(tasks)
+                pageTasks(tasks)
 
                 try:
                     task_number = int(input("\nEnter task number to update: "))
@@ -423,7 +861,7 @@ def main():
                     what_to_update = input("\nWhat would you like to update?: ").lower()
 
                     if updateTask(tasks[task_number - 1], what_to_update):
-                        writeToFile(filename, tasks)
+                        writer.changed() # the setter marked the task as dirty
 
                 except ValueError:
                     print("Please enter a valid number.")
@@ -436,13 +874,13 @@ def main():
         # if user selects to delete a task
         elif choice == 4: # Delete Task
             if tasks:
-                viewTasks(tasks)
+                pageTasks(tasks)
 
                 try:
 
                     task_number= int(input("\nEnter task to delete: "))
                     if deleteTask(tasks, task_number):
-                        writeToFile(filename, tasks)
+                        writer.changed()
 
                 except ValueError:
                     print("Please enter a valid number.")
@@ -453,6 +891,12 @@ def main():
                 
         elif choice == 5:
             print("Exiting the program..")
+            writer.close() # waits for every change to be saved
+            if writer.takeMerged():
+                print(MERGED_MESSAGE)
+            search.close() # saves the search index if it was used
+            journal.close()
+            storage.close()
             break
         
         else:
@@ -460,4 +904,11 @@ def main():
 
 
 if __name__ == "__main__":
+    from task_metrics import enableFromArgs
+    args = enableFromArgs(sys.argv[1:]) # --metrics FILE and --profile cprofile|tracemalloc
+    if args[:1] == ["--batch"]: # non-interactive, e.g. python security_manager.py --batch alice < changes.jsonl
+        from task_batch import main as batchMain
+        sys.exit(batchMain(args[1:]))
+    if args[:1] == ["--list"]: # read only and quick to start, e.g. python security_manager.py --list alice
+        sys.exit(listTasks(args[1:]))
     main()
\ No newline at end of file
@@ -0,0 +1,209 @@
+# Compressed archive of old completed tasks.
+#
+# Completed tasks are never looked at again by the menu, but every load and
+# every compaction of users/<user>.csv still parses and rewrites them. The
+# archive moves completed tasks that were due more than a number of days ago
+# out of the user file into compressed segments in users/<user>.archive/, so
+# the user file (and loading it) only grows with the open work. Tasks with a
+# due date that can't be read stay where they are.
+#
+# Each archive run writes one new segment, a gzip (.csv.gz) or lzma (.csv.xz)
+# compressed CSV of the tasks it moved, in FIELDNAMES order and without a
+# header. Segments are numbered and written under the user file's lock, to a
+# temp file that is renamed into place, and the tasks are only taken out of
+# the user file (through the journal, so open sessions merge the change) once
+# their segment is on disk. A crash in between leaves a task in both places
+# rather than in neither.
+#
+# Archived tasks are read with iterArchive, which streams the segments a row
+# at a time and never loads them whole.
+#
+#   python task_archive.py archive [folder] [--days 90] [--compression gzip|lzma]
+#   python task_archive.py query users/alice.csv [--contains antivirus] [--category Desktop] [--limit 20]
+#   python task_archive.py info users/alice.csv
+
+import argparse
+import csv
+import datetime
+import glob
+import gzip
+import lzma
+import os
+import re
+import sys
+
+from security_manager import SecurityTask, TaskRow, AtomicFile, parseDueDate, taskToRow
+from task_journal import TaskJournal
+from task_locking import lockedFile
+from task_metrics import timed
+from user_reports import findUserFiles
+
+
+# file extension and open function for each compression
+COMPRESSIONS = {"gzip": (".csv.gz", gzip.open), "lzma": (".csv.xz", lzma.open)}
+
+SEGMENT = re.compile(r"segment-(\d+)\.csv\.(gz|xz)$")
+
+DEFAULT_DAYS = 90
+
+
+def archiveFolder(filename):
+    '''Get the folder of archive segments that sits next to a user file'''
+    return os.path.splitext(filename)[0] + ".archive"
+
+
+def segmentFiles(filename):
+    '''The archive segments of a user file, oldest first'''
+    segments = []
+    for path in glob.glob(os.path.join(archiveFolder(filename), "segment-*")):
+        match = SEGMENT.search(os.path.basename(path))
+        if match:
+            segments.append((int(match.group(1)), path))
+    return [path for _, path in sorted(segments)]
+
+
+def _openSegment(path):
+    for extension, opener in COMPRESSIONS.values():
+        if path.endswith(extension):
+            return opener(path, "rt", newline='')
+    raise ValueError(f"{path} is not an archive segment")
+
+
+def isArchivable(task, cutoff):
+    '''Check if a task is completed and was due before the cutoff date'''
+    if task.getStatus() != "Completed":
+        return False
+    due_date = parseDueDate(task.getDueDate())
+    return due_date is not None and due_date < cutoff
+
+
+@timed("archive.write")
+def writeSegment(filename, tasks, compression="gzip"):
+    '''Write tasks as the next archive segment of a user file, returns its path'''
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"unknown compression '{compression}' ({', '.join(COMPRESSIONS)})")
+    extension, opener = COMPRESSIONS[compression]
+    folder = archiveFolder(filename)
+    os.makedirs(folder, exist_ok=True)
+    # numbered and written under the user file's lock, so two archive runs
+    # can't both pick the same next number and replace each other's segment
+    with lockedFile(filename):
+        existing = segmentFiles(filename)
+        number = int(SEGMENT.search(os.path.basename(existing[-1])).group(1)) + 1 if existing else 1
+        path = os.path.join(folder, f"segment-{number:06d}{extension}")
+
+        with AtomicFile(path, "wb", suffix=extension) as raw:
+            with opener(raw, "wt", newline='') as f:
+                writer = csv.writer(f)
+                for task in tasks:
+                    writer.writerow(taskToRow(task))
+    return path
+
+
+@timed("archive.user")
+def archiveUser(filename, days=DEFAULT_DAYS, compression="gzip", today=None):
+    '''Move a user's completed tasks due more than days ago into a new segment, returns how many moved'''
+    try:
+        cutoff = (today or datetime.date.today()) - datetime.timedelta(days=days)
+    except OverflowError:
+        return 0 # before the first date there is, so nothing is old enough
+    journal = TaskJournal(filename)
+    try:
+        tasks = journal.load()
+        archived = [task for task in tasks if isArchivable(task, cutoff)]
+        if not archived:
+            return 0
+        writeSegment(filename, archived, compression) # on disk before the tasks leave the user file
+        moved = set(map(id, archived))
+        journal.compact([task for task in tasks if id(task) not in moved])
+        return len(archived)
+    finally:
+        journal.close()
+
+
+def iterArchive(filename, where=None, limit=None, rows=False):
+    '''Stream a user's archived tasks, oldest segment first
+
+    Works like iterTasks: where is checked against each TaskRow before a
+    SecurityTask is made, and reading stops once limit tasks are found.
+    '''
+    if limit is not None and limit <= 0:
+        return
+    found = 0
+    for path in segmentFiles(filename):
+        with _openSegment(path) as f:
+            for line in csv.reader(f):
+                if not line:
+                    continue
+                row = TaskRow(*line)
+                if where is not None and not where(row):
+                    continue
+                yield row if rows else SecurityTask(*row)
+                found += 1
+                if found == limit:
+                    return
+
+
+def archiveInfo(filename):
+    '''Segments, archived task count and compressed and uncompressed sizes of a user's archive'''
+    segments = segmentFiles(filename)
+    tasks = 0
+    size = 0
+    for path in segments:
+        with _openSegment(path) as f:
+            for line in csv.reader(f):
+                tasks += 1
+                size += len(line) # separators and the newline
+                size += sum(len(field.encode()) for field in line)
+    compressed = sum(os.path.getsize(path) for path in segments)
+    return {"segments": len(segments), "tasks": tasks, "bytes": compressed, "uncompressed_bytes": size}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archive old completed tasks and query the archive")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    archive = commands.add_parser("archive", help="move old completed tasks of every user into their archive")
+    archive.add_argument("folder", nargs="?", default="users")
+    archive.add_argument("--days", type=int, default=DEFAULT_DAYS, help="archive tasks due more than this many days ago")
+    archive.add_argument("--compression", choices=list(COMPRESSIONS), default="gzip")
+
+    query = commands.add_parser("query", help="list a user's archived tasks")
+    query.add_argument("file", help="the user's CSV file, e.g. users/alice.csv")
+    query.add_argument("--contains", help="only tasks with this text in their details (any case)")
+    query.add_argument("--priority")
+    query.add_argument("--category")
+    query.add_argument("--limit", type=int)
+
+    info = commands.add_parser("info", help="size of a user's archive")
+    info.add_argument("file", help="the user's CSV file, e.g. users/alice.csv")
+    args = parser.parse_args(argv)
+
+    if args.command == "archive":
+        total = 0
+        for path in findUserFiles(args.folder):
+            moved = archiveUser(path, args.days, args.compression)
+            if moved:
+                print(f"{path}: archived {moved} tasks")
+            total += moved
+        print(f"Archived {total} tasks")
+    elif args.command == "query":
+        text = args.contains.casefold() if args.contains else None
+
+        def where(row):
+            return ((text is None or text in row.task_details.casefold())
+                    and (args.priority is None or row.priority == args.priority)
+                    and (args.category is None or row.category == args.category))
+
+        writer = csv.writer(sys.stdout, lineterminator="\n")
+        for row in iterArchive(args.file, where, args.limit, rows=True):
+            writer.writerow(row)
+    else:
+        stats = archiveInfo(args.file)
+        print(f"{archiveFolder(args.file)}: {stats['segments']} segments, {stats['tasks']} tasks, "
+              f"{stats['bytes']} bytes ({stats['uncompressed_bytes']} uncompressed)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
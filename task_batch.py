@@ -0,0 +1,321 @@
+# Non-interactive batch mode for scripts and bulk edits.
+#
+# Reads a list of add, update and delete operations for one user, applies them
+# all to the tasks in memory and saves the result once at the end, instead of
+# going through the menu (and a save) for every single change.
+#
+#   python security_manager.py --batch alice < changes.jsonl
+#   python task_batch.py alice --format csv --dry-run < changes.csv
+#   python task_batch.py alice --where category=Desktop --where priority=C --set status=Completed
+#   python task_batch.py alice --where status=Completed --where "due<01/01/2025" --delete --dry-run
+#
+# Operations are JSON lines:
+#
+#   {"op": "add", "details": "Install antivirus", "due_date": "01/06/2025", "priority": "A", "category": "Desktop", "status": "Not Yet"}
+#   {"op": "update", "task": 3, "status": "Completed"}
+#   {"op": "delete", "task": 3}
+#
+# or CSV with the same names as the header (op,task,details,due_date,...),
+# where an empty cell means the field is left alone. Task numbers are the ones
+# shown by the menu, counted after the operations before them, the same as
+# making the changes one after another by hand.
+#
+# In JSON an update or delete can pick its tasks with "where" instead of a
+# task number, and then changes every matching task in one pass over the list:
+#
+#   {"op": "update", "where": {"category": "Desktop", "priority": "C"}, "status": "Completed"}
+#   {"op": "delete", "where": {"status": "Completed", "due_before": "01/01/2025"}}
+#
+# where takes priority, category and status (a value or a list of values),
+# "exclude" with the values to leave out, e.g. {"status": "Completed"}, and
+# due_before and due_from dates. The counts are the number of tasks changed,
+# so --dry-run tells how many tasks a where would touch.
+#
+# By default nothing is saved if any operation is invalid. With --skip-invalid
+# the bad ones are reported and the rest are saved.
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import re
+import sys
+
+from security_manager import SecurityTask, PRIORITIES, CATEGORIES, STATUSES, MERGED_MESSAGE, parseDueDate
+from task_metrics import timed
+
+
+# fields an operation can set, in SecurityTask argument order, with their setters
+FIELDS = {
+    "details": SecurityTask.setTaskDetails,
+    "due_date": SecurityTask.setDueDate,
+    "priority": SecurityTask.setPriority,
+    "category": SecurityTask.setCategory,
+    "status": SecurityTask.setStatus
+}
+
+CSV_HEADER = ["op", "task"] + list(FIELDS)
+
+# what a where can select tasks by, besides due_before and due_from
+WHERE_FIELDS = ["priority", "category", "status"]
+
+CONDITION = re.compile(r"\s*(\w+)\s*(!=|>=|<|=)\s*(.*?)\s*$") # --where field=value, field!=value, due<date, due>=date
+
+
+def checkValue(field, value):
+    '''Tidy a field value the way the menu does, raises ValueError if it isn't allowed'''
+    value = str(value).strip()
+    if field == "details":
+        if not value:
+            raise ValueError("task details cannot be empty")
+        return value.title()
+    if field == "due_date":
+        if parseDueDate(value) is None:
+            raise ValueError(f"invalid due date '{value}', use dd/mm/yyyy")
+        return value
+    allowed = {"priority": PRIORITIES, "category": CATEGORIES, "status": STATUSES}[field]
+    value = value.upper() if field == "priority" else value.title()
+    if value not in allowed:
+        raise ValueError(f"invalid {field} '{value}', choose from {', '.join(allowed)}")
+    return value
+
+
+def _checkValues(field, value):
+    if isinstance(value, list):
+        return [checkValue(field, item) for item in value]
+    return checkValue(field, value)
+
+
+def checkWhere(where):
+    '''Turn an operation's where into TaskStore.findTasks arguments, raises ValueError if it isn't valid'''
+    if not isinstance(where, dict) or not where:
+        raise ValueError('where must be an object like {"category": "Desktop", "due_before": "01/01/2025"}')
+    query = {}
+    for name, value in where.items():
+        if name in ("due_before", "due_from"):
+            query[name] = parseDueDate(str(value))
+            if query[name] is None:
+                raise ValueError(f"invalid {name} '{value}', use dd/mm/yyyy")
+        elif name == "exclude":
+            if not isinstance(value, dict) or set(value) - set(WHERE_FIELDS):
+                raise ValueError(f"exclude must be an object with {', '.join(WHERE_FIELDS)}")
+            query[name] = {field: _checkValues(field, values) for field, values in value.items()}
+        elif name in WHERE_FIELDS:
+            query[name] = _checkValues(name, value)
+        else:
+            raise ValueError(f"can't select tasks by '{name}' ({', '.join(WHERE_FIELDS)}, exclude, due_before, due_from)")
+    return query
+
+
+def whereOperation(conditions, assignments=(), delete=False):
+    '''Build an update or delete with a where from --where, --set and --delete, raises ValueError if they don't add up'''
+    if bool(assignments) == delete:
+        raise ValueError("--where needs either --set or --delete")
+    where = {}
+    for text in conditions:
+        match = CONDITION.match(text)
+        if not match:
+            raise ValueError(f"invalid condition '{text}', use e.g. category=Desktop, status!=Completed or due<01/01/2025")
+        field, operator, value = match.groups()
+        if field == "due":
+            if operator not in ("<", ">="):
+                raise ValueError(f"invalid condition '{text}', due takes < or >=")
+            where["due_before" if operator == "<" else "due_from"] = value
+        elif operator == "=":
+            where.setdefault(field, []).append(value) # field=A field=B matches either
+        elif operator == "!=":
+            where.setdefault("exclude", {}).setdefault(field, []).append(value)
+        else:
+            raise ValueError(f"invalid condition '{text}', {field} takes = or !=")
+    operation = {"op": "delete" if delete else "update", "where": where}
+    for text in assignments:
+        field, separator, value = text.partition("=")
+        if not separator:
+            raise ValueError(f"invalid --set '{text}', use FIELD=VALUE")
+        operation[field.strip()] = value.strip()
+    return operation
+
+
+def readOperations(lines, file_format=None):
+    '''Yield (line number, operation dict) for each operation, file_format is jsonl, csv or None to guess'''
+    lines = iter(lines)
+    if file_format is None:
+        # JSON lines start with a brace, anything else is taken as CSV
+        first = next(lines, "")
+        while first and not first.strip():
+            first = next(lines, "")
+        file_format = "jsonl" if first.lstrip().startswith("{") else "csv"
+        lines = itertools.chain([first], lines)
+
+    if file_format == "jsonl":
+        for line_number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                operation = json.loads(line)
+            except ValueError:
+                operation = None
+            if not isinstance(operation, dict):
+                operation = {"op": None, "error": "not a JSON object"}
+            yield line_number, operation
+    elif file_format == "csv":
+        reader = csv.DictReader(lines)
+        for row in reader:
+            # empty cells are fields the operation doesn't set
+            yield reader.line_num, {name: value for name, value in row.items() if name and value not in ("", None)}
+    else:
+        raise ValueError(f"unknown batch format '{file_format}' (jsonl, csv)")
+
+
+def _taskIndex(tasks, operation):
+    try:
+        number = int(operation["task"])
+    except KeyError:
+        raise ValueError(f"{operation['op']} needs a task number") from None
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid task number '{operation['task']}'") from None
+    if number < 1 or number > len(tasks):
+        raise ValueError(f"task {number} doesn't exist, there are {len(tasks)} tasks")
+    return number - 1
+
+
+def applyOperation(tasks, operation):
+    '''Apply one operation to the task list, raises ValueError (leaving tasks alone) if it is invalid
+
+    Returns the op and the number of tasks it changed. Operations with a where
+    need the tasks in a TaskStore.
+    '''
+    op = operation.get("op")
+    if "error" in operation:
+        raise ValueError(operation["error"])
+    unknown = set(operation) - set(CSV_HEADER) - {"where"}
+    if unknown:
+        raise ValueError(f"unknown field '{sorted(unknown)[0]}'")
+    values = {field: checkValue(field, operation[field]) for field in FIELDS if field in operation}
+
+    if "where" in operation:
+        if op not in ("update", "delete"):
+            raise ValueError(f"{op} can't have a where (update, delete)")
+        if "task" in operation:
+            raise ValueError(f"{op} takes a task number or a where, not both")
+        query = checkWhere(operation["where"])
+        if op == "delete":
+            return op, tasks.deleteWhere(**query)
+        if not values:
+            raise ValueError("update doesn't change anything")
+        return op, tasks.updateWhere(values, **query)
+
+    if op == "add":
+        missing = [field for field in FIELDS if field not in values]
+        if missing:
+            raise ValueError(f"add is missing {', '.join(missing)}")
+        tasks.append(SecurityTask(*(values[field] for field in FIELDS)))
+    elif op == "update":
+        index = _taskIndex(tasks, operation)
+        if not values:
+            raise ValueError("update doesn't change anything")
+        for field, value in values.items():
+            FIELDS[field](tasks[index], value)
+    elif op == "delete":
+        del tasks[_taskIndex(tasks, operation)]
+    else:
+        raise ValueError(f"unknown op '{op}' (add, update, delete)")
+    return op, 1
+
+
+def applyOperations(tasks, operations, skip_invalid=False):
+    '''Apply (line number, operation) pairs in order
+
+    Returns the number of tasks added, updated and deleted and a list of (line number, error).
+    Without skip_invalid it stops at the first invalid operation.
+    '''
+    counts = {"add": 0, "update": 0, "delete": 0}
+    errors = []
+    for line_number, operation in operations:
+        try:
+            op, changed = applyOperation(tasks, operation)
+            counts[op] += changed
+        except ValueError as error:
+            errors.append((line_number, str(error)))
+            if not skip_invalid:
+                break
+    return counts, errors
+
+
+@timed("batch")
+def runBatch(user, lines, storage, file_format=None, skip_invalid=False, dry_run=False):
+    '''Apply a batch of operations to a user's tasks and save them once
+
+    Returns the counts and errors from applyOperations, and whether the save had
+    to be merged with changes made by another session in the meantime.
+    '''
+    from task_store import TaskStore # imported here as task_store imports security_manager
+
+    if not storage.exists(user):
+        if dry_run: # a dry run writes nothing, not even the new user
+            tasks = TaskStore()
+            counts, errors = applyOperations(tasks, readOperations(lines, file_format), skip_invalid)
+            return counts, errors, False
+        storage.createUser(user)
+    journal = storage.changeLog(user)
+    try:
+        tasks = journal.load(TaskStore)
+        counts, errors = applyOperations(tasks, readOperations(lines, file_format), skip_invalid)
+        merged = False
+        changed = any(counts.values())
+        if changed and not dry_run and (skip_invalid or not errors):
+            merged = journal.saveChanges(tasks) # only the changed tasks, in one write
+            journal.compactIfNeeded(tasks)
+        return counts, errors, merged
+    finally:
+        journal.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply a batch of task changes for one user from stdin")
+    parser.add_argument("user", help="student/staff ID or name")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="format of the operations (guessed by default)")
+    parser.add_argument("--skip-invalid", action="store_true", help="save the valid operations even if some are invalid")
+    parser.add_argument("--dry-run", action="store_true", help="check and count the operations without saving")
+    parser.add_argument("--storage", default=os.environ.get("SECURITY_MANAGER_STORAGE", "csv"), help="storage backend (csv or sqlite)")
+    parser.add_argument("--where", action="append", metavar="CONDITION",
+                        help="change every matching task instead of reading operations, e.g. category=Desktop, "
+                             "status!=Completed or 'due<01/01/2025' (can be repeated, all must match)")
+    parser.add_argument("--set", action="append", default=[], metavar="FIELD=VALUE",
+                        help="with --where, the field to set on every matching task (can be repeated)")
+    parser.add_argument("--delete", action="store_true", help="with --where, delete every matching task")
+    args = parser.parse_args(argv)
+
+    lines, file_format = sys.stdin, args.format
+    if args.where:
+        try:
+            lines, file_format = [json.dumps(whereOperation(args.where, args.set, args.delete))], "jsonl"
+        except ValueError as error:
+            parser.error(str(error))
+    elif args.set or args.delete:
+        parser.error("--set and --delete need --where")
+
+    from task_storage import getBackend
+    storage = getBackend(args.storage)
+    try:
+        counts, errors, merged = runBatch(args.user, lines, storage, file_format, args.skip_invalid, args.dry_run)
+    finally:
+        storage.close()
+
+    for line_number, error in errors:
+        print(f"line {line_number}: {error}", file=sys.stderr)
+    summary = f"{counts['add']} added, {counts['update']} updated, {counts['delete']} deleted"
+    if args.dry_run:
+        print(f"{args.user}: {summary} (dry run, nothing saved)")
+    elif errors and not args.skip_invalid:
+        print(f"{args.user}: nothing saved, fix the operation above and run the batch again")
+    else:
+        print(f"{args.user}: {summary}")
+        if merged:
+            print(MERGED_MESSAGE)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
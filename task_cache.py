@@ -0,0 +1,142 @@
+# Cache of parsed user task lists.
+#
+# Code that looks at many users (reports, the task server) would otherwise
+# parse every user file again each time, even when nothing has changed. The
+# cache keeps the tasks of recently used files, keyed by path, and checks the
+# size and modification time of the file and its journal on every lookup, so
+# a file changed by anyone else is read again. Saves made through writeToFile
+# in this process update the cache directly (write through).
+#
+# Entries are evicted least recently used first, once there are more than
+# max_entries of them or their estimated size goes past max_bytes.
+
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+from security_manager import SecurityTask, taskToRow, addWriteHook, removeWriteHook
+from task_journal import TaskJournal, journalPath
+from task_locking import fileVersion
+
+
+# memory of one SecurityTask without its strings, priority, category and status are interned and shared
+TASK_SIZE = sys.getsizeof(SecurityTask("", "", "", "", ""))
+
+
+def estimateSize(tasks):
+    '''Rough number of bytes a list of tasks takes in memory'''
+    size = sys.getsizeof(tasks) + TASK_SIZE * len(tasks)
+    for task in tasks:
+        size += sys.getsizeof(task.getTaskDetails()) + sys.getsizeof(task.getDueDate())
+    return size
+
+
+def _loadTasks(path):
+    return TaskJournal(path).read() # readFromFile plus the user's journal
+
+
+class TaskCache:
+    def __init__(self, max_entries=4096, max_bytes=256 * 1024 * 1024, loader=_loadTasks, write_through=True):
+        self.__max_entries = max_entries
+        self.__max_bytes = max_bytes
+        self.__loader = loader
+        self.__entries = OrderedDict() # path -> (version, tasks, size), least recently used first
+        self.__bytes = 0
+        self.__lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0 # misses because the file changed since it was cached
+        self.__write_through = write_through
+        if write_through:
+            addWriteHook(self.written)
+
+    @staticmethod
+    def __key(path):
+        return os.path.abspath(path)
+
+    @staticmethod
+    def __version(path):
+        return fileVersion(path, journalPath(path))
+
+    def get(self, path):
+        '''The tasks in a user file, parsed only if it changed since the last time
+
+        The tasks are shared with the cache, so treat them as read only and use
+        readFromFile for a list to change.
+        '''
+        key = self.__key(path)
+        version = self.__version(path)
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.__entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            if entry is not None:
+                self.invalidations += 1
+                self.__drop(key)
+
+        tasks = self.__loader(path) # parsed outside the lock so other lookups aren't held up
+        self.__store(key, version, tasks)
+        return tasks
+
+    def written(self, path, tasks):
+        '''Write hook, replaces the cached tasks of a file that was just saved'''
+        # a copy, as the caller carries on changing its own task objects
+        copy = [SecurityTask(*taskToRow(task)) for task in tasks]
+        self.__store(self.__key(path), self.__version(path), copy)
+
+    def invalidate(self, path=None):
+        '''Forget one file, or everything'''
+        with self.__lock:
+            if path is None:
+                self.__entries.clear()
+                self.__bytes = 0
+            elif self.__key(path) in self.__entries:
+                self.__drop(self.__key(path))
+
+    def __store(self, key, version, tasks):
+        size = estimateSize(tasks)
+        with self.__lock:
+            if key in self.__entries:
+                self.__drop(key)
+            if size > self.__max_bytes:
+                return # would push everything else out, not worth caching
+            self.__entries[key] = (version, tasks, size)
+            self.__bytes += size
+            while len(self.__entries) > self.__max_entries or self.__bytes > self.__max_bytes:
+                self.__drop(next(iter(self.__entries)))
+                self.evictions += 1
+
+    def __drop(self, key):
+        self.__bytes -= self.__entries.pop(key)[2]
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __contains__(self, path):
+        return self.__key(path) in self.__entries
+
+    def getSize(self):
+        '''Estimated bytes of all the cached tasks'''
+        return self.__bytes
+
+    def stats(self):
+        return {
+            "entries": len(self.__entries),
+            "bytes": self.__bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+    def close(self):
+        '''Stop following writeToFile and empty the cache'''
+        if self.__write_through:
+            removeWriteHook(self.written)
+            self.__write_through = False
+        self.invalidate()
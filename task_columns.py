@@ -0,0 +1,265 @@
+# Columnar bulk loader for user task files.
+#
+# readColumns() reads a user file straight into columns instead of building a
+# dict and a SecurityTask for every row. Priority, category and status are
+# stored as one byte codes, the due date as a day number, and the task details
+# as a plain list of strings. Filters and counts work on whole columns at once,
+# and SecurityTask objects are only made for the rows that are asked for.
+#
+# A user file with journal records that aren't compacted yet is loaded through
+# the journal instead, so the columns hold the same tasks TaskJournal.load()
+# gives, only without the fast path.
+#
+# NumPy is used for the columns and filters when it is installed, otherwise the
+# stdlib array module is used and filters run through bytes.translate, which
+# still does the per row work in C.
+
+import bisect
+import csv
+import gc
+import re
+from array import array
+from collections import Counter
+from operator import itemgetter
+
+from security_manager import SecurityTask, FIELDNAMES, columnPositions, parseDueDate, taskToRow, valueSet
+from task_journal import TaskJournal, hasJournal
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+ENCODED_FIELDS = ("priority", "category", "status")
+NO_DUE_DATE = 0 # day number stored for a missing or invalid due date (real dates start at 1)
+
+
+class TaskTable:
+    def __init__(self, details, due_dates, codes, labels, use_numpy=None):
+        self.details = details # list of task details strings
+        self.due_dates = due_dates # list of the raw due date strings
+        self.labels = labels # field -> list of labels, indexed by code
+        self.__codes = {field: {label: code for code, label in enumerate(labels[field])} for field in labels}
+        self.__numpy = numpy is not None if use_numpy is None else use_numpy
+        if self.__numpy and numpy is None:
+            raise ImportError("numpy is not installed")
+
+        # day number of each due date, parsing every distinct string only once
+        ordinals = {}
+        for due_date in set(due_dates):
+            parsed = parseDueDate(due_date)
+            ordinals[due_date] = parsed.toordinal() if parsed else NO_DUE_DATE
+        due = array("l", [ordinals[due_date] for due_date in due_dates])
+
+        if self.__numpy:
+            # zero copy views over the array buffers
+            self.columns = {field: numpy.frombuffer(column, dtype=numpy.uint8) for field, column in codes.items()}
+            self.due = numpy.frombuffer(due, dtype=f"i{due.itemsize}")
+        else:
+            self.columns = codes
+            self.due = due
+        self.__ordinals = ordinals # day number of each distinct due date string
+        self.__due_buckets = None # see __dueBuckets
+
+    def __len__(self):
+        return len(self.details)
+
+    def usesNumpy(self):
+        return self.__numpy
+
+    # -- lazy tasks --
+
+    def task(self, row):
+        '''Build the SecurityTask for one row'''
+        return SecurityTask(
+            self.details[row],
+            self.due_dates[row],
+            self.labels["priority"][self.columns["priority"][row]],
+            self.labels["category"][self.columns["category"][row]],
+            self.labels["status"][self.columns["status"][row]]
+        )
+
+    def tasks(self, rows=None):
+        '''Yield SecurityTask objects for the given rows (or every row) as they are needed'''
+        for row in (range(len(self)) if rows is None else rows):
+            yield self.task(int(row))
+
+    # -- vectorized filters --
+
+    def __fieldMask(self, field, values):
+        '''Mask of the rows whose field is one of the values'''
+        codes = [self.__codes[field][value] for value in values if value in self.__codes[field]]
+        column = self.columns[field]
+        if self.__numpy:
+            return numpy.isin(column, codes)
+        # map every code to 1 if wanted or 0 if not, for the whole column in one call
+        table = bytes(1 if code in codes else 0 for code in range(256))
+        return column.tobytes().translate(table)
+
+    def __dueBuckets(self):
+        '''The sorted distinct day numbers, the rank of the first day in each bucket and each row's bucket
+
+        Worked out on the first due date filter. Buckets are runs of days in
+        order, packed up to about 2 / 255 of the rows each, so there are never
+        more than 256 of them and a bucket is one byte per row. A day with more
+        rows than that gets a bucket to itself.
+        '''
+        if self.__due_buckets is None:
+            # counted by the due date strings, which are already objects, not by
+            # the day numbers which would each be made into an int first
+            counts = Counter()
+            for due_date, count in Counter(self.due_dates).items():
+                counts[self.__ordinals[due_date]] += count
+            days = sorted(counts)
+            target = 2 * len(self) / 255
+            first_ranks = []
+            bucket_of_day = {}
+            size = 0
+            for rank, day in enumerate(days):
+                if not first_ranks or (size + counts[day] > target and len(first_ranks) < 256):
+                    first_ranks.append(rank)
+                    size = 0
+                size += counts[day]
+                bucket_of_day[day] = len(first_ranks) - 1
+            bucket_of_date = {due_date: bucket_of_day[day] for due_date, day in self.__ordinals.items()}
+            column = bytes(map(bucket_of_date.__getitem__, self.due_dates))
+            self.__due_buckets = (days, first_ranks, column)
+        return self.__due_buckets
+
+    def __dueMask(self, due_before, due_after):
+        '''Mask of the rows with a valid due date inside the range (both ends exclusive)'''
+        low = due_after.toordinal() + 1 if due_after else NO_DUE_DATE + 1
+        high = due_before.toordinal() if due_before else None
+        if self.__numpy:
+            mask = self.due >= low
+            if high is not None:
+                mask &= self.due < high
+            return mask
+
+        # the range of days is a range of buckets, the ones wholly inside it come
+        # from one bytes.translate like __fieldMask, and only the rows of the
+        # (at most two) buckets it cuts through are checked one at a time
+        days, first_ranks, column = self.__dueBuckets()
+        first = bisect.bisect_left(days, low)
+        end = len(days) if high is None else bisect.bisect_left(days, high)
+        if first >= end:
+            return bytes(len(self))
+        first_bucket = bisect.bisect_right(first_ranks, first) - 1
+        last_bucket = bisect.bisect_right(first_ranks, end - 1) - 1
+        cut = set()
+        for bucket in (first_bucket, last_bucket):
+            bucket_end = first_ranks[bucket + 1] if bucket + 1 < len(first_ranks) else len(days)
+            if first_ranks[bucket] < first or bucket_end > end:
+                cut.add(bucket)
+        mask = bytearray(column.translate(bytes(
+            1 if first_bucket <= code <= last_bucket and code not in cut else 0 for code in range(256))))
+        due = self.due
+        for bucket in cut:
+            for match in re.finditer(re.escape(bytes([bucket])), column):
+                row = match.start()
+                mask[row] = low <= due[row] and (high is None or due[row] < high)
+        return bytes(mask)
+
+    def mask(self, exclude=None, due_before=None, due_after=None, **conditions):
+        '''Mask with one entry per row that is set where the row matches everything
+
+        e.g. table.mask(priority="A", exclude={"status": "Completed"}, due_before=date.today())
+        '''
+        masks = []
+        for field, value in conditions.items():
+            if field not in ENCODED_FIELDS:
+                raise ValueError(f"'{field}' is not an encoded field ({', '.join(ENCODED_FIELDS)})")
+            masks.append(self.__fieldMask(field, valueSet(value)))
+        for field, value in (exclude or {}).items():
+            if field not in ENCODED_FIELDS:
+                raise ValueError(f"'{field}' is not an encoded field ({', '.join(ENCODED_FIELDS)})")
+            excluded = valueSet(value)
+            masks.append(self.__fieldMask(field, [label for label in self.labels[field] if label not in excluded]))
+        if due_before is not None or due_after is not None:
+            masks.append(self.__dueMask(due_before, due_after))
+
+        if self.__numpy:
+            result = numpy.ones(len(self), dtype=bool)
+            for mask in masks:
+                result &= mask
+            return result
+
+        if not masks:
+            return b"\x01" * len(self)
+        # and the byte masks together as big integers, still one C loop per mask
+        combined = int.from_bytes(masks[0], "little")
+        for mask in masks[1:]:
+            combined &= int.from_bytes(mask, "little")
+        return combined.to_bytes(len(self), "little")
+
+    def where(self, exclude=None, due_before=None, due_after=None, **conditions):
+        '''Row numbers that match, see mask()'''
+        mask = self.mask(exclude, due_before, due_after, **conditions)
+        if self.__numpy:
+            return numpy.flatnonzero(mask).tolist()
+        return [match.start() for match in re.finditer(b"\x01", mask)]
+
+    def count(self, exclude=None, due_before=None, due_after=None, **conditions):
+        '''Number of rows that match, see mask()'''
+        mask = self.mask(exclude, due_before, due_after, **conditions)
+        if self.__numpy:
+            return int(numpy.count_nonzero(mask))
+        return mask.count(1)
+
+    def countBy(self, field):
+        '''Number of rows for each label of an encoded field'''
+        column = self.columns[field]
+        if self.__numpy:
+            counts = numpy.bincount(column, minlength=len(self.labels[field]))
+        else:
+            data = column.tobytes()
+            counts = [data.count(code) for code in range(len(self.labels[field]))]
+        return {label: int(counts[code]) for code, label in enumerate(self.labels[field])}
+
+
+def readColumns(file, use_numpy=None):
+    '''Read a user file straight into a TaskTable, with its pending journal changes'''
+    if hasJournal(file):
+        # the CSV alone is out of date, the journal has changes on top of it
+        rows = [taskToRow(task) for task in TaskJournal(file).read()]
+        return _tableFromRows(rows, range(len(FIELDNAMES)), use_numpy)
+
+    with open(file, "r", newline='') as data_file:
+        data_csv = csv.reader(data_file)
+        header = next(data_csv, None)
+        positions = columnPositions(header) if header else list(range(len(FIELDNAMES)))
+        # the row lists only live until they are turned into columns, so stop the
+        # garbage collector from scanning them over and over while they pile up
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            rows = [row for row in data_csv if row] # skip blank lines like DictReader does
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+    width = len(header) if header else len(FIELDNAMES)
+    if len(set(map(len, rows))) > 1 or (rows and len(rows[0]) != width):
+        bad = next(number for number, row in enumerate(rows, start=2) if len(row) != width)
+        raise ValueError(f"{file}: row {bad} has a different number of columns than the header")
+    return _tableFromRows(rows, positions, use_numpy)
+
+
+def _tableFromRows(rows, positions, use_numpy):
+    # pull each column out of the rows with map, which keeps the loop in C
+    details_column, due_column, priority_column, category_column, status_column = (
+        list(map(itemgetter(position), rows)) for position in positions
+    )
+
+    codes = {}
+    labels = {}
+    for field, column in zip(ENCODED_FIELDS, (priority_column, category_column, status_column)):
+        # distinct labels in the order they first appear, each one's position is its code
+        field_codes = {label: code for code, label in enumerate(dict.fromkeys(column))}
+        if len(field_codes) > 256:
+            raise ValueError(f"too many different {field} values for a one byte code ({len(field_codes)})")
+        labels[field] = list(field_codes)
+        codes[field] = array("B", map(field_codes.__getitem__, column))
+
+    return TaskTable(details_column, due_column, codes, labels, use_numpy)
@@ -0,0 +1,448 @@
+# Index of every user's tasks, for questions asked across all users.
+#
+# Finding who has overdue priority A desktop tasks would otherwise mean
+# parsing every user file. The global index files each user's tasks under
+# (status, priority, category) keys, with a reference to each task (its
+# 0-based position in the user's list and its due date as a day number), so a
+# query only looks at the tasks under the keys that can match.
+#
+# The index lives in users/.index/ as a number of shards, each a JSON file
+# holding the users whose name hashes to it, read the first time a query
+# needs it. Updating one user appends their new entry to the shard's log
+# (shard-NNN.log) instead of rewriting the shard, and the log is folded into
+# the shard once it gets big, the same way the task journal works. Building
+# from scratch indexes the user files in a pool of worker processes, the same
+# way the fleet report reads them.
+#
+# Every user's entry records the version (size and modification time) of
+# their user file and journal. writeToFile keeps the entries up to date in any
+# process with a CsvBackend on the folder (a write hook), and refresh() finds
+# users changed in any other way, e.g. journal appends, and indexes only them
+# again.
+#
+#   python task_index.py build [folder] [--shards 64] [--workers N]
+#   python task_index.py query [folder] --priority A --category Desktop --overdue
+#   python task_index.py info [folder]
+
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import sys
+import zlib
+
+from security_manager import AtomicFile, parseDueDate, addWriteHook, removeWriteHook, valueSet
+from task_journal import TaskJournal, journalPath
+from task_locking import lockedFile, fileVersion
+from task_metrics import timed
+from user_reports import findUserFiles
+
+
+VERSION = 3
+DEFAULT_SHARDS = 64
+INDEXED_FIELDS = ["status", "priority", "category"]
+SEPARATOR = "\x1f" # between the parts of a key, keys have to be strings in JSON
+LOG_MIN_BYTES = 64 * 1024 # never fold a shard's log into it while it is smaller than this
+LOG_RATIO = 0.5 # fold it in once it is this big compared to the shard
+
+
+def indexFolder(folder):
+    return os.path.join(folder, ".index")
+
+
+def shardOf(user, shards):
+    '''Shard number of a user, the same in every process (unlike hash())'''
+    return zlib.crc32(user.encode()) % shards
+
+
+def _shardPath(folder, number):
+    return os.path.join(indexFolder(folder), f"shard-{number:03d}.json")
+
+
+def _logPath(folder, number):
+    return os.path.join(indexFolder(folder), f"shard-{number:03d}.log")
+
+
+def _userOf(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _version(path):
+    return [list(stamp) if stamp else None for stamp in fileVersion(path, journalPath(path))] # as it reads back from JSON
+
+
+def userEntry(tasks, version):
+    '''A user's index entry: key -> the references of the tasks under it
+
+    Each reference is "position.day", the 0-based position and the due date as
+    a day number (nothing after the dot for no valid date), and a key's
+    references are joined with commas. JSON reads one string per key far faster
+    than a list per task, and a query only splits the strings of the keys it
+    matches.
+    '''
+    keys = {}
+    for position, task in enumerate(tasks):
+        due_date = parseDueDate(task.getDueDate())
+        key = SEPARATOR.join((task.getStatus(), task.getPriority(), task.getCategory()))
+        keys.setdefault(key, []).append(f"{position}.{due_date.toordinal()}" if due_date else f"{position}.")
+    return {"version": version, "tasks": {key: ",".join(refs) for key, refs in keys.items()}}
+
+
+def _positions(refs, low=None, high=None):
+    '''Positions in a key's references, of the tasks due from day low up to before day high if given'''
+    if low is None and high is None:
+        return [int(ref.partition(".")[0]) for ref in refs.split(",")]
+    positions = []
+    for ref in refs.split(","):
+        position, _, day = ref.partition(".")
+        if day and (low is None or int(day) >= low) and (high is None or int(day) < high):
+            positions.append(int(position))
+    return positions
+
+
+def indexUserFile(path):
+    '''Index one user file, returns (user, entry) (runs in a worker process)'''
+    version = _version(path) # taken first, so a change made while reading shows as stale later
+    try:
+        tasks = TaskJournal(path).read()
+    except (OSError, ValueError, UnicodeDecodeError) as error:
+        return _userOf(path), {"version": version, "tasks": {}, "error": f"{type(error).__name__}: {error}"}
+    return _userOf(path), userEntry(tasks, version)
+
+
+def _readShard(folder, number):
+    '''The entries in a shard, user -> entry, with its log replayed on top'''
+    path = _shardPath(folder, number)
+    try:
+        with open(path) as f:
+            shard = json.load(f)
+    except FileNotFoundError:
+        return {}
+    if shard.get("version") != VERSION:
+        raise ValueError(f"{path} is index version {shard.get('version')}, rebuild the index")
+    users = shard["users"]
+
+    try:
+        with open(_logPath(folder, number)) as f:
+            lines = f.read().split("\n")
+    except FileNotFoundError:
+        return users
+    for line_number, line in enumerate(lines):
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            if line_number == len(lines) - 1:
+                break # a half written last record from a crash, that user is found stale by refresh()
+            raise
+        # each record is a user's whole entry, so replaying one that is already in the shard does no harm
+        if record["entry"] is None:
+            users.pop(record["user"], None)
+        else:
+            users[record["user"]] = record["entry"]
+    return users
+
+
+def _writeShard(folder, number, users):
+    '''Write a shard with everything in it and drop its log (with the shard's lock held)'''
+    with AtomicFile(_shardPath(folder, number), suffix=".json") as f:
+        f.write(json.dumps({"version": VERSION, "users": users}, separators=(",", ":"))) # dumps uses the C encoder, dump does not
+    if os.path.exists(_logPath(folder, number)):
+        os.remove(_logPath(folder, number))
+
+
+def _saveEntry(folder, shards, user, entry):
+    '''Replace a user's entry in their shard (None takes them out)
+
+    The entry is appended to the shard's log, so saving one user doesn't read
+    or rewrite the other users in the shard. Once the log has grown big enough
+    it is folded into the shard.
+    '''
+    number = shardOf(user, shards)
+    shard = _shardPath(folder, number)
+    with lockedFile(shard):
+        if not os.path.exists(shard):
+            raise FileNotFoundError(f"{shard} is missing, rebuild the index")
+        log = _logPath(folder, number)
+        with open(log, "a") as f:
+            f.write(json.dumps({"user": user, "entry": entry}, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.getsize(log) >= max(LOG_MIN_BYTES, LOG_RATIO * os.path.getsize(shard)):
+            _writeShard(folder, number, _readShard(folder, number))
+
+
+def _readMeta(folder):
+    '''The index settings, None if no index was built for the folder'''
+    try:
+        with open(os.path.join(indexFolder(folder), "meta.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+@timed("index.build")
+def buildIndex(folder="users", shards=DEFAULT_SHARDS, workers=None, chunksize=8):
+    '''Index every user file in the folder from scratch, in parallel, returns the number of users'''
+    files = findUserFiles(folder)
+    workers = workers or os.cpu_count() or 1
+    entries = [{} for _ in range(shards)]
+    if workers == 1 or len(files) <= 1:
+        results = map(indexUserFile, files)
+    else:
+        pool = multiprocessing.Pool(workers)
+        results = pool.imap_unordered(indexUserFile, files, chunksize=chunksize)
+    try:
+        for user, entry in results:
+            entries[shardOf(user, shards)][user] = entry
+    finally:
+        if workers != 1 and len(files) > 1:
+            pool.close()
+            pool.join()
+
+    os.makedirs(indexFolder(folder), exist_ok=True)
+    for number, users in enumerate(entries):
+        with lockedFile(_shardPath(folder, number)):
+            _writeShard(folder, number, users)
+    with open(os.path.join(indexFolder(folder), "meta.json"), "w") as f:
+        json.dump({"version": VERSION, "shards": shards}, f)
+    return len(files)
+
+
+class GlobalIndex:
+    def __init__(self, folder="users"):
+        meta = _readMeta(folder)
+        if meta is None:
+            raise FileNotFoundError(f"no index in {folder}, build one with: python task_index.py build {folder}")
+        if meta.get("version") != VERSION:
+            raise ValueError(f"the index in {folder} is version {meta.get('version')}, rebuild it")
+        self.__folder = folder
+        self.__shards = meta["shards"]
+        self.__loaded = {} # shard number -> user -> entry, each shard read the first time a query needs it
+
+    def __shard(self, number):
+        if number not in self.__loaded:
+            self.__loaded[number] = _readShard(self.__folder, number)
+        return self.__loaded[number]
+
+    def __entries(self, users=None):
+        '''(user, entry) for every user, or for the users given, reading only their shards'''
+        if users is None:
+            for number in range(self.__shards):
+                yield from self.__shard(number).items()
+            return
+        for user in users:
+            entry = self.__shard(shardOf(user, self.__shards)).get(user)
+            if entry is not None:
+                yield user, entry
+
+    def getUsers(self):
+        return sorted(user for user, _ in self.__entries())
+
+    def getErrors(self):
+        '''user -> error for the user files that couldn't be read'''
+        return {user: entry["error"] for user, entry in self.__entries() if entry.get("error")}
+
+    # -- keeping it up to date --
+
+    def updateUser(self, path, tasks):
+        '''File a user's tasks again, e.g. from a write hook, and save their shard'''
+        user = _userOf(path)
+        self.__save(user, userEntry(tasks, _version(path)))
+
+    def __save(self, user, entry):
+        _saveEntry(self.__folder, self.__shards, user, entry)
+        users = self.__loaded.get(shardOf(user, self.__shards))
+        if users is None:
+            return # read with the change when it is first needed
+        if entry is None:
+            users.pop(user, None)
+        else:
+            users[user] = entry
+
+    @timed("index.refresh")
+    def refresh(self, users=None):
+        '''Index again the users (all, or the ones given) whose files changed since they were indexed, returns how many'''
+        files = {_userOf(path): path for path in findUserFiles(self.__folder)}
+        if users is not None:
+            files = {user: path for user, path in files.items() if user in users}
+        indexed = dict(self.__entries(users))
+        changed = 0
+        for user in indexed:
+            if user not in files: # the user file is gone
+                self.__save(user, None)
+                changed += 1
+        for user, path in files.items():
+            entry = indexed.get(user)
+            if entry is None or entry["version"] != _version(path):
+                self.__save(*indexUserFile(path))
+                changed += 1
+        return changed
+
+    # -- queries --
+
+    @staticmethod
+    def __keyFilter(exclude, conditions):
+        '''A function telling if the tasks under a key match the conditions, each key is only checked once'''
+        for field in list(conditions) + list(exclude or {}):
+            if field not in INDEXED_FIELDS:
+                raise ValueError(f"'{field}' is not an indexed field ({', '.join(INDEXED_FIELDS)})")
+        wanted = [valueSet(conditions[field]) if field in conditions else None for field in INDEXED_FIELDS]
+        unwanted = [valueSet(exclude[field]) if exclude and field in exclude else set() for field in INDEXED_FIELDS]
+        checked = {}
+
+        def matches(key):
+            result = checked.get(key)
+            if result is None:
+                result = checked[key] = not any(
+                    (allowed is not None and value not in allowed) or value in banned
+                    for value, allowed, banned in zip(key.split(SEPARATOR), wanted, unwanted)
+                )
+            return result
+        return matches
+
+    @timed("index.find")
+    def find(self, exclude=None, due_before=None, due_from=None, users=None, **conditions):
+        '''Tasks matching the conditions across all users, as user -> list of 0-based positions
+
+        Conditions are on status, priority and category like TaskStore.findTasks,
+        e.g. index.find(priority="A", category="Desktop", exclude={"status": "Completed"},
+        due_before=datetime.date.today()) finds overdue priority A desktop tasks.
+        Tasks without a valid due date never match a due date condition. With a
+        list of users only those users' shards are read.
+        '''
+        matches = self.__keyFilter(exclude, conditions)
+        low = due_from.toordinal() if due_from is not None else None
+        high = due_before.toordinal() if due_before is not None else None
+        found = {}
+        for user, entry in self.__entries(users):
+            positions = []
+            for key, refs in entry["tasks"].items():
+                if matches(key):
+                    positions.extend(_positions(refs, low, high))
+            if positions:
+                positions.sort()
+                found[user] = positions
+        return found
+
+    @timed("index.count")
+    def count(self, exclude=None, due_before=None, due_from=None, users=None, **conditions):
+        '''Number of matching tasks for each user, see find()'''
+        matches = self.__keyFilter(exclude, conditions)
+        low = due_from.toordinal() if due_from is not None else None
+        high = due_before.toordinal() if due_before is not None else None
+        dated = low is not None or high is not None
+        counts = {}
+        for user, entry in self.__entries(users):
+            number = 0
+            for key, refs in entry["tasks"].items():
+                if matches(key):
+                    number += len(_positions(refs, low, high)) if dated else refs.count(",") + 1
+            if number:
+                counts[user] = number
+        return counts
+
+    def tasks(self, user, positions):
+        '''The user's tasks at the positions find() gave (reads only that user's file)'''
+        tasks = TaskJournal(os.path.join(self.__folder, f"{user}.csv")).read()
+        return [tasks[position] for position in positions]
+
+
+class IndexWatcher:
+    '''Write hook keeping the index of a folder up to date with writeToFile, if an index was built'''
+
+    def __init__(self, folder):
+        self.__folder = os.path.abspath(folder)
+        addWriteHook(self.written)
+
+    def written(self, file, tasks):
+        '''Write hook, files the tasks of a user file that was just saved
+
+        Never raises: the user file is saved by then and the index can always be
+        brought back. If the entry can't be saved (an index to rebuild, a shard
+        that can't be read or written) it keeps the version of the file it was
+        made from, so refresh() indexes the user again.
+        '''
+        if os.path.dirname(os.path.abspath(file)) != self.__folder or not file.endswith(".csv"):
+            return
+        try:
+            meta = _readMeta(self.__folder) # read every time, the index may be built or rebuilt meanwhile
+            if meta is None:
+                return # no index built for this folder
+            if meta.get("version") != VERSION:
+                raise ValueError(f"it is index version {meta.get('version')}")
+            _saveEntry(self.__folder, meta["shards"], _userOf(file), userEntry(tasks, _version(file)))
+        except (OSError, ValueError) as error:
+            print(f"The task index in {self.__folder} is out of date for {_userOf(file)} ({error}), "
+                  f"rebuild it with: python task_index.py build {self.__folder}", file=sys.stderr)
+
+    def close(self):
+        removeWriteHook(self.written)
+
+
+def _parseDate(text):
+    due_date = parseDueDate(text)
+    if due_date is None:
+        raise argparse.ArgumentTypeError(f"invalid date '{text}', use dd/mm/yyyy")
+    return due_date
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index of every user's tasks for questions across users")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="index every user file from scratch")
+    build.add_argument("folder", nargs="?", default="users")
+    build.add_argument("--shards", type=int, default=DEFAULT_SHARDS)
+    build.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+
+    query = commands.add_parser("query", help="users with matching tasks")
+    query.add_argument("folder", nargs="?", default="users")
+    for field in INDEXED_FIELDS:
+        query.add_argument(f"--{field}", action="append", help=f"only tasks with this {field} (can be repeated)")
+    query.add_argument("--open", action="store_true", help="leave out completed tasks")
+    query.add_argument("--overdue", action="store_true", help="only tasks due before today")
+    query.add_argument("--due-before", type=_parseDate, help="only tasks due before this dd/mm/yyyy date")
+    query.add_argument("--tasks", action="store_true", help="list each matching task, not just the counts")
+    query.add_argument("--user", action="append", help="only this user (can be repeated), reads only their shards")
+    query.add_argument("--no-refresh", action="store_true", help="don't check for user files changed since indexing")
+
+    info = commands.add_parser("info", help="size of the index")
+    info.add_argument("folder", nargs="?", default="users")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        users = buildIndex(args.folder, args.shards, args.workers)
+        print(f"Indexed {users} users into {args.shards} shards in {indexFolder(args.folder)}")
+        return 0
+
+    index = GlobalIndex(args.folder)
+    if args.command == "info":
+        print(f"{indexFolder(args.folder)}: {len(index.getUsers())} users")
+        for user, error in sorted(index.getErrors().items()):
+            print(f"  could not read {user}: {error}")
+        return 0
+
+    if not args.no_refresh:
+        index.refresh(args.user)
+    conditions = {field: getattr(args, field) for field in INDEXED_FIELDS if getattr(args, field)}
+    due_before = datetime.date.today() if args.overdue else args.due_before
+    exclude = {"status": "Completed"} if args.open or args.overdue else None
+    if args.tasks: # only listing the tasks needs their positions
+        found = index.find(exclude=exclude, due_before=due_before, users=args.user, **conditions)
+        counts = {user: len(positions) for user, positions in found.items()}
+    else:
+        counts = index.count(exclude=exclude, due_before=due_before, users=args.user, **conditions)
+    for user in sorted(counts):
+        print(f"{user}: {counts[user]} tasks")
+        if args.tasks:
+            for position, task in zip(found[user], index.tasks(user, found[user])):
+                print(f"  {position + 1:>6}. {task.getTaskDetails()} ({task.getDueDate()}, {task.getStatus()})")
+    print(f"{sum(counts.values())} tasks for {len(counts)} users")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
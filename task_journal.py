@@ -0,0 +1,389 @@
+# Append-only change journal for a user task file.
+#
+# Instead of rewriting users/<user>.csv after every add, update and delete,
+# each change is appended as one small JSON line to users/<user>.journal.
+# The journal is replayed on top of the CSV snapshot when loading, and folded
+# back into the snapshot (compacted) once it grows past a threshold.
+#
+# Every record is fsynced before the edit counts as saved. With a sync window
+# set, records appended within that many seconds of each other share a single
+# fsync (group commit), which keeps bursts of edits cheap.
+#
+# A journal that loaded the tasks keeps track of the version of the files it
+# last saw. Every append or compaction takes the file lock and checks that
+# version first, so when two sessions edit the same user their changes are
+# merged rather than one overwriting the other (see task_locking).
+#
+# Callers that don't keep track of what they changed can use saveChanges()
+# instead of the record methods. It compares the list with the tasks last
+# loaded or saved: deleted tasks are found by identity, changed ones by the
+# dirty flag their setters set, and new ones at the end of the list. Only
+# those go into the journal, all in one append and one fsync, so the bytes
+# written depend on the number of changes and not on the number of tasks.
+
+import os
+import threading
+
+from security_manager import SecurityTask, writeToFile, notifyWritten, reportError, taskToRow, fsyncDirectory
+from task_locking import lockedFile, sharedLock, fileVersion, mergeRows
+from task_metrics import METRICS, timed
+from task_snapshot import readTasks, updateSnapshot
+
+
+def journalPath(filename):
+    '''Get the journal file that sits next to a user file'''
+    return os.path.splitext(filename)[0] + ".journal"
+
+
+def hasJournal(filename):
+    '''Check if a user file has journal records that aren't compacted into it yet'''
+    try:
+        return os.path.getsize(journalPath(filename)) > 0
+    except FileNotFoundError:
+        return False
+
+
+def diffTasks(saved, tasks):
+    '''The changes that turn the saved list of tasks into tasks
+
+    A list of ("delete", index), ("update", index, task) and ("add", task) to
+    apply in order, or None if tasks were reordered so only saving the whole
+    list will do.
+    '''
+    current = set(map(id, tasks))
+    # from the end, so the indexes of the deletes still to come stay right
+    changes = [("delete", index) for index in range(len(saved) - 1, -1, -1) if id(saved[index]) not in current]
+    kept = [task for task in saved if id(task) in current]
+    if len(kept) > len(tasks) or any(old is not new for old, new in zip(kept, tasks)):
+        return None
+    changes.extend(("update", index, task) for index, task in enumerate(kept) if task.isDirty())
+    changes.extend(("add", task) for task in tasks[len(kept):])
+    return changes
+
+
+def applyChanges(items, changes, convert=lambda task: task):
+    '''Apply the changes from diffTasks to a list, storing convert(task) for each task'''
+    for change in changes:
+        if change[0] == "delete":
+            del items[change[1]]
+        elif change[0] == "update":
+            items[change[1]] = convert(change[2])
+        else:
+            items.append(convert(change[1]))
+
+
+def _snapshotStamp(filename):
+    '''Size and modification time of the snapshot, used to tie a journal to it'''
+    try:
+        stat = os.stat(filename)
+    except FileNotFoundError:
+        return [0, 0]
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class TaskJournal:
+    def __init__(self, filename, min_bytes=64 * 1024, ratio=0.5, sync_window=0.0):
+        self.__filename = filename
+        self.__path = journalPath(filename)
+        self.__min_bytes = min_bytes # never compact a journal smaller than this
+        self.__ratio = ratio # compact once the journal is this big compared to the snapshot
+        self.__sync_window = sync_window # seconds appends can wait to share one fsync, 0 syncs every append
+        self.__handle = None
+        self.__timer = None
+        self.__lock = threading.Lock() # the group commit timer syncs from another thread
+        self.__size = os.path.getsize(self.__path) if os.path.exists(self.__path) else 0
+        self.__tasks = None # the list load() returned, kept in step with the files
+        self.__base = None # rows on disk as of the last time this session read or wrote them
+        self.__version = None # fileVersion of the user file and journal at that time
+        self.__saved = None # the task objects as of then, for saveChanges
+
+    def getPath(self):
+        return self.__path
+
+    def getSize(self):
+        return self.__size
+
+    @timed("journal.load")
+    def load(self, container=list):
+        '''Read the snapshot and replay the journal on top of it
+
+        The returned list (made with container, e.g. TaskStore) is remembered so
+        later changes can be checked against, and merged with, other sessions.
+        '''
+        with lockedFile(self.__filename):
+            tasks = self.__readFromDisk()
+            self.__version = self.__fileVersion()
+        self.__base = [tuple(taskToRow(task)) for task in tasks]
+        self.__saved = list(tasks)
+        self.__tasks = container(tasks)
+        return self.__tasks
+
+    @timed("journal.read")
+    def read(self, container=list):
+        '''The tasks with the journal replayed, for callers that only read them
+
+        Unlike load() nothing is kept for saving changes, and the file lock is
+        only shared (and only taken when the lock file exists), so reading never
+        creates a file.
+        '''
+        with sharedLock(self.__filename):
+            tasks = self.__readFromDisk()
+        return container(tasks)
+
+    def isCurrent(self):
+        '''Check that no other session has written since this one last loaded or saved'''
+        return self.__version is not None and self.__fileVersion() == self.__version
+
+    def __readFromDisk(self):
+        if os.path.exists(self.__filename):
+            tasks = readTasks(self.__filename) # from the binary snapshot if the user has an up to date one
+        else:
+            tasks = []
+        return self.replay(tasks)
+
+    def __fileVersion(self):
+        return fileVersion(self.__filename, self.__path)
+
+    def replay(self, tasks):
+        '''Apply every journal record to a list of tasks loaded from the snapshot'''
+        if not os.path.exists(self.__path):
+            return tasks
+        import json # only once there is a journal, loading a plain user file doesn't need it
+
+        with open(self.__path, "r", newline='') as f:
+            data = f.read()
+        if METRICS.enabled:
+            METRICS.addBytes("journal.replay", len(data.encode()))
+        lines = data.split("\n")
+
+        for number, line in enumerate(lines):
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                if number == len(lines) - 1:
+                    break # a half written last record from a crash, ignore it
+                raise
+
+            op = record["op"]
+            if op == "base":
+                # the journal was written against a different snapshot (the
+                # snapshot was rewritten after it), so its records are already in there
+                if record["snapshot"] != _snapshotStamp(self.__filename):
+                    return tasks
+            elif op == "add":
+                tasks.append(SecurityTask(*record["row"]))
+            elif op == "update":
+                task = tasks[record["index"]]
+                details, due_date, priority, category, status = record["row"]
+                task.setTaskDetails(details)
+                task.setDueDate(due_date)
+                task.setPriority(priority)
+                task.setCategory(category)
+                task.setStatus(status)
+                task.markClean() # it is on disk like this
+            elif op == "delete":
+                del tasks[record["index"]]
+        return tasks
+
+    def __append(self, *records):
+        '''Append records to the journal, with a single fsync for all of them'''
+        with self.__lock:
+            if self.__handle is None:
+                created = not os.path.exists(self.__path)
+                self.__handle = open(self.__path, "a", newline='')
+                if created:
+                    fsyncDirectory(os.path.dirname(self.__path))
+                if self.__size == 0:
+                    # first record ties the journal to the snapshot it applies to
+                    self.__write({"op": "base", "snapshot": _snapshotStamp(self.__filename)})
+            for record in records:
+                self.__write(record)
+            self.__handle.flush()
+
+            if self.__sync_window <= 0:
+                os.fsync(self.__handle.fileno())
+            elif self.__timer is None:
+                # the first unsynced record starts the window, everything
+                # appended until it ends goes out with the same fsync
+                self.__timer = threading.Timer(self.__sync_window, self.sync)
+                self.__timer.daemon = True
+                self.__timer.start()
+
+    def __write(self, record):
+        import json
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        self.__handle.write(line)
+        self.__size += len(line.encode())
+        if METRICS.enabled:
+            METRICS.addBytes("journal.append", len(line.encode()))
+
+    def __commit(self, write, changes=None, rewritten=None):
+        '''Run a write while holding the file lock, merging first if another session wrote since
+
+        The write either appends the changes (as from diffTasks) or replaces the
+        user file with the rewritten task list, in which case the snapshot and
+        write hooks are brought up to date afterwards. Returns True if the tasks
+        had to be merged with another session's changes.
+        '''
+        with lockedFile(self.__filename):
+            if self.__version is not None and self.__fileVersion() != self.__version:
+                self.__merge() # our change is already in self.__tasks, so it gets merged too
+                return True
+            try:
+                write()
+            finally:
+                # once the files changed they hold our write, even if a later step of
+                # it failed, so the next save mustn't merge against our own change
+                if self.__version is not None and self.__fileVersion() != self.__version:
+                    self.__version = self.__fileVersion()
+                    self.__noteWritten(changes, rewritten)
+            if rewritten is not None:
+                self.__published(rewritten)
+        return False
+
+    def __noteWritten(self, changes, rewritten):
+        '''Bring the rows on disk and the saved tasks in step with a write that reached the files'''
+        if rewritten is not None:
+            self.__base = [tuple(taskToRow(task)) for task in rewritten]
+            self.__saved = list(rewritten)
+        else:
+            applyChanges(self.__base, changes, lambda task: tuple(taskToRow(task)))
+            applyChanges(self.__saved, changes)
+
+    def __merge(self):
+        '''Merge this session's tasks with the ones on disk and save the result (lock already held)'''
+        theirs = [tuple(taskToRow(task)) for task in self.__readFromDisk()]
+        ours = [tuple(taskToRow(task)) for task in self.__tasks]
+        merged = mergeRows(self.__base, ours, theirs)
+
+        self.__tasks.clear() # in place, so the caller's list shows the merged tasks
+        self.__tasks.extend(SecurityTask(*row) for row in merged)
+        version = self.__fileVersion()
+        try:
+            self.__rewrite(self.__tasks)
+        finally:
+            if self.__fileVersion() != version: # see __commit
+                self.__version = self.__fileVersion()
+                self.__noteWritten(None, self.__tasks)
+        self.__published(self.__tasks)
+
+    @timed("journal.add")
+    def recordAdd(self, task):
+        '''Record a task appended to the end of the list'''
+        row = taskToRow(task)
+        return self.__savedAfter(task, self.__commit(
+            lambda: self.__append({"op": "add", "row": row}), [("add", task)]
+        ))
+
+    @timed("journal.update")
+    def recordUpdate(self, index, task):
+        '''Record the new values of the task at a 0-based index'''
+        row = taskToRow(task)
+        return self.__savedAfter(task, self.__commit(
+            lambda: self.__append({"op": "update", "index": index, "row": row}), [("update", index, task)]
+        ))
+
+    @timed("journal.delete")
+    def recordDelete(self, index):
+        '''Record the task at a 0-based index being deleted'''
+        return self.__savedAfter(None, self.__commit(
+            lambda: self.__append({"op": "delete", "index": index}), [("delete", index)]
+        ))
+
+    def __savedAfter(self, task, merged):
+        '''Note a task the caller recorded as saved, returns merged'''
+        if task is not None:
+            task.markClean()
+        return merged
+
+    @timed("journal.save")
+    def saveChanges(self, tasks):
+        '''Record only the tasks added, changed or deleted since the last load or save
+
+        Falls back to compact() when the tasks were reordered, when nothing was
+        loaded to compare with, or when so many tasks changed that rewriting the
+        user file is about as cheap. Returns True if the tasks had to be merged.
+        '''
+        changes = diffTasks(self.__saved, tasks) if self.__saved is not None else None
+        if changes is None or len(changes) > self.__ratio * len(tasks):
+            return self.compact(tasks)
+        if not changes:
+            return False
+
+        records = []
+        for change in changes:
+            if change[0] == "delete":
+                records.append({"op": "delete", "index": change[1]})
+            elif change[0] == "update":
+                records.append({"op": "update", "index": change[1], "row": taskToRow(change[2])})
+            else:
+                records.append({"op": "add", "row": taskToRow(change[1])})
+        merged = self.__commit(lambda: self.__append(*records), changes)
+        for change in changes:
+            if change[0] != "delete":
+                change[-1].markClean()
+        return merged
+
+    def needsCompaction(self):
+        '''Check if the journal is big enough to fold into the snapshot'''
+        if self.__size < self.__min_bytes:
+            return False
+        snapshot_size = _snapshotStamp(self.__filename)[0]
+        return self.__size >= self.__ratio * snapshot_size
+
+    @timed("journal.compact")
+    def compact(self, tasks):
+        '''Write the full task list as the new snapshot and start an empty journal'''
+        merged = self.__commit(lambda: self.__rewrite(tasks), rewritten=tasks)
+        if not merged:
+            for task in tasks:
+                task.markClean()
+        return merged
+
+    def __rewrite(self, tasks):
+        self.close()
+        writeToFile(self.__filename, tasks, notify=False)
+        # once the user file is rewritten the old journal no longer matches its
+        # base record, so a crash before the remove below can't replay it twice
+        if os.path.exists(self.__path):
+            os.remove(self.__path)
+        self.__size = 0
+
+    def __published(self, tasks):
+        '''Bring the snapshot and write hooks up to date after a rewrite (lock still held)
+
+        The tasks are saved by then, so these are reported rather than raised: a
+        stale snapshot is ignored by readers and the hooks' data can be rebuilt.
+        '''
+        try:
+            updateSnapshot(self.__filename, tasks)
+        except Exception:
+            reportError(f"updating the snapshot of {self.__filename}")
+        notifyWritten(self.__filename, tasks) # only now are both files in their final state
+
+    def compactIfNeeded(self, tasks):
+        '''Compact only when the journal has passed the size threshold'''
+        if self.needsCompaction():
+            self.compact(tasks)
+            return True
+        return False
+
+    @timed("journal.sync")
+    def sync(self):
+        '''Fsync any records still waiting for the group commit window'''
+        with self.__lock:
+            if self.__timer is not None:
+                self.__timer.cancel()
+                self.__timer = None
+            if self.__handle is not None:
+                self.__handle.flush()
+                os.fsync(self.__handle.fileno())
+
+    def close(self):
+        self.sync()
+        with self.__lock:
+            if self.__handle is not None:
+                self.__handle.close()
+                self.__handle = None
@@ -0,0 +1,96 @@
+# File locking and merging for several sessions editing the same user file.
+#
+# Sessions only hold the lock while they append to the journal or rewrite the
+# user file, never while the user is typing. Before writing, a session checks
+# that the files are still the version it last saw. If another session has
+# written in the meantime, the two task lists are merged instead of the last
+# writer silently overwriting the other one.
+
+import contextlib
+import os
+from collections import Counter
+
+try:
+    import fcntl
+except ImportError: # Windows, locking is skipped there
+    fcntl = None
+
+
+def lockPath(filename):
+    '''Get the lock file that sits next to a user file'''
+    return os.path.splitext(filename)[0] + ".lock"
+
+
+@contextlib.contextmanager
+def lockedFile(filename):
+    '''Hold an exclusive advisory lock on a user file for the with block'''
+    if fcntl is None:
+        yield
+        return
+    with open(lockPath(filename), "a") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+@contextlib.contextmanager
+def sharedLock(filename):
+    '''Hold a shared advisory lock on a user file for reading, without creating the lock file
+
+    Writers make the lock file before their first write, so if there is none
+    (or it can't be opened) there is no writer to wait for and nothing is locked.
+    '''
+    if fcntl is None:
+        yield
+        return
+    try:
+        lock_file = open(lockPath(filename), "r")
+    except OSError:
+        yield
+        return
+    with lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def fileVersion(*paths):
+    '''Size and modification time of each file (None if missing), to spot changes by someone else'''
+    version = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            version.append((stat.st_size, stat.st_mtime_ns))
+        except FileNotFoundError:
+            version.append(None)
+    return tuple(version)
+
+
+def mergeRows(base, ours, theirs):
+    '''Three way merge of task rows (tuples of values)
+
+    base is what both sessions started from. Rows this session removed are taken
+    out of theirs and rows it added are put after theirs, so an update is a remove
+    plus an add. If both sessions changed the same row, both versions are kept
+    rather than losing either one.
+    '''
+    base_counts = Counter(base)
+    our_counts = Counter(ours)
+    removed = base_counts - our_counts # rows we deleted or changed
+    added = our_counts - base_counts # rows we added or changed to
+
+    merged = []
+    for row in theirs:
+        if removed[row] > 0:
+            removed[row] -= 1
+            continue
+        merged.append(row)
+    for row in ours:
+        if added[row] > 0:
+            added[row] -= 1
+            merged.append(row)
+    return merged
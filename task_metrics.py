@@ -0,0 +1,227 @@
+# Lightweight instrumentation of the storage and display operations.
+#
+# Functions decorated with timed() record how many times they ran and a
+# histogram of how long they took, and the file code adds the bytes it read
+# and wrote. Gauges hold a current value and the highest it has been, like the
+# number of edits waiting for the background writer. Everything is off unless switched on, and then costs one
+# attribute check per call.
+#
+#   SECURITY_MANAGER_METRICS=metrics.json python security_manager.py
+#   python security_manager.py --metrics metrics.prom --profile cprofile
+#
+# The metrics are written when the program exits, as Prometheus text if the
+# file name ends in .prom and as JSON otherwise ("-" prints them to stderr).
+# SECURITY_MANAGER_PROFILE (or --profile) also runs cProfile or tracemalloc for
+# the whole session, saving the results next to the metrics file.
+
+import atexit
+import bisect
+import functools
+import os
+import sys
+import threading
+import time
+
+
+# upper bounds in seconds of the latency histogram buckets, anything slower goes in +Inf
+BUCKETS = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+PROFILERS = ["cprofile", "tracemalloc"]
+
+
+class Metrics:
+    def __init__(self):
+        self.enabled = False
+        self.__lock = threading.Lock() # the task server records from its storage thread too
+        self.reset()
+
+    def reset(self):
+        self.__operations = {} # name -> [count, total seconds, min, max, bucket counts]
+        self.__bytes = {} # name -> bytes
+        self.__gauges = {} # name -> [current value, highest value]
+
+    def observe(self, name, seconds):
+        '''Record one run of an operation'''
+        with self.__lock:
+            stats = self.__operations.get(name)
+            if stats is None:
+                stats = self.__operations[name] = [0, 0.0, seconds, seconds, [0] * (len(BUCKETS) + 1)]
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = min(stats[2], seconds)
+            stats[3] = max(stats[3], seconds)
+            stats[4][bisect.bisect_left(BUCKETS, seconds)] += 1
+
+    def addBytes(self, name, count):
+        with self.__lock:
+            self.__bytes[name] = self.__bytes.get(name, 0) + count
+
+    def setGauge(self, name, value):
+        with self.__lock:
+            gauge = self.__gauges.get(name)
+            if gauge is None:
+                self.__gauges[name] = [value, value]
+            else:
+                gauge[0] = value
+                gauge[1] = max(gauge[1], value)
+
+    def getGauge(self, name):
+        '''Current and highest value of a gauge, None if it was never set'''
+        gauge = self.__gauges.get(name)
+        return tuple(gauge) if gauge else None
+
+    def getCount(self, name):
+        stats = self.__operations.get(name)
+        return stats[0] if stats else 0
+
+    def getBytes(self, name):
+        return self.__bytes.get(name, 0)
+
+    def toDict(self):
+        with self.__lock:
+            operations = {}
+            for name, (count, total, fastest, slowest, buckets) in sorted(self.__operations.items()):
+                operations[name] = {
+                    "count": count,
+                    "seconds": total,
+                    "mean": total / count,
+                    "min": fastest,
+                    "max": slowest,
+                    "buckets": dict(zip([str(bound) for bound in BUCKETS] + ["+Inf"], buckets))
+                }
+            gauges = {name: {"value": value, "max": highest} for name, (value, highest) in sorted(self.__gauges.items())}
+            return {"operations": operations, "bytes": dict(sorted(self.__bytes.items())), "gauges": gauges}
+
+    def toPrometheus(self):
+        '''The metrics in the Prometheus text exposition format'''
+        metrics = self.toDict()
+        lines = [
+            "# HELP security_manager_operation_seconds Time taken by each operation.",
+            "# TYPE security_manager_operation_seconds histogram"
+        ]
+        for name, stats in metrics["operations"].items():
+            cumulative = 0
+            for bound, count in stats["buckets"].items():
+                cumulative += count # Prometheus buckets count everything up to their bound
+                lines.append(f'security_manager_operation_seconds_bucket{{operation="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'security_manager_operation_seconds_sum{{operation="{name}"}} {stats["seconds"]}')
+            lines.append(f'security_manager_operation_seconds_count{{operation="{name}"}} {stats["count"]}')
+        lines.append("# HELP security_manager_bytes_total Bytes read or written by each operation.")
+        lines.append("# TYPE security_manager_bytes_total counter")
+        for name, count in metrics["bytes"].items():
+            lines.append(f'security_manager_bytes_total{{operation="{name}"}} {count}')
+        lines.append("# HELP security_manager_gauge Current value of each gauge.")
+        lines.append("# TYPE security_manager_gauge gauge")
+        for name, gauge in metrics["gauges"].items():
+            lines.append(f'security_manager_gauge{{name="{name}"}} {gauge["value"]}')
+        lines.append("# HELP security_manager_gauge_max Highest value of each gauge.")
+        lines.append("# TYPE security_manager_gauge_max gauge")
+        for name, gauge in metrics["gauges"].items():
+            lines.append(f'security_manager_gauge_max{{name="{name}"}} {gauge["max"]}')
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+def timed(name):
+    '''Decorator recording each call of a function as the operation name, when metrics are on'''
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not METRICS.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                METRICS.observe(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def writeMetrics(output):
+    '''Write the metrics to a file, Prometheus text for .prom files and JSON otherwise, "-" for stderr'''
+    import json # only needed when metrics are on, the program starts faster without it
+    text = METRICS.toPrometheus() if output.endswith(".prom") else json.dumps(METRICS.toDict(), indent=2) + "\n"
+    if output == "-":
+        sys.stderr.write(text)
+    else:
+        with open(output, "w") as f:
+            f.write(text)
+
+
+def _profileOutput(output, extension):
+    base = "security_manager" if output in (None, "-") else os.path.splitext(output)[0]
+    return base + extension
+
+
+def _startProfiler(profile, output):
+    '''Start a profiler, returns a function that stops it and saves its results'''
+    if profile == "cprofile":
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+        def stop():
+            profiler.disable()
+            profiler.dump_stats(_profileOutput(output, ".prof")) # read with python -m pstats
+        return stop
+
+    if profile == "tracemalloc":
+        import tracemalloc
+        tracemalloc.start(10)
+
+        def stop():
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            with open(_profileOutput(output, ".tracemalloc.txt"), "w") as f:
+                f.write(f"peak traced memory: {peak} bytes\n\n")
+                for stat in snapshot.statistics("lineno")[:50]:
+                    f.write(f"{stat}\n")
+        return stop
+
+    raise ValueError(f"unknown profiler '{profile}' ({', '.join(PROFILERS)})")
+
+
+def enable(output="-", profile=None):
+    '''Start recording, and write the metrics (and any profile) to output when the program exits'''
+    METRICS.enabled = True
+    stop_profiler = _startProfiler(profile, output) if profile else None
+
+    def finish():
+        if stop_profiler is not None:
+            stop_profiler()
+        if output is not None:
+            writeMetrics(output)
+    atexit.register(finish)
+
+
+def enableFromArgs(argv):
+    '''Handle --metrics FILE and --profile NAME, returns the rest of the arguments'''
+    if not any(arg.startswith(("--metrics", "--profile")) for arg in argv):
+        return list(argv) # nothing to parse, and argparse is slow to import
+    import argparse
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--metrics")
+    parser.add_argument("--profile", choices=PROFILERS)
+    args, rest = parser.parse_known_args(argv)
+    if args.metrics or args.profile:
+        if METRICS.enabled:
+            raise SystemExit("metrics are already on (SECURITY_MANAGER_METRICS is set)")
+        enable(args.metrics or "-", args.profile)
+    return rest
+
+
+def _enableFromEnvironment():
+    output = os.environ.get("SECURITY_MANAGER_METRICS")
+    profile = os.environ.get("SECURITY_MANAGER_PROFILE")
+    if output or profile:
+        if profile and profile not in PROFILERS:
+            print(f"SECURITY_MANAGER_PROFILE: unknown profiler '{profile}' ({', '.join(PROFILERS)})", file=sys.stderr)
+            profile = None
+        enable(output or "-", profile)
+
+
+_enableFromEnvironment()
@@ -0,0 +1,83 @@
+# Table rendering for viewTasks.
+#
+# The whole table is built as one string and written with a single call, rather
+# than one print per task, which is what makes big lists slow on terminals and
+# over SSH. Only the requested page of tasks is formatted, and the format for a
+# row is worked out once per page from the widest value in each column.
+
+import heapq
+
+from security_manager import parseDueDate
+
+
+NUMBER_WIDTH = 5
+DIVIDER_WIDTH = 90
+
+# header, minimum width and value of each column after the task number
+COLUMNS = [
+    ("Task", 30, lambda task: task.getTaskDetails()),
+    ("Due Date", 12, lambda task: task.getDueDate()),
+    ("Priority", 10, lambda task: task.getPriority()),
+    ("Category", 10, lambda task: task.getCategory()),
+    ("Status", 12, lambda task: task.getStatus())
+]
+
+
+def _dueSortKey(task):
+    due_date = parseDueDate(task.getDueDate())
+    return (due_date is None, due_date or 0) # tasks without a valid date go last
+
+
+# sort_key names viewTasks understands
+SORT_KEYS = {
+    "details": lambda task: task.getTaskDetails().lower(),
+    "due": _dueSortKey,
+    "priority": lambda task: task.getPriority(),
+    "category": lambda task: task.getCategory(),
+    "status": lambda task: task.getStatus()
+}
+
+
+def pageOf(tasks, numbers=None, offset=0, limit=None, sort_key=None):
+    '''Pick one page of tasks as (task number, task) pairs
+
+    numbers are the task numbers to show (1, 2, 3.. by default), offset and
+    limit pick the page, and sort_key is a SORT_KEYS name or a function of a task.
+    '''
+    if numbers is None:
+        numbers = range(1, len(tasks) + 1)
+    end = None if limit is None else offset + limit
+
+    if sort_key is None:
+        return list(zip(numbers[offset:end], tasks[offset:end])) # only touch the rows on the page
+
+    key = SORT_KEYS[sort_key] if isinstance(sort_key, str) else sort_key
+    rows = zip(numbers, tasks)
+    if end is None:
+        ordered = sorted(rows, key=lambda row: key(row[1]))
+    else:
+        # only the first pages need to be in order, which is cheaper than sorting everything
+        ordered = heapq.nsmallest(end, rows, key=lambda row: key(row[1]))
+    return ordered[offset:end]
+
+
+def renderTasks(tasks, numbers=None, offset=0, limit=None, sort_key=None):
+    '''Build one page of the task table as a single string, see pageOf for the arguments'''
+    page = pageOf(tasks, numbers, offset, limit, sort_key)
+
+    values = [[str(number)] + [str(value(task)) for _, _, value in COLUMNS] for number, task in page]
+
+    # widen a column past its minimum only as far as this page needs
+    widths = [NUMBER_WIDTH] + [width for _, width, _ in COLUMNS]
+    for row in values:
+        for column, value in enumerate(row):
+            if len(value) > widths[column]:
+                widths[column] = len(value)
+    row_format = " ".join(f"{{:<{width}}}" for width in widths)
+
+    lines = [
+        row_format.format("", *(header for header, _, _ in COLUMNS)),
+        "-" * max(DIVIDER_WIDTH, sum(widths) + len(widths) - 1)
+    ]
+    lines.extend(row_format.format(*row) for row in values)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,222 @@
+# Check and repair the user files in the users/ folder.
+#
+# readFromFile only looks at a file's header once, to find the position of
+# each column (any of the header names in HEADER_NAMES, so the "Due_Date"
+# header createUserFile writes and other old spellings are fine), and then
+# reads every row by position. A row with fewer fields than that can't be
+# read at all, so this tool finds them before a user does.
+#
+# Every file is read a row at a time in a pool of worker processes, so no
+# file is ever held in memory. Rows are reported when:
+#
+#   malformed  the number of fields doesn't match the header, or the header
+#              itself is missing a column
+#   invalid    a priority, category or status that isn't one of the choices,
+#              or a due date that isn't a real DD/MM/YYYY date
+#
+# With --fix each file with malformed rows or an old style header is written
+# again with the standard header. A row with extra fields is mended when the
+# extra fields are empty, or when the task details were split by an unquoted
+# comma and joining them back gives valid values everywhere else. Rows that
+# can't be mended are moved to users/<user>.rejects rather than lost.
+# Invalid values are only reported, there is no way to tell what they should
+# have been. Files with journal changes not compacted yet are left alone, as
+# the journal refers to tasks by their position in the file.
+#
+#   python task_schema.py [folder] [--fix] [--workers N] [--json]
+
+import argparse
+import contextlib
+import csv
+import json
+import multiprocessing
+import os
+import sys
+from functools import partial
+
+from security_manager import FIELDNAMES, PRIORITIES, CATEGORIES, STATUSES, AtomicFile, columnPositions, parseDueDate
+from task_journal import hasJournal
+from task_locking import lockedFile
+from user_reports import findUserFiles
+
+
+# only the first problems of each file are kept, a badly broken file could have millions
+MAX_PROBLEMS = 100
+
+VALUES = [("priority", 2, PRIORITIES), ("category", 3, CATEGORIES), ("status", 4, STATUSES)]
+
+
+def rejectsPath(filename):
+    '''Get the file next to a user file that rows --fix couldn't mend are moved to'''
+    return os.path.splitext(filename)[0] + ".rejects"
+
+
+def invalidValues(row):
+    '''Problems with the values of a row in FIELDNAMES order, as messages'''
+    problems = [
+        f"{name} '{row[position]}' is not one of {', '.join(choices)}"
+        for name, position, choices in VALUES if row[position] not in choices
+    ]
+    if parseDueDate(row[1]) is None:
+        problems.append(f"due date '{row[1]}' is not a DD/MM/YYYY date")
+    return problems
+
+
+def mendRow(line, header_size, positions):
+    '''The row in FIELDNAMES order, or None if it can't be read
+
+    Extra fields are dropped when they are empty. Otherwise, if the details are
+    the first column, they are taken to hold unquoted commas and joined back
+    together, as long as the rest of the row then has valid values.
+    '''
+    if len(line) < header_size:
+        return None
+    if len(line) > header_size:
+        if not any(field.strip() for field in line[header_size:]):
+            line = line[:header_size]
+        elif positions[0] == 0:
+            extra = len(line) - header_size
+            joined = [",".join(line[:extra + 1])] + line[extra + 1:]
+            row = [joined[position] for position in positions]
+            return row if not invalidValues(row) else None
+        else:
+            return None
+    return [line[position] for position in positions]
+
+
+def checkUserFile(path, fix=False):
+    '''Check one user file a row at a time, and repair it with fix=True (runs in a worker process)'''
+    result = {"file": path, "rows": 0, "malformed": 0, "invalid": 0, "problems": [], "header": None, "fixed": False,
+              "mended": 0, "rejected": 0, "error": None}
+
+    def problem(line_number, kind, message):
+        result[kind] += 1
+        if len(result["problems"]) < MAX_PROBLEMS:
+            result["problems"].append({"line": line_number, "kind": kind, "message": message})
+
+    try:
+        with open(path, "r", newline='') as data_file:
+            data_csv = csv.reader(data_file)
+            header = next(data_csv, None)
+            if header is None:
+                return result # readFromFile reads an empty file as no tasks
+            try:
+                positions = columnPositions(header)
+            except ValueError as error:
+                problem(1, "malformed", str(error))
+                return result
+            if header != FIELDNAMES:
+                result["header"] = header
+            header_size = len(header)
+            for line in data_csv:
+                if not line:
+                    continue
+                result["rows"] += 1
+                if len(line) == header_size:
+                    row = [line[position] for position in positions]
+                else:
+                    row = mendRow(line, header_size, positions)
+                    action = "--fix can mend it" if row is not None else "--fix moves it out"
+                    problem(data_csv.line_num, "malformed", f"{len(line)} fields, expected {header_size} ({action})")
+                    if row is None:
+                        continue
+                for message in invalidValues(row):
+                    problem(data_csv.line_num, "invalid", message)
+    except (OSError, UnicodeDecodeError) as error:
+        result["error"] = f"{type(error).__name__}: {error}"
+        return result
+
+    if fix and (result["malformed"] or result["header"] is not None):
+        repairUserFile(path, result)
+    return result
+
+
+def repairUserFile(path, result):
+    '''Write the file again with the standard header, mending or moving out malformed rows
+
+    A file with journal changes isn't touched: rewriting it would change the
+    stamp the journal's records are based on and lose them. The check is made
+    under the file lock, so no session can start a journal in between.
+    '''
+    with lockedFile(path):
+        if hasJournal(path):
+            result["error"] = "it has journal changes that aren't compacted yet, open and close it to compact them"
+            return
+        with contextlib.ExitStack() as files:
+            data_csv = csv.reader(files.enter_context(open(path, "r", newline='')))
+            f = files.enter_context(AtomicFile(path, suffix=".csv", newline=''))
+            header = next(data_csv)
+            positions = columnPositions(header)
+            writer = csv.writer(f)
+            writer.writerow(FIELDNAMES)
+            rejects = None
+            for line in data_csv:
+                if not line:
+                    continue
+                row = mendRow(line, len(header), positions)
+                if row is None:
+                    if rejects is None: # only made when there is something to move out
+                        rejects = csv.writer(files.enter_context(open(rejectsPath(path), "a", newline='')))
+                    rejects.writerow(line)
+                    result["rejected"] += 1
+                    continue
+                if len(line) != len(header):
+                    result["mended"] += 1
+                writer.writerow(row)
+    result["fixed"] = True
+
+
+def checkUserFiles(folder="users", fix=False, workers=None, chunksize=4):
+    '''Check every user file in parallel, yields each file's result as it finishes'''
+    files = findUserFiles(folder)
+    check = partial(checkUserFile, fix=fix)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(files) <= 1:
+        yield from map(check, files)
+        return
+    with multiprocessing.Pool(workers) as pool:
+        yield from pool.imap_unordered(check, files, chunksize=chunksize)
+
+
+def printResult(result):
+    '''Print the problems found in one file, nothing for a file without any'''
+    if not (result["malformed"] or result["invalid"] or result["header"] or result["error"]):
+        return
+    print(f"{result['file']}: {result['rows']} rows, {result['malformed']} malformed, {result['invalid']} invalid")
+    if result["header"] is not None:
+        print(f"  old style header {result['header']}")
+    for problem in result["problems"]:
+        print(f"  line {problem['line']}: {problem['kind']}: {problem['message']}")
+    hidden = result["malformed"] + result["invalid"] - len(result["problems"])
+    if hidden > 0:
+        print(f"  ... and {hidden} more")
+    if result["fixed"]:
+        print(f"  fixed: {result['mended']} rows mended, {result['rejected']} moved to {rejectsPath(result['file'])}")
+    if result["error"]:
+        print(f"  not fixed: {result['error']}" if result["malformed"] or result["header"] else f"  {result['error']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check and repair the user files")
+    parser.add_argument("folder", nargs="?", default="users")
+    parser.add_argument("--fix", action="store_true", help="rewrite files with malformed rows or an old style header")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per file")
+    args = parser.parse_args(argv)
+
+    files = broken = 0
+    for result in checkUserFiles(args.folder, fix=args.fix, workers=args.workers):
+        files += 1
+        if result["error"] or (result["malformed"] and not result["fixed"]):
+            broken += 1
+        if args.json:
+            print(json.dumps(result))
+        else:
+            printResult(result)
+    if not args.json:
+        print(f"Checked {files} files, {broken} with rows that can't be read")
+    return 1 if broken else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+# Full text search over task details.
+#
+# SearchIndex is an inverted index from each word in the task details (case
+# folded) to the tasks that contain it. Every word of a query has to match,
+# either as a whole word or as the start of one, so "antivir desk" finds
+# "Install Antivirus On Desktop". The words are also kept sorted, which turns
+# a prefix into a binary search for the range of words starting with it.
+#
+# The index listens to its TaskStore, so adds, deletes and changes made
+# through the task setters update it as they happen. It can be saved next to
+# the user file (users/<user>.search) and is only used again while the user
+# file and journal are unchanged, otherwise it is rebuilt from the tasks.
+
+import array
+import bisect
+import os
+import re
+import sys
+
+from security_manager import AtomicFile
+from task_journal import journalPath
+from task_locking import fileVersion
+from task_metrics import timed
+
+
+VERSION = 1
+WORD = re.compile(r"\w+")
+
+
+def tokenize(text):
+    '''The case folded words in a piece of text'''
+    return WORD.findall(text.casefold())
+
+
+def searchPath(filename):
+    '''Get the saved search index that sits next to a user file'''
+    return os.path.splitext(filename)[0] + ".search"
+
+
+class SearchIndex:
+    def __init__(self, store, postings=None):
+        self.__store = store
+        # word -> task id, or a set of ids once more than one task has the word,
+        # as most words (numbers, names) only ever appear in one task
+        self.__postings = {}
+        self.__details = {} # task id -> details the task was indexed with, to find its words again
+        self.__words = [] # every word in the index, sorted
+        if postings is None:
+            for task in store:
+                self.__add(task, sort_words=False)
+            self.__words.sort()
+        else:
+            self.__postings = postings
+            self.__details = {task.getTaskId(): task.getTaskDetails() for task in store}
+            self.__words = sorted(postings)
+        store.addListener(self)
+
+    def __add(self, task, sort_words=True):
+        task_id = task.getTaskId()
+        details = task.getTaskDetails()
+        self.__details[task_id] = details
+        postings = self.__postings
+        for word in set(tokenize(details)):
+            ids = postings.get(word)
+            if ids is None:
+                postings[word] = task_id
+                if sort_words:
+                    bisect.insort(self.__words, word)
+                else:
+                    self.__words.append(word)
+            elif isinstance(ids, int):
+                postings[word] = {ids, task_id}
+            else:
+                ids.add(task_id)
+
+    def __remove(self, task_id):
+        postings = self.__postings
+        for word in set(tokenize(self.__details.pop(task_id))):
+            ids = postings[word]
+            if isinstance(ids, int):
+                del postings[word]
+                del self.__words[bisect.bisect_left(self.__words, word)]
+            else:
+                ids.discard(task_id)
+                if len(ids) == 1:
+                    postings[word] = ids.pop()
+
+    # -- TaskStore listener --
+
+    def taskAdded(self, task):
+        self.__add(task)
+
+    def taskRemoved(self, task):
+        self.__remove(task.getTaskId())
+
+    def storeCleared(self):
+        self.__postings = {}
+        self.__details = {}
+        self.__words = []
+
+    def taskChanged(self, task):
+        if self.__details.get(task.getTaskId()) != task.getTaskDetails():
+            self.__remove(task.getTaskId())
+            self.__add(task)
+
+    def close(self):
+        '''Stop following the store'''
+        self.__store.removeListener(self)
+
+    # -- queries --
+
+    def __matching(self, prefix):
+        '''Ids of the tasks with a word starting with prefix'''
+        words = self.__words
+        postings = self.__postings
+        ids = set()
+        position = bisect.bisect_left(words, prefix)
+        while position < len(words) and words[position].startswith(prefix):
+            found = postings[words[position]]
+            if isinstance(found, int):
+                ids.add(found)
+            else:
+                ids |= found
+            position += 1
+        return ids
+
+    @timed("search")
+    def search(self, query, limit=None):
+        '''Tasks with a word starting with each word of the query, in the order they were added'''
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        matches = None
+        # longer words usually match fewer tasks, so the intersection shrinks fastest
+        for term in sorted(terms, key=len, reverse=True):
+            ids = self.__matching(term)
+            matches = ids if matches is None else matches & ids
+            if not matches:
+                return []
+        store = self.__store
+        return [store.getById(task_id) for task_id in sorted(matches)[:limit]]
+
+    def getWordCount(self):
+        return len(self.__words)
+
+    # -- saving --
+
+    def save(self, filename):
+        '''Save the index next to a user file, for the tasks as they are in the file and journal now'''
+        import json # imported here, the menu starts without it
+        positions = {task.getTaskId(): position for position, task in enumerate(self.__store)}
+        header = {"version": VERSION, "files": fileVersion(filename, journalPath(filename)), "tasks": len(positions)}
+        words = self.__words
+        parts = [json.dumps(header).encode(), b"\n", json.dumps(words).encode(), b"\n"]
+        for word in words:
+            ids = self.__postings[word]
+            found = array.array("I", [positions[ids]] if isinstance(ids, int) else sorted(positions[i] for i in ids))
+            if sys.byteorder != "little":
+                found.byteswap()
+            parts.append(len(found).to_bytes(4, "little"))
+            parts.append(found.tobytes())
+
+        with AtomicFile(searchPath(filename), "wb", suffix=".search") as f:
+            f.write(b"".join(parts))
+
+    @classmethod
+    def load(cls, store, filename):
+        '''The saved index for a user file, or None if it is missing or out of date'''
+        import json
+        try:
+            with open(searchPath(filename), "rb") as f:
+                header = json.loads(f.readline())
+                if header.get("version") != VERSION or header.get("tasks") != len(store):
+                    return None
+                files = json.loads(json.dumps(fileVersion(filename, journalPath(filename)))) # tuples as JSON lists
+                if header.get("files") != files:
+                    return None
+                words = json.loads(f.readline())
+                data = f.read()
+        except (OSError, ValueError):
+            return None
+
+        ids = [task.getTaskId() for task in store]
+        postings = {}
+        position = 0
+        try:
+            for word in words:
+                count = int.from_bytes(data[position:position + 4], "little")
+                found = array.array("I", data[position + 4:position + 4 + 4 * count])
+                position += 4 + 4 * count
+                if sys.byteorder != "little":
+                    found.byteswap()
+                postings[word] = ids[found[0]] if count == 1 else {ids[index] for index in found}
+        except (IndexError, ValueError): # cut short or doesn't match the tasks
+            return None
+        return cls(store, postings)
+
+
+def openSearchIndex(store, filename=None):
+    '''The saved index for the user file if it is up to date, otherwise a new one built from the store'''
+    index = SearchIndex.load(store, filename) if filename else None
+    return index if index is not None else SearchIndex(store)
+
+
+class TaskSearch:
+    '''Search for main(): the index is only opened the first time it is used, and saved at the end'''
+
+    def __init__(self, store, filename=None):
+        self.__store = store
+        self.__filename = filename
+        self.__index = None
+
+    def search(self, query, limit=None):
+        if self.__index is None:
+            self.__index = openSearchIndex(self.__store, self.__filename)
+        return self.__index.search(query, limit)
+
+    def close(self):
+        if self.__index is not None:
+            if self.__filename:
+                self.__index.save(self.__filename)
+            self.__index.close()
+            self.__index = None
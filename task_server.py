@@ -0,0 +1,398 @@
+# Long running task manager service.
+#
+# main() in security_manager loads a user's file, works on it and exits, so
+# every session pays for starting Python and parsing the CSV again. The server
+# keeps each user's tasks loaded in a TaskStore and answers requests from any
+# number of clients over a local socket, saving changed task lists back to the
+# usual storage (users/<user>.csv by default) in the background. Before each
+# request the user's files are checked for writes by other sessions (main() or
+# a batch run) and reloaded if there were any, and users without requests for
+# a while are unloaded once their changes are saved.
+#
+#   python task_server.py --socket /tmp/tasks.sock
+#   python task_server.py --port 8765 --flush-interval 2
+#
+# The protocol is one JSON object per line each way. A request has an op and a
+# user, plus an optional id that is copied into the response:
+#
+#   {"op": "add", "user": "alice", "details": "...", "due_date": "01/06/2025", "priority": "A", ...}
+#   {"op": "update", "user": "alice", "task": 3, "status": "Completed"}
+#   {"op": "delete", "user": "alice", "task": 3}
+#   {"op": "view", "user": "alice", "offset": 0, "limit": 20, "sort": "due"}
+#   {"op": "filter", "user": "alice", "priority": "A", "exclude": {"status": "Completed"}, "overdue": true}
+#   {"op": "flush"}
+#
+# add, update and delete take the same fields as a task_batch operation. Every
+# response has "ok", and either the result or an "error" message.
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import signal
+import stat
+import sys
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from security_manager import taskToRow, parseDueDate
+from task_batch import FIELDS, applyOperation
+from task_metrics import METRICS
+from task_render import SORT_KEYS, pageOf
+
+
+def taskToDict(number, task):
+    '''A task as sent to clients, with its task number'''
+    result = {"task": number}
+    result.update(zip(FIELDS, taskToRow(task)))
+    return result
+
+
+def _checkUser(request):
+    user = request.get("user")
+    if not isinstance(user, str) or not user.strip():
+        raise ValueError("request needs a user")
+    if "/" in user or os.sep in user or user.startswith("."): # users name files, keep them in the folder
+        raise ValueError(f"invalid user '{user}'")
+    return user
+
+
+def _checkCount(request, name, default):
+    value = request.get(name, default)
+    if value is None:
+        return None
+    if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+        raise ValueError(f"{name} must be a whole number, 0 or more")
+    return value
+
+
+class _Session:
+    '''A user's loaded tasks, their change log, the number of changes not saved yet and when it was last used'''
+
+    def __init__(self, journal, tasks):
+        self.journal = journal
+        self.tasks = tasks
+        self.changes = 0
+        self.used = time.monotonic()
+
+
+class TaskServer:
+    def __init__(self, storage, flush_interval=1.0, idle_timeout=300.0):
+        self.__storage = storage
+        self.__flush_interval = flush_interval # seconds between saving changed task lists
+        self.__idle_timeout = idle_timeout # seconds a saved session is kept loaded without requests
+        self.__sessions = {}
+        self.__locks = {} # one per user, held while a request or a flush works on their tasks
+        self.__clients = set()
+        self.__server = None
+        self.__flusher = None
+        self.__socket_path = None
+        # storage is only ever used from this one thread, so file writes and fsyncs
+        # don't hold up requests and backends don't need to be thread safe
+        self.__storage_thread = ThreadPoolExecutor(1, thread_name_prefix="task-storage")
+        self.__handlers = {
+            "add": self.__change,
+            "update": self.__change,
+            "delete": self.__change,
+            "view": self.__view,
+            "filter": self.__filter,
+            "flush": self.__flushRequest
+        }
+
+    async def start(self, path=None, host="127.0.0.1", port=0):
+        '''Listen on a Unix socket at path, or on TCP host and port'''
+        if path is not None:
+            if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+                os.remove(path) # left behind by a server that didn't shut down
+            self.__server = await asyncio.start_unix_server(self.__handleClient, path=path)
+            self.__socket_path = path
+        else:
+            self.__server = await asyncio.start_server(self.__handleClient, host, port)
+        self.__flusher = asyncio.create_task(self.__flushLoop())
+
+    def getAddresses(self):
+        return [sock.getsockname() for sock in self.__server.sockets]
+
+    async def stop(self):
+        '''Stop listening, disconnect clients and save every change'''
+        self.__server.close()
+        for writer in list(self.__clients):
+            writer.close()
+        await self.__server.wait_closed()
+        self.__flusher.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self.__flusher
+        await self.flush()
+        for session in self.__sessions.values():
+            await self.__inStorageThread(session.journal.close)
+        self.__storage_thread.shutdown()
+        if self.__socket_path is not None and os.path.exists(self.__socket_path):
+            os.remove(self.__socket_path)
+
+    async def __inStorageThread(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.__storage_thread, function, *args)
+
+    def __lock(self, user):
+        return self.__locks.setdefault(user, asyncio.Lock())
+
+    def __load(self, user):
+        '''Open a user's change log and load their tasks (in the storage thread)'''
+        from task_store import TaskStore # imported here like in security_manager.main()
+        if not self.__storage.exists(user):
+            self.__storage.createUser(user)
+        journal = self.__storage.changeLog(user)
+        return _Session(journal, journal.load(TaskStore))
+
+    async def __session(self, user):
+        '''The user's session, loading it the first time (user's lock held)
+
+        If another session (main() or a batch run) wrote the user's tasks since
+        they were loaded, they are reloaded, or with changes still to save,
+        saved now so the change log merges the two.
+        '''
+        session = self.__sessions.get(user)
+        if session is None:
+            session = self.__sessions[user] = await self.__inStorageThread(self.__load, user)
+        elif not await self.__inStorageThread(session.journal.isCurrent):
+            if session.changes:
+                await self.__inStorageThread(self.__save, session) # merges into session.tasks in place
+                session.changes = 0
+            else:
+                await self.__inStorageThread(session.journal.close)
+                session = self.__sessions[user] = await self.__inStorageThread(self.__load, user)
+        session.used = time.monotonic()
+        return session
+
+    async def handle(self, request):
+        '''Answer one request, returns the response'''
+        if not isinstance(request, dict):
+            return {"ok": False, "error": "request must be a JSON object"}
+        handler = self.__handlers.get(request.get("op"))
+        start = time.perf_counter()
+        try:
+            if handler is None:
+                raise ValueError(f"unknown op '{request.get('op')}' ({', '.join(self.__handlers)})")
+            response = {"ok": True}
+            response.update(await handler(request))
+        except (ValueError, TypeError) as error:
+            response = {"ok": False, "error": str(error)}
+        except Exception: # e.g. a user file that can't be read, the server carries on
+            traceback.print_exc()
+            response = {"ok": False, "error": "internal error, see the server log"}
+        if METRICS.enabled and handler is not None:
+            METRICS.observe(f"server.{request['op']}", time.perf_counter() - start)
+        if "id" in request:
+            response["id"] = request["id"]
+        return response
+
+    async def __change(self, request):
+        user = _checkUser(request)
+        operation = {name: value for name, value in request.items() if name not in ("user", "id")}
+        async with self.__lock(user):
+            session = await self.__session(user)
+            applyOperation(session.tasks, operation)
+            session.changes += 1 # saved by the next flush
+            return {"count": len(session.tasks)}
+
+    async def __view(self, request):
+        user = _checkUser(request)
+        sort_key = request.get("sort")
+        if sort_key is not None and sort_key not in SORT_KEYS:
+            raise ValueError(f"can't sort by '{sort_key}' ({', '.join(SORT_KEYS)})")
+        offset = _checkCount(request, "offset", 0)
+        limit = _checkCount(request, "limit", None)
+        async with self.__lock(user):
+            tasks = (await self.__session(user)).tasks
+            page = pageOf(tasks, None, offset, limit, sort_key)
+            return {"count": len(tasks), "tasks": [taskToDict(number, task) for number, task in page]}
+
+    FILTER_FIELDS = {"op", "user", "id", "priority", "category", "status", "exclude", "overdue", "due_within", "today", "offset", "limit"}
+
+    async def __filter(self, request):
+        user = _checkUser(request)
+        unknown = set(request) - self.FILTER_FIELDS
+        if unknown:
+            raise ValueError(f"can't filter on '{sorted(unknown)[0]}'")
+        conditions = {field: request[field] for field in ("priority", "category", "status") if field in request}
+        exclude = request.get("exclude")
+        if exclude is not None and not isinstance(exclude, dict):
+            raise ValueError("exclude must be an object like {\"status\": \"Completed\"}")
+        today = None
+        if "today" in request:
+            today = parseDueDate(request["today"])
+            if today is None:
+                raise ValueError(f"invalid date '{request['today']}', use dd/mm/yyyy")
+        due_within = _checkCount(request, "due_within", None)
+        offset = _checkCount(request, "offset", 0)
+        limit = _checkCount(request, "limit", None)
+
+        async with self.__lock(user):
+            tasks = (await self.__session(user)).tasks
+            chosen = tasks.findTasks(exclude=exclude, **conditions)
+            # the due date views come from the store's due date index, in date order
+            if request.get("overdue"):
+                dated = tasks.overdue(today)
+            elif due_within is not None:
+                dated = tasks.dueWithin(due_within, today)
+            else:
+                dated = None
+            if dated is not None:
+                wanted = set(map(id, chosen))
+                chosen = [task for task in dated if id(task) in wanted]
+            page = pageOf(chosen, None, offset, limit)
+            return {
+                "count": len(chosen),
+                "tasks": [taskToDict(tasks.positionOf(task) + 1, task) for _, task in page]
+            }
+
+    async def __flushRequest(self, request):
+        return {"flushed": await self.flush()}
+
+    async def flush(self):
+        '''Save every user with unsaved changes, returns the number of users saved'''
+        flushed = 0
+        for user, session in list(self.__sessions.items()):
+            if not session.changes:
+                continue
+            async with self.__lock(user):
+                if session.changes:
+                    # requests for this user wait for the save, other users carry on
+                    await self.__inStorageThread(self.__save, session)
+                    session.changes = 0
+                    flushed += 1
+        return flushed
+
+    async def evictIdle(self):
+        '''Close the sessions that are saved and had no requests for idle_timeout seconds, returns how many'''
+        cutoff = time.monotonic() - self.__idle_timeout
+        evicted = 0
+        for user, session in list(self.__sessions.items()):
+            if session.changes or session.used > cutoff:
+                continue
+            async with self.__lock(user):
+                # checked again, a request may have used it while this waited for the lock
+                if self.__sessions.get(user) is session and not session.changes and session.used <= cutoff:
+                    del self.__sessions[user]
+                    await self.__inStorageThread(session.journal.close)
+                    evicted += 1
+        return evicted
+
+    @staticmethod
+    def __save(session):
+        '''Save the tasks changed since the last flush (storage thread)'''
+        session.journal.saveChanges(session.tasks)
+        session.journal.compactIfNeeded(session.tasks)
+
+    async def __flushLoop(self):
+        while True:
+            await asyncio.sleep(self.__flush_interval)
+            try:
+                await self.flush()
+                await self.evictIdle()
+            except Exception: # keep the changes and try again next time
+                traceback.print_exc()
+
+    async def __handleClient(self, reader, writer):
+        self.__clients.add(writer)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError: # longer than the stream limit
+                    writer.write(b'{"ok": false, "error": "request too long"}\n')
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    response = {"ok": False, "error": "request is not valid JSON"}
+                else:
+                    response = await self.handle(request)
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.__clients.discard(writer)
+            writer.close()
+
+
+class TaskClient:
+    '''Client for a TaskServer, e.g. await client.request("view", user="alice")'''
+
+    def __init__(self, reader, writer):
+        self.__reader = reader
+        self.__writer = writer
+
+    @classmethod
+    async def connect(cls, path=None, host="127.0.0.1", port=None):
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def request(self, op, **fields):
+        fields["op"] = op
+        self.__writer.write(json.dumps(fields).encode() + b"\n")
+        await self.__writer.drain()
+        line = await self.__reader.readline()
+        if not line:
+            raise ConnectionError("server closed the connection")
+        return json.loads(line)
+
+    async def close(self):
+        self.__writer.close()
+        with contextlib.suppress(ConnectionError):
+            await self.__writer.wait_closed()
+
+
+def makeStorage(name, folder):
+    '''Storage backend for the server, keeping its files in folder'''
+    from task_storage import getBackend
+    if name == "sqlite":
+        return getBackend(name, path=os.path.join(folder, "tasks.db"))
+    return getBackend(name, folder=folder)
+
+
+async def serve(storage, path=None, host="127.0.0.1", port=0, flush_interval=1.0, idle_timeout=300.0):
+    '''Run a server until SIGINT or SIGTERM, then save everything and stop'''
+    server = TaskServer(storage, flush_interval, idle_timeout)
+    await server.start(path, host, port)
+    print(f"Serving tasks on {', '.join(map(str, server.getAddresses()))}", flush=True)
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        with contextlib.suppress(NotImplementedError): # not on Windows
+            loop.add_signal_handler(signal_number, stopping.set)
+    await stopping.wait()
+    await server.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve users' tasks over a local socket")
+    parser.add_argument("--socket", help="Unix socket path (TCP on --host and --port otherwise)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--folder", default="users", help="where the user files are kept")
+    parser.add_argument("--storage", default=os.environ.get("SECURITY_MANAGER_STORAGE", "csv"), help="storage backend (csv or sqlite)")
+    parser.add_argument("--flush-interval", type=float, default=1.0, help="seconds between saving changes")
+    parser.add_argument("--idle-timeout", type=float, default=300.0, help="seconds before an unused user's tasks are unloaded")
+    args = parser.parse_args(argv)
+
+    storage = makeStorage(args.storage, args.folder)
+    try:
+        asyncio.run(serve(storage, args.socket, args.host, args.port, args.flush_interval, args.idle_timeout))
+    finally:
+        storage.close()
+    print("Server stopped, all changes saved.")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
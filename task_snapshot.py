@@ -0,0 +1,353 @@
+# Binary snapshot of a user file for fast cold starts.
+#
+# Parsing a big CSV file is most of the time it takes to start main(). A
+# snapshot (users/<user>.snap) holds the same tasks in a compact binary form
+# that is memory mapped instead of parsed: the due date, priority, category
+# and status are stored as integer codes into small tables of their values,
+# and each task's details as a length prefixed string found through an
+# offset table. Opening a snapshot only reads the header and the tables,
+# every task's fields are decoded when they are asked for.
+#
+# A snapshot records the size and modification time of the CSV file it was
+# made from and is ignored once the CSV changes, so the CSV stays the file of
+# record. Snapshots are optional: make one with "build" and the journal keeps
+# it up to date from then on whenever it rewrites the CSV.
+#
+#   python task_snapshot.py build users/alice.csv
+#   python task_snapshot.py export users/alice.csv copy.csv   (CSV from the snapshot)
+#   python task_snapshot.py info users/alice.csv
+#
+# Layout, little endian:
+#
+#   header   magic "SMTS", version (H), unused (H), task count (I), CSV size (q), CSV mtime_ns (q)
+#   tables   for due date, priority, category and status: value count (I), then each value as length (I) + UTF-8
+#   codes    due date codes (I each), then priority, category and status codes (H each), padded to 8 bytes
+#   offsets  where each task's details start in the details section (Q each)
+#   details  length (I) + UTF-8 for each task
+
+import mmap
+import os
+import struct
+import sys
+from collections import Counter
+from collections.abc import Sequence
+
+from security_manager import SecurityTask, AtomicFile, readFromFile, writeToFile
+from task_metrics import timed
+
+
+MAGIC = b"SMTS"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIqq")
+LENGTH = struct.Struct("<I")
+
+# the dictionary coded fields, in the order their tables and codes are stored
+CODED_FIELDS = ["due_date", "priority", "category", "status"]
+CODE_TYPES = {"due_date": "I", "priority": "H", "category": "H", "status": "H"}
+
+LITTLE_ENDIAN = sys.byteorder == "little"
+
+
+def snapshotPath(filename):
+    '''Get the snapshot file that sits next to a user file'''
+    return os.path.splitext(filename)[0] + ".snap"
+
+
+def _csvStamp(filename):
+    stat = os.stat(filename)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _padding(size):
+    return b"\0" * (-size % 8)
+
+
+def encodeSnapshot(tasks, csv_stamp=(0, 0)):
+    '''The snapshot file contents for a list of tasks, as bytes'''
+    getters = {
+        "due_date": SecurityTask.getDueDate,
+        "priority": SecurityTask.getPriority,
+        "category": SecurityTask.getCategory,
+        "status": SecurityTask.getStatus
+    }
+    tables = {field: {} for field in CODED_FIELDS} # value -> code, in the order values are first seen
+    codes = {field: [] for field in CODED_FIELDS}
+    details = []
+    for task in tasks:
+        for field in CODED_FIELDS:
+            table = tables[field]
+            value = getters[field](task)
+            code = table.get(value)
+            if code is None:
+                code = table[value] = len(table)
+            codes[field].append(code)
+        details.append(task.getTaskDetails().encode())
+
+    for field in ("priority", "category", "status"):
+        if len(tables[field]) > 0xFFFF:
+            raise ValueError(f"too many different {field} values for a snapshot")
+
+    parts = [HEADER.pack(MAGIC, VERSION, 0, len(details), *csv_stamp)]
+    for field in CODED_FIELDS:
+        parts.append(LENGTH.pack(len(tables[field])))
+        for value in tables[field]:
+            encoded = value.encode()
+            parts.append(LENGTH.pack(len(encoded)))
+            parts.append(encoded)
+    size = sum(map(len, parts))
+    parts.append(_padding(size))
+
+    code_bytes = b"".join(struct.pack(f"<{len(details)}{CODE_TYPES[field]}", *codes[field]) for field in CODED_FIELDS)
+    parts.append(code_bytes)
+    parts.append(_padding(len(code_bytes)))
+
+    offsets = []
+    offset = 0
+    for encoded in details:
+        offsets.append(offset)
+        offset += LENGTH.size + len(encoded)
+    parts.append(struct.pack(f"<{len(offsets)}Q", *offsets))
+    parts.extend(LENGTH.pack(len(encoded)) + encoded for encoded in details)
+    return b"".join(parts)
+
+
+@timed("snapshot.write")
+def writeSnapshot(filename, tasks):
+    '''Write the snapshot for a user file (after the CSV itself is written, as it records the CSV's version)'''
+    path = snapshotPath(filename)
+    data = encodeSnapshot(tasks, _csvStamp(filename))
+    # the same temp file and rename as writeToFile, so a reader never maps half a snapshot
+    with AtomicFile(path, "wb", suffix=".snap") as f:
+        f.write(data)
+    return path
+
+
+class Snapshot(Sequence):
+    '''A memory mapped snapshot, indexing it gives SecurityTask objects decoded on demand'''
+
+    def __init__(self, path):
+        self.__file = open(path, "rb")
+        try:
+            self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError: # an empty file can't be mapped
+            self.__file.close()
+            raise ValueError(f"{path} is not a task snapshot")
+        self.__views = []
+        try:
+            try:
+                self.__read()
+            except struct.error:
+                raise ValueError(f"{path} is cut short") from None
+        except BaseException:
+            self.close()
+            raise
+
+    def __read(self):
+        data = self.__map
+        if len(data) < HEADER.size:
+            raise ValueError("not a task snapshot")
+        magic, version, _, count, csv_size, csv_mtime = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError("not a task snapshot")
+        if version != VERSION:
+            raise ValueError(f"snapshot version {version} isn't supported (this is version {VERSION})")
+        self.__count = count
+        self.__csv_stamp = (csv_size, csv_mtime)
+
+        position = HEADER.size
+        self.__tables = {}
+        for field in CODED_FIELDS:
+            (values,) = LENGTH.unpack_from(data, position)
+            position += LENGTH.size
+            table = []
+            for _ in range(values):
+                (length,) = LENGTH.unpack_from(data, position)
+                position += LENGTH.size
+                if position + length > len(data):
+                    raise ValueError("snapshot is cut short")
+                value = data[position:position + length].decode()
+                table.append(sys.intern(value) if field != "due_date" else value)
+                position += length
+            self.__tables[field] = table
+        position += -position % 8
+
+        self.__codes = {}
+        for field in CODED_FIELDS:
+            position = self.__array(field, CODE_TYPES[field], position)
+        position += -position % 8
+        position = self.__array("offsets", "Q", position)
+        self.__details_start = position
+
+    def __array(self, name, code, position):
+        '''Map count values of a struct type code at position, returns the position after them'''
+        size = struct.calcsize("<" + code) * self.__count
+        if position + size > len(self.__map):
+            raise ValueError("snapshot is cut short")
+        view = memoryview(self.__map)[position:position + size]
+        if LITTLE_ENDIAN:
+            values = view.cast(code) # no copy, read straight out of the mapping
+            self.__views.extend((view, values))
+        else:
+            values = list(struct.unpack(f"<{self.__count}{code}", view))
+            view.release()
+        self.__codes[name] = values
+        return position + size
+
+    def getCsvStamp(self):
+        '''Size and modification time of the CSV file the snapshot was made from'''
+        return self.__csv_stamp
+
+    def __len__(self):
+        return self.__count
+
+    def details(self, index):
+        position = self.__details_start + self.__codes["offsets"][index]
+        (length,) = LENGTH.unpack_from(self.__map, position)
+        position += LENGTH.size
+        return self.__map[position:position + length].decode()
+
+    def value(self, field, index):
+        '''One coded field of a task, e.g. snapshot.value("status", 0)'''
+        return self.__tables[field][self.__codes[field][index]]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(self.__count))]
+        if index < 0:
+            index += self.__count
+        if not 0 <= index < self.__count:
+            raise IndexError("snapshot index out of range")
+        return SecurityTask(
+            self.details(index),
+            *(self.__tables[field][self.__codes[field][index]] for field in CODED_FIELDS)
+        )
+
+    def countBy(self, field):
+        '''Number of tasks with each value of a coded field, without decoding any task'''
+        table = self.__tables[field]
+        return Counter({table[code]: count for code, count in Counter(self.__codes[field]).items()})
+
+    def toList(self):
+        '''Every task as SecurityTask objects, decoded in one pass'''
+        data = self.__map
+        start = self.__details_start
+        unpack = LENGTH.unpack_from
+        details = []
+        for offset in self.__codes["offsets"]:
+            position = start + offset
+            (length,) = unpack(data, position)
+            position += LENGTH.size
+            details.append(data[position:position + length].decode())
+        columns = [map(self.__tables[field].__getitem__, self.__codes[field]) for field in CODED_FIELDS]
+        return [SecurityTask(*fields) for fields in zip(details, *columns)]
+
+    def close(self):
+        for view in reversed(self.__views): # the mapping can't close while views of it are alive
+            view.release()
+        self.__views = []
+        self.__codes = {}
+        self.__map.close()
+        self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def openSnapshot(filename):
+    '''The snapshot for a user file, or None if there is none or it is out of date'''
+    path = snapshotPath(filename)
+    try:
+        snapshot = Snapshot(path)
+    except FileNotFoundError:
+        return None
+    except ValueError: # an unknown version or a damaged file, the CSV still has everything
+        return None
+    try:
+        up_to_date = snapshot.getCsvStamp() == _csvStamp(filename)
+    except FileNotFoundError:
+        up_to_date = False
+    if not up_to_date:
+        snapshot.close()
+        return None
+    return snapshot
+
+
+def readTasks(filename):
+    '''readFromFile, from the snapshot when there is an up to date one'''
+    snapshot = openSnapshot(filename)
+    if snapshot is None:
+        return readFromFile(filename)
+    with snapshot:
+        return snapshot.toList()
+
+
+def updateSnapshot(filename, tasks):
+    '''Rewrite the snapshot after the CSV changed, if the user file has one'''
+    if os.path.exists(snapshotPath(filename)):
+        writeSnapshot(filename, tasks)
+
+
+def exportCsv(filename, output):
+    '''Write the tasks in a user file's snapshot out as CSV to another file, returns how many
+
+    Raises ValueError for the user file itself, which only the journal rewrites
+    (under its lock and with its records folded in), and when the snapshot
+    doesn't hold the user's current tasks: it is missing or out of date, or
+    there are journal changes it doesn't have.
+    '''
+    from task_journal import hasJournal # imported here as task_journal imports this module
+
+    if os.path.abspath(output) == os.path.abspath(filename):
+        raise ValueError(f"won't export over {filename}, give another file to write to")
+    if hasJournal(filename):
+        raise ValueError(f"{filename} has journal changes the snapshot doesn't have, "
+                         f"fold them in first with: python task_snapshot.py build {filename}")
+    snapshot = openSnapshot(filename)
+    if snapshot is None:
+        raise ValueError(f"{filename} has no up to date snapshot")
+    with snapshot:
+        tasks = snapshot.toList()
+    writeToFile(output, tasks)
+    return len(tasks)
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Binary snapshots of user files")
+    parser.add_argument("command", choices=["build", "export", "info"])
+    parser.add_argument("file", help="the user's CSV file, e.g. users/alice.csv")
+    parser.add_argument("output", nargs="?", help="where export writes the CSV (not the user file)")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        from task_journal import TaskJournal # imported here as task_journal imports this module
+        journal = TaskJournal(args.file)
+        tasks = journal.load()
+        journal.compact(tasks) # fold in the journal first, the snapshot only mirrors the CSV
+        writeSnapshot(args.file, tasks)
+        print(f"Wrote {snapshotPath(args.file)} with {len(tasks)} tasks")
+    elif args.command == "export":
+        if args.output is None:
+            parser.error("export needs a file to write to")
+        try:
+            print(f"Wrote {exportCsv(args.file, args.output)} tasks to {args.output}")
+        except ValueError as error:
+            print(error, file=sys.stderr)
+            return 1
+    else:
+        snapshot = openSnapshot(args.file)
+        if snapshot is None:
+            print(f"{args.file} has no up to date snapshot")
+            return 1
+        with snapshot:
+            print(f"{snapshotPath(args.file)}: version {VERSION}, {len(snapshot)} tasks")
+            for field in ("priority", "category", "status"):
+                print(f"  {field}: {dict(snapshot.countBy(field).most_common())}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
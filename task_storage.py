@@ -0,0 +1,519 @@
+# Pluggable storage backends for user task lists.
+#
+# StorageBackend wraps what createUserFile, readFromFile and writeToFile do for
+# the CSV files, so the same program can keep its tasks somewhere else:
+#
+#   CsvBackend     one users/<user>.csv per user plus its change journal
+#   SqliteBackend  every user in one SQLite database (WAL mode, indexed)
+#
+# Each backend also hands out a change log for a user, which main() uses to
+# save single adds, updates and deletes without writing the whole list.
+#
+#   python task_storage.py import [--folder users] [--db users/tasks.db]
+
+import contextlib
+import os
+
+from security_manager import SecurityTask, createUserFile, parseDueDate, taskToRow, valueSet
+from task_journal import TaskJournal, diffTasks, applyChanges
+from task_locking import mergeRows
+from task_metrics import timed
+
+
+class StorageBackend:
+    '''Base class for the places a user's tasks can be stored'''
+
+    def exists(self, user):
+        raise NotImplementedError
+
+    def createUser(self, user):
+        '''Start an empty task list for a new user'''
+        raise NotImplementedError
+
+    def readTasks(self, user):
+        '''The user's tasks as a list of SecurityTask objects'''
+        raise NotImplementedError
+
+    def writeTasks(self, user, tasks):
+        '''Replace all of the user's tasks'''
+        raise NotImplementedError
+
+    def userFile(self, user):
+        '''The file the user's tasks are kept in, for files that go next to it (None if there isn't one)'''
+        return None
+
+    def changeLog(self, user):
+        '''Object with load, recordAdd, recordUpdate, recordDelete, saveChanges, compact, compactIfNeeded and close for main()'''
+        raise NotImplementedError
+
+    # single task changes, these read and rewrite everything unless a backend can do better
+
+    def appendTask(self, user, task):
+        tasks = self.readTasks(user)
+        tasks.append(task)
+        self.writeTasks(user, tasks)
+
+    def replaceTask(self, user, index, task):
+        '''Replace the task at a 0-based index'''
+        tasks = self.readTasks(user)
+        tasks[index] = task
+        self.writeTasks(user, tasks)
+
+    def removeTask(self, user, index):
+        '''Remove the task at a 0-based index'''
+        tasks = self.readTasks(user)
+        del tasks[index]
+        self.writeTasks(user, tasks)
+
+    def queryTasks(self, user, exclude=None, due_before=None, **conditions):
+        '''Tasks matching the conditions on priority, category and status, e.g.
+        queryTasks(user, priority="A", exclude={"status": "Completed"}, due_before=date.today())
+        '''
+        getters = {"priority": SecurityTask.getPriority, "category": SecurityTask.getCategory, "status": SecurityTask.getStatus}
+        wanted = {field: valueSet(value) for field, value in conditions.items()}
+        unwanted = {field: valueSet(value) for field, value in (exclude or {}).items()}
+        for field in list(wanted) + list(unwanted):
+            if field not in getters:
+                raise ValueError(f"can't query on '{field}' ({', '.join(getters)})")
+
+        result = []
+        for task in self.readTasks(user):
+            if any(getters[field](task) not in values for field, values in wanted.items()):
+                continue
+            if any(getters[field](task) in values for field, values in unwanted.items()):
+                continue
+            if due_before is not None:
+                due_date = parseDueDate(task.getDueDate())
+                if due_date is None or due_date >= due_before:
+                    continue
+            result.append(task)
+        return result
+
+    @contextlib.contextmanager
+    def batch(self):
+        '''Group several changes so they are saved together, where the backend supports it'''
+        yield self
+
+    def close(self):
+        pass
+
+
+class CsvBackend(StorageBackend):
+    '''One CSV file per user in a folder, with single changes going to its journal'''
+
+    def __init__(self, folder="users", create=True):
+        self.folder = folder
+        if create: # not for readers, a missing folder just has no users
+            os.makedirs(folder, exist_ok=True)
+        self.__index_watcher = None
+        if os.path.isdir(os.path.join(folder, ".index")):
+            from task_index import IndexWatcher # only needed once someone built the global index
+            self.__index_watcher = IndexWatcher(folder) # keeps it up to date with our writes
+
+    def path(self, user):
+        return os.path.join(self.folder, f"{user}.csv")
+
+    def exists(self, user):
+        return os.path.exists(self.path(user))
+
+    def userFile(self, user):
+        return self.path(user)
+
+    def createUser(self, user):
+        return createUserFile(self.path(user))
+
+    def readTasks(self, user):
+        return TaskJournal(self.path(user)).read()
+
+    def writeTasks(self, user, tasks):
+        TaskJournal(self.path(user)).compact(tasks) # writeToFile and drop the journal
+
+    def changeLog(self, user):
+        return TaskJournal(self.path(user))
+
+    def __appendRecord(self, user, record):
+        '''Write one journal record, compacting when the journal gets too big'''
+        journal = TaskJournal(self.path(user))
+        record(journal)
+        journal.close()
+        if journal.needsCompaction():
+            journal.compact(journal.load())
+
+    def appendTask(self, user, task):
+        self.__appendRecord(user, lambda journal: journal.recordAdd(task))
+
+    def replaceTask(self, user, index, task):
+        self.__appendRecord(user, lambda journal: journal.recordUpdate(index, task))
+
+    def removeTask(self, user, index):
+        self.__appendRecord(user, lambda journal: journal.recordDelete(index))
+
+    def close(self):
+        if self.__index_watcher is not None:
+            self.__index_watcher.close()
+            self.__index_watcher = None
+
+
+class SqliteBackend(StorageBackend):
+    '''Every user's tasks in one SQLite database'''
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY,
+            user TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            details TEXT NOT NULL,
+            due_date TEXT NOT NULL,
+            due_day INTEGER,
+            priority TEXT NOT NULL,
+            category TEXT NOT NULL,
+            status TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS tasks_user_position ON tasks (user, position);
+        CREATE INDEX IF NOT EXISTS tasks_user_status ON tasks (user, status);
+        CREATE INDEX IF NOT EXISTS tasks_user_priority ON tasks (user, priority);
+        CREATE INDEX IF NOT EXISTS tasks_user_due ON tasks (user, due_day);
+    """
+
+    def __init__(self, path=os.path.join("users", "tasks.db"), create=True):
+        self.path = path
+        if not create and not os.path.exists(path):
+            raise FileNotFoundError(f"no task database at {path}") # rather than making an empty one
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # autocommit mode, transactions are started explicitly in batch(). The connection
+        # may be handed to another thread (task_server does its storage on one) but is
+        # never used by two at once
+        import sqlite3 # only loaded when the sqlite backend is used
+        self.connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL") # readers don't block the writer
+        self.connection.execute("PRAGMA synchronous=NORMAL") # WAL is still crash safe with this
+        self.connection.executescript(self.SCHEMA)
+        if "version" not in {row[1] for row in self.connection.execute("PRAGMA table_info(users)")}:
+            # made before users had a version, every write bumps it so sessions see each other's changes
+            self.connection.execute("ALTER TABLE users ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        self.__batch_depth = 0
+
+    @contextlib.contextmanager
+    def batch(self):
+        '''Run everything inside the with block as one transaction'''
+        if self.__batch_depth == 0:
+            self.connection.execute("BEGIN IMMEDIATE")
+        self.__batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self.__batch_depth -= 1
+            if self.__batch_depth == 0:
+                self.connection.execute("ROLLBACK")
+            raise
+        self.__batch_depth -= 1
+        if self.__batch_depth == 0:
+            self.connection.execute("COMMIT")
+
+    @staticmethod
+    def __values(task):
+        due_date = parseDueDate(task.getDueDate())
+        details, due, priority, category, status = taskToRow(task)
+        return details, due, due_date.toordinal() if due_date else None, priority, category, status
+
+    def exists(self, user):
+        return self.connection.execute("SELECT 1 FROM users WHERE name = ?", (user,)).fetchone() is not None
+
+    def createUser(self, user):
+        self.connection.execute("INSERT OR IGNORE INTO users (name) VALUES (?)", (user,))
+        return []
+
+    def userVersion(self, user):
+        '''Number of writes to the user's tasks so far, to tell if another session changed them'''
+        row = self.connection.execute("SELECT version FROM users WHERE name = ?", (user,)).fetchone()
+        return row[0] if row else 0
+
+    def __bump(self, user):
+        '''Count a write to the user's tasks (inside its transaction), returns the new version'''
+        self.createUser(user)
+        self.connection.execute("UPDATE users SET version = version + 1 WHERE name = ?", (user,))
+        return self.userVersion(user)
+
+    @timed("sqlite.read")
+    def readTasks(self, user):
+        cursor = self.connection.execute(
+            "SELECT details, due_date, priority, category, status FROM tasks WHERE user = ? ORDER BY position",
+            (user,)
+        )
+        return [SecurityTask(*row) for row in cursor]
+
+    def readVersioned(self, user):
+        '''(version, row ids, tasks) of the user as of one moment, for a session to save changes by row id'''
+        with self.batch():
+            cursor = self.connection.execute(
+                "SELECT id, details, due_date, priority, category, status FROM tasks WHERE user = ? ORDER BY position",
+                (user,)
+            )
+            ids = []
+            tasks = []
+            for row in cursor:
+                ids.append(row[0])
+                tasks.append(SecurityTask(*row[1:]))
+            return self.userVersion(user), ids, tasks
+
+    @timed("sqlite.write")
+    def writeTasks(self, user, tasks):
+        '''Replace all of the user's tasks, returns the new (version, row ids)'''
+        with self.batch():
+            self.connection.execute("DELETE FROM tasks WHERE user = ?", (user,))
+            ids = [self.__insert(user, position, task) for position, task in enumerate(tasks)]
+            return self.__bump(user), ids
+
+    def __insert(self, user, position, task):
+        cursor = self.connection.execute(
+            "INSERT INTO tasks (user, position, details, due_date, due_day, priority, category, status) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (user, position) + self.__values(task)
+        )
+        return cursor.lastrowid
+
+    def changeLog(self, user):
+        return SqliteChangeLog(self, user)
+
+    def __taskId(self, user, index):
+        '''Row id of the task at a 0-based index'''
+        row = self.connection.execute(
+            "SELECT id FROM tasks WHERE user = ? ORDER BY position LIMIT 1 OFFSET ?", (user, index)
+        ).fetchone()
+        if row is None:
+            raise IndexError("task index out of range")
+        return row[0]
+
+    @timed("sqlite.add")
+    def appendTask(self, user, task):
+        with self.batch():
+            self.createUser(user)
+            self.connection.execute(
+                "INSERT INTO tasks (user, position, details, due_date, due_day, priority, category, status) "
+                "VALUES (?, (SELECT COALESCE(MAX(position), -1) + 1 FROM tasks WHERE user = ?), ?, ?, ?, ?, ?, ?)",
+                (user, user) + self.__values(task)
+            )
+            self.__bump(user)
+
+    @timed("sqlite.update")
+    def replaceTask(self, user, index, task):
+        with self.batch():
+            self.connection.execute(
+                "UPDATE tasks SET details = ?, due_date = ?, due_day = ?, priority = ?, category = ?, status = ? "
+                "WHERE id = ?",
+                self.__values(task) + (self.__taskId(user, index),)
+            )
+            self.__bump(user)
+
+    @timed("sqlite.delete")
+    def removeTask(self, user, index):
+        # positions after it are left as they are, only their order matters
+        with self.batch():
+            self.connection.execute("DELETE FROM tasks WHERE id = ?", (self.__taskId(user, index),))
+            self.__bump(user)
+
+    @timed("sqlite.save")
+    def saveTaskChanges(self, user, changes, ids):
+        '''Apply changes from diffTasks to the rows with the ids (in list order) in one transaction
+
+        Returns the new (version, row ids). The caller checks userVersion() in the
+        same transaction first, as the changes are only right for those rows.
+        '''
+        ids = list(ids) # the caller's stays as it was if the transaction rolls back
+        with self.batch():
+            position = self.connection.execute(
+                "SELECT COALESCE(MAX(position), -1) + 1 FROM tasks WHERE user = ?", (user,)
+            ).fetchone()[0]
+            for change in changes:
+                if change[0] == "delete":
+                    self.connection.execute("DELETE FROM tasks WHERE id = ?", (ids.pop(change[1]),))
+                elif change[0] == "update":
+                    self.connection.execute(
+                        "UPDATE tasks SET details = ?, due_date = ?, due_day = ?, priority = ?, category = ?, status = ? "
+                        "WHERE id = ?",
+                        self.__values(change[2]) + (ids[change[1]],)
+                    )
+                else:
+                    ids.append(self.__insert(user, position, change[1]))
+                    position += 1
+            return self.__bump(user), ids
+
+    @timed("sqlite.query")
+    def queryTasks(self, user, exclude=None, due_before=None, **conditions):
+        columns = ("priority", "category", "status")
+        clauses = ["user = ?"]
+        params = [user]
+        for field, value in conditions.items():
+            if field not in columns:
+                raise ValueError(f"can't query on '{field}' ({', '.join(columns)})")
+            values = sorted(valueSet(value))
+            clauses.append(f"{field} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+        for field, value in (exclude or {}).items():
+            if field not in columns:
+                raise ValueError(f"can't query on '{field}' ({', '.join(columns)})")
+            values = sorted(valueSet(value))
+            clauses.append(f"{field} NOT IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+        if due_before is not None:
+            clauses.append("due_day < ?")
+            params.append(due_before.toordinal())
+
+        cursor = self.connection.execute(
+            "SELECT details, due_date, priority, category, status FROM tasks "
+            f"WHERE {' AND '.join(clauses)} ORDER BY position",
+            params
+        )
+        return [SecurityTask(*row) for row in cursor]
+
+    def close(self):
+        self.connection.close()
+
+
+class SqliteChangeLog:
+    '''Saves main()'s changes as single row updates, merging with other sessions like TaskJournal'''
+
+    def __init__(self, backend, user, ratio=0.5):
+        self.__backend = backend
+        self.__user = user
+        self.__ratio = ratio # rewrite the whole list when more than this share of it changed, like TaskJournal
+        self.__tasks = None # the list load() returned
+        self.__saved = None # the task objects as last loaded or saved, for saveChanges
+        self.__ids = None # row id of each of them
+        self.__base = None # their rows, what a merge starts from
+        self.__version = None # userVersion() as of then
+
+    def load(self, container=list):
+        self.__version, self.__ids, tasks = self.__backend.readVersioned(self.__user)
+        self.__saved = list(tasks)
+        self.__base = [tuple(taskToRow(task)) for task in tasks]
+        self.__tasks = container(tasks)
+        return self.__tasks
+
+    def isCurrent(self):
+        '''Check that no other session has written since this one last loaded or saved'''
+        return self.__version is not None and self.__backend.userVersion(self.__user) == self.__version
+
+    def __commit(self, changes):
+        '''Save changes by row id in one transaction, merging first if another session wrote since
+
+        Returns True if the tasks had to be merged with another session's changes.
+        '''
+        with self.__backend.batch():
+            if self.__saved is None: # nothing loaded, so the indexes are of the rows as they are now
+                _, ids, _ = self.__backend.readVersioned(self.__user)
+                self.__backend.saveTaskChanges(self.__user, changes, ids)
+            elif self.__backend.userVersion(self.__user) != self.__version:
+                self.__merge()
+                return True
+            else:
+                self.__version, self.__ids = self.__backend.saveTaskChanges(self.__user, changes, self.__ids)
+        for change in changes:
+            if change[0] != "delete":
+                change[-1].markClean()
+        if self.__saved is not None:
+            applyChanges(self.__saved, changes)
+            applyChanges(self.__base, changes, lambda task: tuple(taskToRow(task)))
+        return False
+
+    def __merge(self):
+        '''Merge this session's tasks with the ones in the database and save the result (in the transaction)'''
+        _, _, theirs = self.__backend.readVersioned(self.__user)
+        ours = [tuple(taskToRow(task)) for task in self.__tasks]
+        merged = mergeRows(self.__base, ours, [tuple(taskToRow(task)) for task in theirs])
+
+        self.__tasks.clear() # in place, so the caller's list shows the merged tasks
+        self.__tasks.extend(SecurityTask(*row) for row in merged)
+        self.__version, self.__ids = self.__backend.writeTasks(self.__user, self.__tasks)
+        self.__saved = list(self.__tasks)
+        self.__base = merged
+
+    def recordAdd(self, task):
+        return self.__commit([("add", task)])
+
+    def recordUpdate(self, index, task):
+        return self.__commit([("update", index, task)])
+
+    def recordDelete(self, index):
+        return self.__commit([("delete", index)])
+
+    def saveChanges(self, tasks):
+        '''Save only the tasks added, changed or deleted since the last load or save, in one transaction'''
+        changes = diffTasks(self.__saved, tasks) if self.__saved is not None else None
+        if changes is None or len(changes) > self.__ratio * len(tasks):
+            return self.compact(tasks)
+        if not changes:
+            return False
+        return self.__commit(changes)
+
+    def compact(self, tasks):
+        '''Save the whole list in one transaction, merging first if another session wrote since loading
+
+        Returns True if the tasks had to be merged with another session's changes.
+        '''
+        with self.__backend.batch():
+            if self.__saved is not None and self.__backend.userVersion(self.__user) != self.__version:
+                self.__merge() # merges self.__tasks, the list load() returned, like TaskJournal
+                return True
+            self.__version, self.__ids = self.__backend.writeTasks(self.__user, tasks)
+        for task in tasks:
+            task.markClean()
+        if self.__saved is not None:
+            self.__saved = list(tasks)
+            self.__base = [tuple(taskToRow(task)) for task in tasks]
+        return False
+
+    def compactIfNeeded(self, tasks):
+        return False # every change is already in the database
+
+    def close(self):
+        pass
+
+
+BACKENDS = {"csv": CsvBackend, "sqlite": SqliteBackend}
+
+
+def getBackend(name="csv", **options):
+    '''Make a storage backend by name (csv or sqlite)'''
+    if name not in BACKENDS:
+        raise ValueError(f"unknown storage backend '{name}' ({', '.join(BACKENDS)})")
+    return BACKENDS[name](**options)
+
+
+def importCsvUsers(backend, folder="users"):
+    '''Copy every users/*.csv (with its journal) into another backend, returns the number of users'''
+    import glob
+    source = CsvBackend(folder)
+    imported = 0
+    for path in sorted(glob.glob(os.path.join(folder, "*.csv"))):
+        user = os.path.splitext(os.path.basename(path))[0]
+        backend.writeTasks(user, source.readTasks(user)) # one transaction per user
+        imported += 1
+    return imported
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Manage task storage backends")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_command = commands.add_parser("import", help="copy the CSV user files into a SQLite database")
+    import_command.add_argument("--folder", default="users")
+    import_command.add_argument("--db", default=os.path.join("users", "tasks.db"))
+    args = parser.parse_args()
+
+    if args.command == "import":
+        backend = SqliteBackend(args.db)
+        try:
+            count = importCsvUsers(backend, args.folder)
+        finally:
+            backend.close()
+        print(f"Imported {count} user(s) into {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+# Indexed task store.
+#
+# TaskStore behaves like the plain list of SecurityTask objects that the rest of
+# the program uses (1-based task numbers still map to tasks[number - 1]), but it
+# also gives every task a stable id and keeps secondary indexes on priority,
+# category, status and the parsed due date. Filtered queries look up the index
+# buckets instead of scanning every task.
+#
+# Due dates are also kept in a sorted list, so overdue, due soon and sorted by
+# due date views are a binary search plus the tasks in range.
+#
+# updateWhere and deleteWhere change every task matching a query at once, e.g.
+# closing out a scan campaign with
+#
+#   store.updateWhere({"status": "Completed"}, category="Desktop", priority="C")
+#   store.deleteWhere(status="Completed", due_before=datetime.date(2025, 1, 1))
+#
+# which finds the tasks from the indexes and makes one pass over the list,
+# instead of a lookup (and for deletes a list shift) per task.
+#
+# A task can only belong to one store at a time, since the store is what its
+# setters report changes to.
+
+import bisect
+import datetime
+import itertools
+from collections.abc import MutableSequence
+
+from security_manager import SecurityTask, parseDueDate, valueSet
+
+
+# the fields that get a secondary index, and how to read each one off a task
+INDEXED_FIELDS = {
+    "priority": lambda task: task.getPriority(),
+    "category": lambda task: task.getCategory(),
+    "status": lambda task: task.getStatus(),
+    "due_date": lambda task: parseDueDate(task.getDueDate())
+}
+
+
+FIELD_POSITIONS = {field: position for position, field in enumerate(INDEXED_FIELDS)} # where each field is in a task's index keys
+DUE_DATE = FIELD_POSITIONS["due_date"]
+
+# the fields updateWhere can set, with the getter and setter for each
+SETTABLE_FIELDS = {
+    "details": (SecurityTask.getTaskDetails, SecurityTask.setTaskDetails),
+    "due_date": (SecurityTask.getDueDate, SecurityTask.setDueDate),
+    "priority": (SecurityTask.getPriority, SecurityTask.setPriority),
+    "category": (SecurityTask.getCategory, SecurityTask.setCategory),
+    "status": (SecurityTask.getStatus, SecurityTask.setStatus)
+}
+
+
+class TaskStore(MutableSequence):
+    def __init__(self, tasks=()):
+        self.__order = [] # task ids in list order
+        self.__tasks = {} # task id -> task
+        self.__keys = {} # task id -> the indexed values the task is filed under
+        self.__indexes = {field: {} for field in INDEXED_FIELDS} # field -> value -> set of task ids
+        self.__due_order = [] # sorted (due day number, task id) for every task with a valid due date
+        self.__positions = {} # task id -> 0-based position, rebuilt after anything but an append
+        self.__next_id = itertools.count(1)
+        self.__sort_due_later = False # set while extend() adds tasks in bulk
+        self.__prune_due_later = False # set while deleteWhere() removes tasks in bulk
+        self.__listeners = [] # other indexes kept up to date with the store, see addListener
+        self.extend(tasks)
+
+    # -- list behaviour --
+
+    def __len__(self):
+        return len(self.__order)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.__tasks[task_id] for task_id in self.__order[index]]
+        return self.__tasks[self.__order[index]]
+
+    def __setitem__(self, index, task):
+        if isinstance(index, slice):
+            self.__setSlice(index, task)
+            return
+        old_id = self.__order[index]
+        if self.__tasks[old_id] is task:
+            return
+        if task in self:
+            raise ValueError("task is already in this store")
+        self.__remove(old_id)
+        self.__order[index] = self.__add(task)
+        self.__positions.clear()
+
+    def __setSlice(self, index, tasks):
+        '''store[i:j] = tasks like a list, tasks already in the slice keep their ids'''
+        tasks = list(tasks)
+        old_ids = self.__order[index]
+        if index.step not in (None, 1) and len(tasks) != len(old_ids):
+            raise ValueError(f"attempt to assign sequence of size {len(tasks)} to extended slice of size {len(old_ids)}")
+        in_slice = set(old_ids)
+        kept = [task in self for task in tasks] # worked out before anything changes
+        seen = set()
+        for task, is_kept in zip(tasks, kept):
+            if id(task) in seen or (is_kept and task.getTaskId() not in in_slice):
+                raise ValueError("task is already in this store")
+            seen.add(id(task))
+
+        reused = {task.getTaskId() for task, is_kept in zip(tasks, kept) if is_kept}
+        for task_id in old_ids:
+            if task_id not in reused:
+                self.__remove(task_id)
+        self.__order[index] = [task.getTaskId() if is_kept else self.__add(task) for task, is_kept in zip(tasks, kept)]
+        self.__positions.clear()
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            for task_id in self.__order[index]:
+                self.__remove(task_id)
+        else:
+            self.__remove(self.__order[index])
+        del self.__order[index]
+        self.__positions.clear()
+
+    def insert(self, index, task):
+        self.__order.insert(index, self.__add(task))
+        self.__positions.clear()
+
+    def append(self, task):
+        task_id = self.__add(task)
+        if len(self.__positions) == len(self.__order):
+            self.__positions[task_id] = len(self.__order) # still up to date, just add the new one
+        self.__order.append(task_id) # avoids the generic insert(len(self), task)
+
+    def extend(self, tasks):
+        '''Append many tasks, sorting the due date index once instead of inserting into it per task'''
+        if tasks is self:
+            tasks = list(tasks)
+        self.__sort_due_later = True
+        try:
+            for task in tasks:
+                self.append(task)
+        finally:
+            self.__sort_due_later = False
+            self.__due_order.sort()
+
+    def clear(self):
+        '''Remove every task in one pass, rather than MutableSequence's pop() per task'''
+        for task_id in self.__order:
+            self.__tasks[task_id].detachFromStore()
+        for listener in self.__listeners:
+            listener.storeCleared()
+        self.__order = []
+        self.__tasks = {}
+        self.__keys = {}
+        self.__indexes = {field: {} for field in INDEXED_FIELDS}
+        self.__due_order = []
+        self.__positions = {}
+
+    def __iter__(self):
+        tasks = self.__tasks
+        return (tasks[task_id] for task_id in self.__order)
+
+    def __contains__(self, task):
+        get_task_id = getattr(task, "getTaskId", None) # anything but a task is simply not in the store
+        return get_task_id is not None and self.__tasks.get(get_task_id()) is task
+
+    def index(self, task, start=0, stop=None):
+        '''0-based position of a task in the list'''
+        if task not in self:
+            raise ValueError("task is not in this store")
+        return self.__order.index(task.getTaskId(), start, len(self) if stop is None else stop)
+
+    def reverse(self):
+        self.__order.reverse() # reorder without giving the tasks new ids
+        self.__positions.clear()
+
+    def sort(self, key=None, reverse=False):
+        '''Sort in place like list.sort, key is given each task'''
+        tasks = self.__tasks
+        if key is None:
+            raise TypeError("SecurityTask objects can't be compared, pass a key")
+        self.__order.sort(key=lambda task_id: key(tasks[task_id]), reverse=reverse)
+        self.__positions.clear()
+
+    def __repr__(self):
+        return f"TaskStore({len(self)} tasks)"
+
+    # -- ids and indexes --
+
+    def __add(self, task):
+        '''Give a task a new id and file it in the indexes'''
+        task_id = next(self.__next_id)
+        self.__tasks[task_id] = task
+        task.attachToStore(self, task_id)
+        self.__index(task_id, task)
+        for listener in self.__listeners:
+            listener.taskAdded(task)
+        return task_id
+
+    def __remove(self, task_id):
+        '''Forget a task and take it out of the indexes'''
+        for listener in self.__listeners:
+            listener.taskRemoved(self.__tasks[task_id]) # while it still has its id
+        task = self.__tasks.pop(task_id)
+        task.detachFromStore()
+        self.__unindex(task_id)
+
+    def __index(self, task_id, task, due_order=True):
+        keys = tuple(getter(task) for getter in INDEXED_FIELDS.values())
+        self.__keys[task_id] = keys
+        for field, key in zip(INDEXED_FIELDS, keys):
+            self.__indexes[field].setdefault(key, set()).add(task_id)
+        if keys[DUE_DATE] is not None and due_order:
+            if self.__sort_due_later:
+                self.__due_order.append((keys[DUE_DATE].toordinal(), task_id))
+            else:
+                bisect.insort(self.__due_order, (keys[DUE_DATE].toordinal(), task_id))
+
+    def __unindex(self, task_id, due_order=True):
+        keys = self.__keys.pop(task_id)
+        for field, key in zip(INDEXED_FIELDS, keys):
+            bucket = self.__indexes[field][key]
+            bucket.discard(task_id)
+            if not bucket:
+                del self.__indexes[field][key] # drop empty buckets so value lists stay short
+        if keys[DUE_DATE] is not None and due_order and not self.__prune_due_later:
+            del self.__due_order[bisect.bisect_left(self.__due_order, (keys[DUE_DATE].toordinal(), task_id))]
+
+    def taskChanged(self, task):
+        '''Called by a task's setters so its index entries follow the new values'''
+        task_id = task.getTaskId()
+        old_keys = self.__keys.get(task_id)
+        keys = tuple(getter(task) for getter in INDEXED_FIELDS.values())
+        if old_keys != keys:
+            # the sorted due dates only need touching when the due date itself changed
+            due_changed = old_keys[DUE_DATE] != keys[DUE_DATE]
+            self.__unindex(task_id, due_changed)
+            self.__index(task_id, task, due_changed)
+        for listener in self.__listeners:
+            listener.taskChanged(task)
+
+    def addListener(self, listener):
+        '''Keep another index in step with the store
+
+        listener.taskAdded(task), taskRemoved(task) and taskChanged(task) are
+        called for every task added, removed or changed through its setters,
+        and listener.storeCleared() when clear() removes every task at once.
+        '''
+        self.__listeners.append(listener)
+
+    def removeListener(self, listener):
+        self.__listeners.remove(listener)
+
+    def positionOf(self, task):
+        '''0-based position of a task, without a scan once the positions are worked out'''
+        if len(self.__positions) != len(self.__order):
+            self.__positions = {task_id: position for position, task_id in enumerate(self.__order)}
+        return self.__positions[task.getTaskId()]
+
+    def getById(self, task_id):
+        '''Get a task by its stable id, or None if it isn't in the store'''
+        return self.__tasks.get(task_id)
+
+    def values(self, field):
+        '''All the distinct values currently stored for an indexed field'''
+        return list(self.__indexes[field])
+
+    # -- queries --
+
+    def __dueIds(self, start, end):
+        '''Set of ids of the tasks due from start up to but not including end'''
+        low = 0 if start is None else bisect.bisect_left(self.__due_order, (start.toordinal(),))
+        high = len(self.__due_order) if end is None else bisect.bisect_left(self.__due_order, (end.toordinal(),))
+        return {task_id for _, task_id in self.__due_order[low:high]}
+
+    def __matchingIds(self, conditions, exclude, due_from=None, due_before=None):
+        '''Set of task ids matching every condition, built from the index buckets'''
+        for field in list(conditions) + list(exclude or {}):
+            if field not in INDEXED_FIELDS:
+                raise ValueError(f"'{field}' is not an indexed field ({', '.join(INDEXED_FIELDS)})")
+
+        # union the buckets for each condition, a due date range is one more set
+        matches = []
+        for field, value in conditions.items():
+            index = self.__indexes[field]
+            buckets = [index[key] for key in valueSet(value) if key in index]
+            if not buckets:
+                return set()
+            matches.append(buckets[0] if len(buckets) == 1 else set().union(*buckets))
+        if due_from is not None or due_before is not None:
+            matches.append(self.__dueIds(due_from, due_before))
+
+        if not matches:
+            # only exclusions, so everything but the excluded buckets
+            result = set(self.__tasks)
+            for field, value in (exclude or {}).items():
+                index = self.__indexes[field]
+                for key in valueSet(value):
+                    result.difference_update(index.get(key, ()))
+            return result
+
+        # intersect starting from the smallest, then check what's left against
+        # the exclusions by each task's own keys, so the cost follows the
+        # candidates rather than the size of the buckets being left out
+        matches.sort(key=len)
+        result = set(matches[0])
+        for ids in matches[1:]:
+            result.intersection_update(ids)
+            if not result:
+                return result
+        if exclude:
+            excluded = [(FIELD_POSITIONS[field], valueSet(value)) for field, value in exclude.items()]
+            keys = self.__keys
+            result = {task_id for task_id in result
+                      if not any(keys[task_id][position] in values for position, values in excluded)}
+        return result
+
+    def findTasks(self, exclude=None, due_from=None, due_before=None, **conditions):
+        '''Tasks matching the conditions, in the order they were added
+
+        e.g. store.findTasks(priority="A", exclude={"status": "Completed"})
+        A condition value can also be a list of values, any of which match.
+        due_from and due_before limit it to tasks due in that range (due_before
+        itself not included), which leaves out tasks without a valid due date.
+        '''
+        tasks = self.__tasks
+        return [tasks[task_id] for task_id in sorted(self.__matchingIds(conditions, exclude, due_from, due_before))]
+
+    def countTasks(self, exclude=None, due_from=None, due_before=None, **conditions):
+        '''Number of tasks matching the conditions, see findTasks()'''
+        return len(self.__matchingIds(conditions, exclude, due_from, due_before))
+
+    # -- bulk changes --
+
+    def updateWhere(self, values, exclude=None, due_from=None, due_before=None, **conditions):
+        '''Set fields on every task matching the conditions (see findTasks), returns how many tasks changed
+
+        values maps SETTABLE_FIELDS names to their new values. Tasks that already
+        have those values are left alone, so they aren't saved again.
+        '''
+        for field in values:
+            if field not in SETTABLE_FIELDS:
+                raise ValueError(f"can't set '{field}' ({', '.join(SETTABLE_FIELDS)})")
+        fields = [SETTABLE_FIELDS[field] + (value,) for field, value in values.items()]
+        tasks = self.__tasks
+        changed = 0
+        for task_id in sorted(self.__matchingIds(conditions, exclude, due_from, due_before)):
+            task = tasks[task_id]
+            different = False
+            for getter, setter, value in fields:
+                if getter(task) != value:
+                    setter(task, value) # the setter refiles the task in the indexes
+                    different = True
+            changed += different
+        return changed
+
+    def deleteWhere(self, exclude=None, due_from=None, due_before=None, **conditions):
+        '''Delete every task matching the conditions (see findTasks), returns how many were deleted'''
+        doomed = self.__matchingIds(conditions, exclude, due_from, due_before)
+        if not doomed:
+            return 0
+        self.__prune_due_later = True
+        try:
+            for task_id in doomed:
+                self.__remove(task_id)
+        finally:
+            self.__prune_due_later = False
+            self.__due_order = [entry for entry in self.__due_order if entry[1] not in doomed]
+        self.__order = [task_id for task_id in self.__order if task_id not in doomed] # one pass, not a del each
+        self.__positions.clear()
+        return len(doomed)
+
+    # -- due date views --
+
+    def dueBetween(self, start=None, end=None, include_completed=False):
+        '''Tasks due from start up to but not including end, soonest first'''
+        low = 0 if start is None else bisect.bisect_left(self.__due_order, (start.toordinal(),))
+        high = len(self.__due_order) if end is None else bisect.bisect_left(self.__due_order, (end.toordinal(),))
+        tasks = self.__tasks
+        result = []
+        for _, task_id in self.__due_order[low:high]:
+            task = tasks[task_id]
+            if include_completed or task.getStatus() != "Completed":
+                result.append(task)
+        return result
+
+    def overdue(self, today=None):
+        '''Tasks not completed that were due before today, oldest first'''
+        return self.dueBetween(end=today or datetime.date.today())
+
+    def dueWithin(self, days, today=None):
+        '''Tasks not completed that are due from today to the next number of days'''
+        today = today or datetime.date.today()
+        try:
+            end = today + datetime.timedelta(days=days + 1)
+        except OverflowError:
+            end = None # past the last date there is, so no end
+        return self.dueBetween(today, end)
+
+    def sortedByDue(self):
+        '''Every task sorted by due date, with tasks without a valid date at the end'''
+        tasks = self.__tasks
+        undated = self.__indexes["due_date"].get(None, set())
+        return [tasks[task_id] for _, task_id in self.__due_order] + [tasks[task_id] for task_id in sorted(undated)]
@@ -0,0 +1,142 @@
+# Background saving of main()'s changes (write-behind).
+#
+# Saving a change means at least an fsync of the journal, and now and then a
+# rewrite of the whole user file, which on a slow network home folder is long
+# enough to notice after every edit. Instead main() only puts a note on the
+# writer's queue after each change and goes straight back to the menu. The
+# writer thread waits a moment for more changes, then saves all of them at
+# once with saveChanges (only the tasks that changed since the last save), so
+# a quick run of edits becomes a single write.
+#
+# The tasks are only ever touched by one thread at a time: main() holds the
+# writer's lock except while it waits at the menu prompt (idle()), and the
+# writer only saves while it has the lock. Closing the writer, on exit, on
+# SIGTERM or SIGHUP, or from atexit if main() ends any other way, saves
+# whatever is still waiting before returning.
+#
+# With metrics on, "writer.queue_depth" is a gauge of the changes waiting and
+# "writer.latency" the time from a change being made to it being on disk.
+
+import atexit
+import contextlib
+import queue
+import signal
+import sys
+import threading
+import time
+
+from task_metrics import METRICS
+
+
+_STOP = object() # put on the queue to end the writer thread
+
+
+class WriteBehind:
+    def __init__(self, journal, tasks, delay=0.2):
+        self.__journal = journal # anything with saveChanges and compactIfNeeded, e.g. TaskJournal
+        self.__tasks = tasks
+        self.__delay = delay # seconds to wait for more changes before saving
+        self.__queue = queue.Queue() # perf_counter time of each change not saved yet
+        self.__lock = threading.Lock() # held by main() while it uses the tasks, and by the writer while it saves
+        self.__lock.acquire()
+        self.__merged = False
+        self.__error = None
+        self.__thread = threading.Thread(target=self.__run, name="task-writer", daemon=True)
+        self.__closed = False
+
+    def start(self):
+        '''Start the writer thread and make sure it is flushed when the program ends'''
+        self.__thread.start()
+        atexit.register(self.close)
+        return self
+
+    def flushOnSignals(self, signals=("SIGTERM", "SIGHUP")):
+        '''Exit through SystemExit on these signals, so the changes still waiting are saved (main thread only)'''
+        def handler(signum, frame):
+            raise SystemExit(128 + signum)
+        for name in signals:
+            if hasattr(signal, name): # no SIGHUP on Windows
+                signal.signal(getattr(signal, name), handler)
+
+    def changed(self):
+        '''Ask for the tasks to be saved soon, after main() changed them'''
+        if self.__closed:
+            raise ValueError("the writer is closed")
+        self.__queue.put(time.perf_counter())
+        if METRICS.enabled:
+            METRICS.setGauge("writer.queue_depth", self.__queue.qsize())
+
+    @contextlib.contextmanager
+    def idle(self):
+        '''Let the writer save while main() is waiting for the user in the with block'''
+        self.__lock.release()
+        try:
+            yield
+        finally:
+            self.__lock.acquire() # waits for a save that is under way to finish
+
+    def takeMerged(self):
+        '''Check if a save since the last call merged in another session's changes'''
+        merged, self.__merged = self.__merged, False
+        return merged
+
+    def getError(self):
+        '''The last error a save ran into, None if the last save worked'''
+        return self.__error
+
+    def __run(self):
+        while True:
+            first = self.__queue.get()
+            if first is _STOP:
+                return
+            stop = self.__drain(time.perf_counter() + self.__delay)
+            with self.__lock:
+                self.__save(first)
+            if stop:
+                return
+
+    def __drain(self, deadline):
+        '''Take every change queued until the deadline, as they are all saved together'''
+        while True:
+            try:
+                item = self.__queue.get(timeout=max(0, deadline - time.perf_counter()))
+            except queue.Empty:
+                return False
+            if item is _STOP:
+                return True
+
+    def __save(self, since):
+        '''Save the changes made since a time (lock held)'''
+        try:
+            if self.__journal.saveChanges(self.__tasks):
+                self.__merged = True
+            self.__journal.compactIfNeeded(self.__tasks)
+            self.__error = None
+        except Exception as error: # keep going, the tasks stay dirty and the next save tries again
+            self.__error = error
+            import traceback # only on the rare failed save
+            traceback.print_exc()
+            return
+        if METRICS.enabled:
+            METRICS.setGauge("writer.queue_depth", self.__queue.qsize())
+            METRICS.observe("writer.latency", time.perf_counter() - since)
+
+    def close(self):
+        '''Save everything still waiting and stop the writer thread (called by main(), with the lock)'''
+        if self.__closed:
+            return
+        self.__closed = True
+        atexit.unregister(self.close)
+        if self.__thread.is_alive():
+            with self.idle():
+                self.__queue.put(_STOP)
+                self.__thread.join()
+        pending = None
+        while not self.__queue.empty(): # anything the thread didn't get to
+            item = self.__queue.get()
+            if item is not _STOP and pending is None:
+                pending = item
+        if pending is not None or self.__error is not None: # a failed save gets one more try
+            self.__save(pending or time.perf_counter())
+        if self.__error is not None:
+            print(f"Some changes could not be saved: {self.__error}", file=sys.stderr)
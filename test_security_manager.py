@@ -1,6 +1,7 @@
 import csv
 import unittest
 import os
+import tempfile
 from unittest.mock import patch
 
 from security_manager import (
@@ -9,8 +10,17 @@ from security_manager import (
     viewTasks, 
     updateTask, 
     deleteTask, 
-    createUserFile
+    createUserFile,
+    readFromFile,
+    writeToFile,
+    iterTasks,
+    AtomicFile,
+    parseDueDate,
+    listTasks,
+    main,
+    DueDate
 )
+from benchmarks.bench_startup import SCRIPT, LIST_IMPORT_BUDGET_MS, LAZY_MODULES, LIST_IMPORT_LIMIT_MS, addedImportTime, makeUserFolder
 
 class TestSecurityTask(unittest.TestCase):
 
@@ -240,6 +250,238 @@ class TestSecurityTask(unittest.TestCase):
             if os.path.exists(test_filename):
                 os.remove(test_filename)
 
+    def test_writeToFile(self):
+        """Test that writeToFile replaces the file in one go and leaves no temp files behind"""
+        with tempfile.TemporaryDirectory() as folder:
+            test_filename = os.path.join(folder, "test_write.csv")
+            writeToFile(test_filename, self.tasks)
+
+            result = readFromFile(test_filename)
+            self.assertEqual([t.getTaskDetails() for t in result], ["Install Antivirus", "Update Password"])
+            self.assertEqual(os.listdir(folder), ["test_write.csv"])
+
+    def test_writeToFile_failure_keeps_old_file(self):
+        """Test that a write failing half way leaves the previous file untouched"""
+        class BrokenTask(SecurityTask):
+            def getStatus(self):
+                raise TypeError("broken task") # fails mid write
+
+        broken_task = BrokenTask("Broken", "01/01/2025", "A", "Desktop", "Not Yet")
+
+        with tempfile.TemporaryDirectory() as folder:
+            test_filename = os.path.join(folder, "test_write.csv")
+            writeToFile(test_filename, self.tasks)
+
+            with self.assertRaises(TypeError):
+                writeToFile(test_filename, [self.task1, broken_task])
+
+            self.assertEqual(len(readFromFile(test_filename)), 2)
+            self.assertEqual(os.listdir(folder), ["test_write.csv"])
+
+    def test_AtomicFile(self):
+        """Test that AtomicFile swaps the new data in with the old file's permissions (or open()'s for a new file),
+        or leaves the old file on failure"""
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "data.bin")
+            with open(path, "wb") as f:
+                f.write(b"old")
+            os.chmod(path, 0o640)
+
+            with self.assertRaises(ValueError):
+                with AtomicFile(path, "wb") as f:
+                    f.write(b"half")
+                    raise ValueError("failed half way")
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), b"old")
+            self.assertEqual(os.listdir(folder), ["data.bin"])
+
+            with AtomicFile(path, "wb") as f:
+                f.write(b"new")
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), b"new")
+            self.assertEqual(os.stat(path).st_mode & 0o777, 0o640)
+            self.assertEqual(os.listdir(folder), ["data.bin"])
+
+            with open(os.path.join(folder, "plain.bin"), "wb"):
+                pass
+            with AtomicFile(os.path.join(folder, "new.bin"), "wb"):
+                pass
+            self.assertEqual(os.stat(os.path.join(folder, "new.bin")).st_mode,
+                             os.stat(os.path.join(folder, "plain.bin")).st_mode) # not mkstemp's 0600
+
+    def test_securityTask_is_compact(self):
+        """Test that tasks have no per instance dict and share repeated field values"""
+        self.assertFalse(hasattr(self.task1, "__dict__"))
+        with self.assertRaises(AttributeError):
+            self.task1.extra = "not allowed"
+
+        other = SecurityTask("Other", "01/01/2025", "".join(["A"]), "".join(["Desk", "top"]), "".join(["Not ", "Yet"]))
+        self.assertIs(other.getCategory(), self.task1.getCategory())
+        self.assertIs(other.getStatus(), self.task1.getStatus())
+
+        self.task2.setStatus("".join(["Not ", "Yet"]))
+        self.assertIs(self.task2.getStatus(), self.task1.getStatus())
+
+    def test_iterTasks(self):
+        """Test streaming tasks with a filter and a limit"""
+        with tempfile.TemporaryDirectory() as folder:
+            test_filename = os.path.join(folder, "test_iter.csv")
+            task3 = SecurityTask("Enable Firewall", "01/06/2025", "C", "Tablet", "Completed")
+            writeToFile(test_filename, [self.task1, task3, self.task2])
+
+            result = list(iterTasks(test_filename))
+            self.assertEqual([t.getTaskDetails() for t in result], ["Install Antivirus", "Enable Firewall", "Update Password"])
+
+            open_tasks = iterTasks(test_filename, where=lambda row: row.status != "Completed", limit=1)
+            self.assertEqual([t.getTaskDetails() for t in open_tasks], ["Install Antivirus"])
+
+            rows = list(iterTasks(test_filename, where=lambda row: row.priority != "A", rows=True))
+            self.assertEqual([row.task_details for row in rows], ["Enable Firewall", "Update Password"])
+            self.assertEqual(rows[1].category, "Mobile")
+
+            self.assertEqual(list(iterTasks(test_filename, limit=0)), [])
+
+    def test_iterTasks_stops_early(self):
+        """Test that iterTasks doesn't read past the rows it needs"""
+        with tempfile.TemporaryDirectory() as folder:
+            test_filename = os.path.join(folder, "test_iter.csv")
+            with open(test_filename, "w", newline='') as f:
+                f.write("Task Details,Due_Date,Priority,Category,Status\n")
+                f.write("First,01/01/2025,A,Desktop,Not Yet\n")
+                f.write("Broken row\n") # would fail with an IndexError if it was read
+
+            result = list(iterTasks(test_filename, limit=1))
+            self.assertEqual(result[0].getTaskDetails(), "First")
+
+    def test_iterTasks_journal_changes(self):
+        """Test that changes still in the journal are included"""
+        from task_journal import TaskJournal
+        with tempfile.TemporaryDirectory() as folder:
+            test_filename = os.path.join(folder, "test_iter.csv")
+            writeToFile(test_filename, [self.task1])
+            journal = TaskJournal(test_filename)
+            tasks = journal.load()
+            tasks.append(SecurityTask("Enable Firewall", "01/06/2025", "C", "Tablet", "Not Yet"))
+            journal.saveChanges(tasks)
+            journal.close()
+
+            self.assertEqual([t.getTaskDetails() for t in iterTasks(test_filename)], ["Install Antivirus", "Enable Firewall"])
+            rows = iterTasks(test_filename, where=lambda row: row.priority == "C", limit=1, rows=True)
+            self.assertEqual([row.task_details for row in rows], ["Enable Firewall"])
+
+    def test_readFromFile_header_variants(self):
+        """Test that a new user file and old header spellings are read by column position"""
+        with tempfile.TemporaryDirectory() as folder:
+            test_filename = os.path.join(folder, "test_read.csv")
+            createUserFile(test_filename)
+            with open(test_filename, "a", newline='') as f:
+                f.write("Install Antivirus,10/05/2025,A,Desktop,Not Yet\n")
+            tasks = readFromFile(test_filename) # the Due_Date header createUserFile writes
+            self.assertEqual(tasks[0].getDueDate(), "10/05/2025")
+
+            with open(test_filename, "w", newline='', encoding="utf-8-sig") as f:
+                f.write("status,category,PRIORITY,due date,task_details\n")
+                f.write("Not Yet,Desktop,A,10/05/2025,Install Antivirus\n\n")
+            tasks = readFromFile(test_filename)
+            self.assertEqual(len(tasks), 1)
+            self.assertEqual(
+                [tasks[0].getTaskDetails(), tasks[0].getDueDate(), tasks[0].getStatus()],
+                ["Install Antivirus", "10/05/2025", "Not Yet"]
+            )
+
+            with open(test_filename, "w", newline='') as f:
+                f.write("Task Details,Due Date,Priority,Category,Status\n")
+                f.write("Install Antivirus,10/05/2025\n")
+            with self.assertRaisesRegex(ValueError, "line 2"):
+                readFromFile(test_filename)
+
+    def test_parseDueDate(self):
+        """Test that due dates are validated and parsed into DueDate objects"""
+        due_date = parseDueDate("10/05/2025")
+        self.assertIsInstance(due_date, DueDate)
+        self.assertEqual((due_date.day, due_date.month, due_date.year), (10, 5, 2025))
+        self.assertEqual(str(due_date), "10/05/2025")
+        self.assertIs(parseDueDate("10/05/2025"), due_date) # parsed once, then cached
+
+        for invalid in ("31/02/2025", "10-05-2025", "aa/bb/cccc", "", None):
+            self.assertIsNone(parseDueDate(invalid))
+        with self.assertRaises(ValueError):
+            DueDate.parse("31/02/2025")
+
+    def test_viewTasks_numbers(self):
+        """Test that a filtered view can show each task's number in the full list"""
+        with patch('sys.stdout') as mock_stdout:
+            viewTasks([self.task2], numbers=[2])
+            printed_lines = ''.join([call[0][0] for call in mock_stdout.write.call_args_list])
+        self.assertIn("2     Update Password", printed_lines)
+        self.assertNotIn("Install Antivirus", printed_lines)
+
+
+
+class TestStartup(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        makeUserFolder(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_listTasks(self):
+        """Test that --list prints a user's tasks and reports unknown users"""
+        cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        try:
+            with patch('sys.stdout') as stdout:
+                self.assertEqual(listTasks(["alice"]), 0)
+            with patch('sys.stderr'):
+                self.assertEqual(listTasks(["nobody"]), 1)
+                self.assertEqual(listTasks([]), 2)
+        finally:
+            os.chdir(cwd)
+        printed = "".join(call.args[0] for call in stdout.write.call_args_list)
+        self.assertEqual(len(printed.splitlines()), 22) # header, divider and 20 tasks
+        self.assertEqual(os.listdir(os.path.join(self.tmp.name, "users")), ["alice.csv"]) # no lock file either
+
+    def test_listTasks_creates_nothing(self):
+        """Test that --list in a folder without users/ or a database doesn't make either"""
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as folder:
+            os.chdir(folder)
+            try:
+                for storage in ("csv", "sqlite"):
+                    with patch.dict(os.environ, SECURITY_MANAGER_STORAGE=storage), patch('sys.stderr'):
+                        self.assertEqual(listTasks(["alice"]), 1)
+            finally:
+                os.chdir(cwd)
+            self.assertEqual(os.listdir(folder), [])
+
+    def test_main_bad_archive_days(self):
+        """Test that a SECURITY_MANAGER_ARCHIVE_DAYS that isn't a number of days is reported, not a crash"""
+        cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        try:
+            for days in ("ninety", "-5"):
+                with patch.dict(os.environ, SECURITY_MANAGER_ARCHIVE_DAYS=days), \
+                     patch('builtins.input', side_effect=["alice", "5"]), \
+                     patch('task_writer.WriteBehind.flushOnSignals'), patch('sys.stdout') as stdout:
+                    main()
+                printed = "".join(call.args[0] for call in stdout.write.call_args_list)
+                self.assertIn(f"not '{days}'. Nothing was archived.", printed)
+        finally:
+            os.chdir(cwd)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, "users", "alice.archive")))
+
+    def test_list_startup_budget(self):
+        """Test that --list doesn't load the modules it doesn't use and stays near its import time budget"""
+        # the best of a few runs, a busy machine only makes a run slower
+        added, modules = min((addedImportTime([SCRIPT, "--list", "alice"], self.tmp.name) for _ in range(5)),
+                             key=lambda result: result[0])
+        self.assertIn("task_storage", modules) # it did run
+        self.assertEqual(sorted(set(LAZY_MODULES) & set(modules)), [])
+        strict = os.environ.get("SECURITY_MANAGER_STRICT_STARTUP")
+        self.assertLess(added, LIST_IMPORT_BUDGET_MS if strict else LIST_IMPORT_LIMIT_MS)
+
 
 if __name__ == '__main__':
     unittest.main()
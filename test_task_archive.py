@@ -0,0 +1,101 @@
+import datetime
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from security_manager import SecurityTask, readFromFile, writeToFile, taskToRow
+import task_archive
+import task_locking
+from task_archive import archiveUser, iterArchive, segmentFiles, archiveInfo, writeSegment, main
+from task_journal import TaskJournal
+
+
+class TestTaskArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "alice.csv")
+        self.today = datetime.date(2025, 6, 1)
+        self.tasks = [
+            SecurityTask("Install Antivirus", "10/01/2025", "A", "Desktop", "Completed"), # old and done
+            SecurityTask("Update Password", "12/01/2025", "B", "Mobile", "In Progress"), # old but open
+            SecurityTask("Enable Firewall", "20/05/2025", "A", "Tablet", "Completed"), # done recently
+            SecurityTask("Patch Router", "someday", "C", "Desktop", "Completed"), # no date to go by
+            SecurityTask("Antivirus Scan", "01/02/2025", "C", "Mobile", "Completed") # old and done
+        ]
+        writeToFile(self.path, self.tasks)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def details(self, tasks):
+        return [task.getTaskDetails() for task in tasks]
+
+    def test_archiveUser(self):
+        """Test that only old completed tasks leave the user file, into a compressed segment"""
+        self.assertEqual(archiveUser(self.path, days=30, today=self.today), 2)
+        self.assertEqual(self.details(readFromFile(self.path)), ["Update Password", "Enable Firewall", "Patch Router"])
+        self.assertTrue(segmentFiles(self.path)[0].endswith("segment-000001.csv.gz"))
+        self.assertEqual([taskToRow(task) for task in iterArchive(self.path)],
+                         [taskToRow(self.tasks[0]), taskToRow(self.tasks[4])])
+        self.assertEqual(archiveUser(self.path, days=30, today=self.today), 0) # nothing left to move
+        self.assertEqual(archiveUser(self.path, days=10 ** 9, today=self.today), 0) # before any date
+
+        self.assertEqual(archiveUser(self.path, days=5, today=self.today, compression="lzma"), 1)
+        self.assertTrue(segmentFiles(self.path)[1].endswith("segment-000002.csv.xz"))
+        self.assertEqual(self.details(iterArchive(self.path)), ["Install Antivirus", "Antivirus Scan", "Enable Firewall"])
+        self.assertEqual(archiveInfo(self.path)["tasks"], 3)
+
+    def test_iterArchive_filters(self):
+        """Test the where filter and limit of an archive query"""
+        writeSegment(self.path, self.tasks)
+        rows = list(iterArchive(self.path, where=lambda row: "antivirus" in row.task_details.casefold(), rows=True))
+        self.assertEqual([row.task_details for row in rows], ["Install Antivirus", "Antivirus Scan"])
+        self.assertEqual(self.details(iterArchive(self.path, limit=1)), ["Install Antivirus"])
+        self.assertEqual(list(iterArchive(os.path.join(self.tmp.name, "nobody.csv"))), [])
+
+    @unittest.skipIf(task_locking.fcntl is None, "fcntl is not available")
+    def test_concurrent_segments(self):
+        """Test that two archive runs at once each get their own segment number"""
+        listed = task_archive.segmentFiles
+
+        def slowSegmentFiles(filename):
+            segments = listed(filename)
+            time.sleep(0.05) # room for the other run to pick the same number without the lock
+            return segments
+
+        with patch.object(task_archive, "segmentFiles", slowSegmentFiles):
+            runs = [threading.Thread(target=writeSegment, args=(self.path, self.tasks[:1])) for _ in range(2)]
+            for run in runs:
+                run.start()
+            for run in runs:
+                run.join()
+        self.assertEqual([os.path.basename(path) for path in segmentFiles(self.path)],
+                         ["segment-000001.csv.gz", "segment-000002.csv.gz"])
+        self.assertEqual(archiveInfo(self.path)["tasks"], 2)
+
+    def test_open_session_merges(self):
+        """Test that a session open while archiving keeps its own change and loses the archived tasks"""
+        journal = TaskJournal(self.path)
+        tasks = journal.load()
+        archiveUser(self.path, days=30, today=self.today)
+        tasks[1].setStatus("Completed")
+        self.assertTrue(journal.recordUpdate(1, tasks[1])) # merged with the archive run
+        journal.close()
+        self.assertEqual([taskToRow(task)[4] for task in TaskJournal(self.path).load()],
+                         ["Completed", "Completed", "Completed"])
+
+    def test_main_query(self):
+        """Test the query command's output"""
+        archiveUser(self.path, days=30, today=self.today)
+        with patch('sys.stdout') as stdout:
+            main(["query", self.path, "--contains", "SCAN"])
+        self.assertEqual("".join(call.args[0] for call in stdout.write.call_args_list),
+                         "Antivirus Scan,01/02/2025,C,Mobile,Completed\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
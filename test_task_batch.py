@@ -0,0 +1,168 @@
+import io
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from security_manager import SecurityTask, taskToRow, writeToFile
+from task_batch import applyOperations, readOperations, runBatch, main
+from task_journal import TaskJournal
+from task_storage import CsvBackend
+from task_store import TaskStore
+
+
+class TestTaskBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.storage = CsvBackend(self.tmp.name)
+        self.storage.writeTasks("alice", [
+            SecurityTask("Install Antivirus", "10/05/2025", "A", "Desktop", "Not Yet"),
+            SecurityTask("Update Password", "12/05/2025", "B", "Mobile", "In Progress")
+        ])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def rows(self, user="alice"):
+        return [taskToRow(task) for task in self.storage.readTasks(user)]
+
+    def test_jsonl_batch(self):
+        """Test adds, updates and deletes from JSON lines saved in one write"""
+        lines = [
+            '{"op": "add", "details": "enable firewall", "due_date": "01/06/2025", "priority": "c", "category": "tablet", "status": "not yet"}\n',
+            '\n',
+            '{"op": "update", "task": 3, "status": "completed"}\n',
+            '{"op": "delete", "task": 1}\n'
+        ]
+        with patch('task_journal.writeToFile', wraps=writeToFile) as write:
+            counts, errors, merged = runBatch("alice", lines, self.storage)
+        self.assertEqual(counts, {"add": 1, "update": 1, "delete": 1})
+        self.assertEqual(errors, [])
+        self.assertFalse(merged)
+        self.assertEqual(write.call_count, 1)
+        self.assertEqual(self.rows(), [
+            ["Update Password", "12/05/2025", "B", "Mobile", "In Progress"],
+            ["Enable Firewall", "01/06/2025", "C", "Tablet", "Completed"]
+        ])
+
+    def test_csv_batch_new_user(self):
+        """Test CSV operations with empty cells for a user that doesn't exist yet"""
+        lines = [
+            "op,task,details,due_date,priority,category,status\n",
+            "add,,Backup Files,01/07/2025,B,Desktop,Not Yet\n",
+            "update,1,,02/07/2025,,,\n"
+        ]
+        counts, errors, _ = runBatch("bob", lines, self.storage)
+        self.assertEqual(errors, [])
+        self.assertEqual(self.rows("bob"), [["Backup Files", "02/07/2025", "B", "Desktop", "Not Yet"]])
+
+    def test_invalid_operation_saves_nothing(self):
+        """Test that one bad operation stops the whole batch unless invalid ones are skipped"""
+        before = self.rows()
+        lines = [
+            '{"op": "update", "task": 1, "status": "Completed"}\n',
+            '{"op": "update", "task": 1, "priority": "Z"}\n',
+            'not json\n',
+            '{"op": "delete", "task": 9}\n'
+        ]
+        counts, errors, _ = runBatch("alice", lines, self.storage)
+        self.assertEqual(errors, [(2, "invalid priority 'Z', choose from A, B, C")])
+        self.assertEqual(self.rows(), before)
+
+        counts, errors, _ = runBatch("alice", lines, self.storage, skip_invalid=True)
+        self.assertEqual([line for line, _ in errors], [2, 3, 4])
+        self.assertEqual(counts["update"], 1)
+        self.assertEqual(self.rows()[0][4], "Completed")
+
+    def test_operation_checks(self):
+        """Test the checks on each kind of operation"""
+        tasks = []
+        operations = list(readOperations([
+            '{"op": "add", "details": "Patch", "due_date": "31/02/2025", "priority": "A", "category": "Mobile", "status": "Not Yet"}',
+            '{"op": "add", "details": "Patch"}',
+            '{"op": "update", "task": "x", "status": "Completed"}',
+            '{"op": "rename", "task": 1}',
+            '{"op": "delete", "task": 1, "colour": "red"}'
+        ]))
+        counts, errors = applyOperations(tasks, operations, skip_invalid=True)
+        self.assertEqual(tasks, [])
+        self.assertEqual(counts, {"add": 0, "update": 0, "delete": 0})
+        self.assertEqual([error for _, error in errors], [
+            "invalid due date '31/02/2025', use dd/mm/yyyy",
+            "add is missing due_date, priority, category, status",
+            "invalid task number 'x'",
+            "unknown op 'rename' (add, update, delete)",
+            "unknown field 'colour'"
+        ])
+
+    def test_main_dry_run(self):
+        """Test the command line entry point with a dry run"""
+        before = self.rows()
+        stdin = io.StringIO('{"op": "delete", "task": 1}\n')
+        with patch('sys.stdin', stdin), patch('sys.stdout', new_callable=io.StringIO) as stdout, \
+                patch.dict('task_storage.BACKENDS', {"csv": lambda: CsvBackend(self.tmp.name)}):
+            self.assertEqual(main(["alice", "--dry-run", "--storage", "csv"]), 0)
+        self.assertIn("0 added, 0 updated, 1 deleted (dry run, nothing saved)", stdout.getvalue())
+        self.assertEqual(self.rows(), before)
+
+
+    def test_dry_run_new_user(self):
+        """Test that a dry run for a new user counts the operations without creating the user"""
+        lines = ['{"op": "add", "details": "patch", "due_date": "01/06/2025", "priority": "a", "category": "mobile", "status": "not yet"}\n']
+        counts, errors, _ = runBatch("carol", lines, self.storage, dry_run=True)
+        self.assertEqual((counts["add"], errors), (1, []))
+        self.assertFalse(self.storage.exists("carol"))
+
+    def test_where_operations(self):
+        """Test updates and deletes that pick their tasks with a where, counted per task"""
+        self.storage.writeTasks("alice", [
+            SecurityTask("Install Antivirus", "10/05/2024", "C", "Desktop", "Not Yet"),
+            SecurityTask("Update Password", "12/05/2025", "B", "Mobile", "Completed"),
+            SecurityTask("Patch Browser", "01/02/2024", "C", "Desktop", "In Progress"),
+            SecurityTask("Enable Firewall", "01/06/2025", "C", "Tablet", "Not Yet")
+        ])
+        lines = [
+            '{"op": "update", "where": {"category": "desktop", "priority": "c"}, "status": "completed"}\n',
+            '{"op": "delete", "where": {"status": "Completed", "due_before": "01/01/2025"}}\n'
+        ]
+        with patch.object(TaskJournal, "saveChanges", autospec=True, side_effect=TaskJournal.saveChanges) as save:
+            counts, errors, _ = runBatch("alice", lines, self.storage)
+        self.assertEqual((counts, errors), ({"add": 0, "update": 2, "delete": 2}, []))
+        self.assertEqual(save.call_count, 1)
+        self.assertEqual([row[0] for row in self.rows()], ["Update Password", "Enable Firewall"])
+
+        tasks = TaskStore()
+        _, errors = applyOperations(tasks, readOperations([
+            '{"op": "add", "where": {"status": "Completed"}}',
+            '{"op": "delete", "task": 1, "where": {"status": "Completed"}}',
+            '{"op": "delete", "where": {"colour": "red"}}',
+            '{"op": "delete", "where": {"due_before": "soon"}}'
+        ]), skip_invalid=True)
+        self.assertEqual([error for _, error in errors], [
+            "add can't have a where (update, delete)",
+            "delete takes a task number or a where, not both",
+            "can't select tasks by 'colour' (priority, category, status, exclude, due_before, due_from)",
+            "invalid due_before 'soon', use dd/mm/yyyy"
+        ])
+
+    def test_main_where(self):
+        """Test --where with --set and --delete, and a dry run count"""
+        def run(*argv):
+            with patch('sys.stdout', new_callable=io.StringIO) as stdout, \
+                    patch.dict('task_storage.BACKENDS', {"csv": lambda: CsvBackend(self.tmp.name)}):
+                self.assertEqual(main(["alice"] + list(argv)), 0)
+            return stdout.getvalue()
+
+        self.assertIn("0 added, 1 updated, 0 deleted (dry run",
+                      run("--where", "status!=Completed", "--where", "due<11/05/2025", "--set", "status=completed", "--dry-run"))
+        self.assertEqual(self.rows()[0][4], "Not Yet")
+        self.assertIn("0 added, 2 updated, 0 deleted", run("--where", "category=Desktop", "--where", "category=Mobile", "--set", "priority=C"))
+        self.assertEqual([row[2] for row in self.rows()], ["C", "C"])
+        self.assertIn("0 added, 0 updated, 1 deleted", run("--where", "due>=11/05/2025", "--delete"))
+        self.assertEqual([row[0] for row in self.rows()], ["Install Antivirus"])
+        with patch('sys.stderr'), self.assertRaises(SystemExit):
+            main(["alice", "--where", "priority<A", "--delete"])
+
+
+if __name__ == '__main__':
+    unittest.main()
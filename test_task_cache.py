@@ -0,0 +1,96 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from security_manager import SecurityTask, writeToFile, taskToRow
+from task_cache import TaskCache, estimateSize
+from task_journal import TaskJournal
+from task_storage import CsvBackend
+from user_reports import fleetReport
+
+
+class TestTaskCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tasks = [
+            SecurityTask("Install Antivirus", "10/05/2025", "A", "Desktop", "Not Yet"),
+            SecurityTask("Update Password", "12/05/2025", "B", "Mobile", "In Progress")
+        ]
+        self.paths = []
+        for user in ("alice", "bob", "carol"):
+            path = os.path.join(self.tmp.name, f"{user}.csv")
+            writeToFile(path, self.tasks)
+            self.paths.append(path)
+        self.loader = Mock(side_effect=lambda path: TaskJournal(path).load())
+        self.cache = TaskCache(loader=self.loader)
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp.cleanup()
+
+    def rows(self, tasks):
+        return [taskToRow(task) for task in tasks]
+
+    def test_hits_and_misses(self):
+        """Test that an unchanged file is only parsed once"""
+        first = self.cache.get(self.paths[0])
+        self.assertIs(self.cache.get(self.paths[0]), first)
+        self.assertEqual(self.rows(first), self.rows(self.tasks))
+        self.assertEqual(self.loader.call_count, 1)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        self.assertIn(self.paths[0], self.cache)
+
+    def test_changed_file_is_read_again(self):
+        """Test that changes by another program (or the journal) invalidate the entry"""
+        self.cache.get(self.paths[0])
+        journal = TaskJournal(self.paths[0])
+        journal.recordDelete(0)
+        journal.close()
+        self.assertEqual(self.rows(self.cache.get(self.paths[0])), self.rows(self.tasks[1:]))
+        self.assertEqual(self.cache.invalidations, 1)
+        self.assertEqual(self.loader.call_count, 2)
+
+    def test_write_through(self):
+        """Test that saving through writeToFile or a journal compaction updates the cache"""
+        self.cache.get(self.paths[0])
+        writeToFile(self.paths[0], self.tasks[:1])
+        self.assertEqual(self.rows(self.cache.get(self.paths[0])), self.rows(self.tasks[:1]))
+
+        # the cached copy doesn't follow later changes the writer makes to its own tasks
+        backend = CsvBackend(self.tmp.name)
+        backend.writeTasks("bob", self.tasks)
+        self.tasks[0].setStatus("Completed")
+        self.assertEqual(self.cache.get(self.paths[1])[0].getStatus(), "Not Yet")
+        self.assertEqual(self.loader.call_count, 1)
+        self.assertEqual(self.cache.hits, 2)
+
+    def test_eviction(self):
+        """Test least recently used eviction by entry count and by memory"""
+        cache = TaskCache(max_entries=2, loader=self.loader, write_through=False)
+        cache.get(self.paths[0])
+        cache.get(self.paths[1])
+        cache.get(self.paths[0])
+        cache.get(self.paths[2]) # bob is the least recently used
+        self.assertNotIn(self.paths[1], cache)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+        size = estimateSize(cache.get(self.paths[0]))
+        cache = TaskCache(max_bytes=size * 2, loader=self.loader, write_through=False)
+        for path in self.paths:
+            cache.get(path)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.getSize(), size * 2)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_fleet_report_with_cache(self):
+        """Test that repeated reports only parse the files again when they change"""
+        fleetReport(self.tmp.name, cache=self.cache)
+        report = fleetReport(self.tmp.name, cache=self.cache)
+        self.assertEqual(report.tasks, 6)
+        self.assertEqual(self.loader.call_count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
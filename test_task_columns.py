@@ -0,0 +1,105 @@
+import datetime
+import os
+import tempfile
+import unittest
+
+from security_manager import SecurityTask, writeToFile, taskToRow
+import task_columns
+from task_columns import readColumns
+from task_journal import TaskJournal
+
+
+class TestTaskColumns(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmp.name, "testUser.csv")
+        self.tasks = [
+            SecurityTask("Install Antivirus", "10/05/2025", "A", "Desktop", "Not Yet"),
+            SecurityTask("Update Password", "12/05/2025", "B", "Mobile", "In Progress"),
+            SecurityTask("Enable Firewall", "01/06/2025", "A", "Tablet", "Completed"),
+            SecurityTask("Backup Files", "not a date", "A", "Desktop", "In Progress")
+        ]
+        writeToFile(self.filename, self.tasks)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def check_table(self, table):
+        self.assertEqual(len(table), 4)
+        self.assertEqual([taskToRow(t) for t in table.tasks()], [taskToRow(t) for t in self.tasks])
+        self.assertEqual(taskToRow(table.task(2)), taskToRow(self.tasks[2]))
+
+        self.assertEqual(table.where(priority="A"), [0, 2, 3])
+        self.assertEqual(table.where(priority="A", exclude={"status": "Completed"}), [0, 3])
+        self.assertEqual(table.where(category=["Mobile", "Tablet"]), [1, 2])
+        self.assertEqual(table.where(status="Unknown"), [])
+        self.assertEqual(table.where(due_before=datetime.date(2025, 5, 12)), [0])
+        self.assertEqual(table.where(due_after=datetime.date(2025, 5, 10), priority="A"), [2])
+        self.assertEqual(table.count(priority="A", category="Desktop"), 2)
+        self.assertEqual(table.count(), 4)
+        self.assertEqual(table.countBy("priority"), {"A": 3, "B": 1})
+
+        with self.assertRaises(ValueError):
+            table.where(details="Install Antivirus")
+
+    def test_array_columns(self):
+        """Test loading and filtering with the stdlib array columns"""
+        table = readColumns(self.filename, use_numpy=False)
+        self.assertFalse(table.usesNumpy())
+        self.check_table(table)
+
+    @unittest.skipIf(task_columns.numpy is None, "numpy is not installed")
+    def test_numpy_columns(self):
+        """Test loading and filtering with numpy columns"""
+        table = readColumns(self.filename, use_numpy=True)
+        self.assertTrue(table.usesNumpy())
+        self.check_table(table)
+
+    def test_due_ranges(self):
+        """Test due date ranges over many days, some with far more tasks than others"""
+        first = datetime.date(2025, 1, 1)
+        days = [first + datetime.timedelta(days=number % 700) for number in range(2000)]
+        days += [first + datetime.timedelta(days=350)] * 1000 # one busy day
+        writeToFile(self.filename, [SecurityTask("Task", day.strftime("%d/%m/%Y"), "A", "Desktop", "Not Yet")
+                                    for day in days] + self.tasks[3:])
+        table = readColumns(self.filename, use_numpy=False)
+        for after, before in [(None, 349), (349, 351), (350, None), (10, 690), (-5, 0), (698, 710), (0, 1)]:
+            due_after = first + datetime.timedelta(days=after) if after is not None else None
+            due_before = first + datetime.timedelta(days=before) if before is not None else None
+            expected = [row for row, day in enumerate(days)
+                        if (due_after is None or day > due_after) and (due_before is None or day < due_before)]
+            self.assertEqual(table.where(due_before=due_before, due_after=due_after), expected, (after, before))
+
+    def test_empty_and_legacy_header(self):
+        """Test a new user file that only has the header createUserFile writes"""
+        with open(self.filename, "w", newline='') as f:
+            f.write("Task Details,Due_Date,Priority,Category,Status\r\n")
+        table = readColumns(self.filename, use_numpy=False)
+        self.assertEqual(len(table), 0)
+        self.assertEqual(table.where(priority="A"), [])
+
+    def test_journal_changes(self):
+        """Test that changes still in the journal show up in the columns"""
+        journal = TaskJournal(self.filename)
+        tasks = journal.load()
+        tasks[1].setPriority("A")
+        del tasks[2]
+        tasks.append(SecurityTask("Patch Router", "02/06/2025", "C", "Desktop", "Not Yet"))
+        journal.saveChanges(tasks)
+        journal.close()
+        table = readColumns(self.filename, use_numpy=False)
+        self.assertEqual([taskToRow(task) for task in table.tasks()], [taskToRow(task) for task in tasks])
+        self.assertEqual(table.count(priority="A"), 3)
+        self.assertEqual(table.where(category="Desktop"), [0, 2, 3])
+
+    def test_malformed_row(self):
+        """Test that a row with missing columns is reported instead of shifting the columns"""
+        with open(self.filename, "a", newline='') as f:
+            f.write("Short Row,01/01/2025\r\n")
+        with self.assertRaises(ValueError):
+            readColumns(self.filename, use_numpy=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
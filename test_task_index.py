@@ -0,0 +1,161 @@
+import datetime
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from security_manager import SecurityTask, writeToFile
+import task_index
+from task_index import buildIndex, GlobalIndex, IndexWatcher, main
+from task_journal import TaskJournal
+from task_storage import CsvBackend
+
+
+class TestGlobalIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = self.tmp.name
+        writeToFile(self.path("alice"), [
+            SecurityTask("Install Antivirus", "10/01/2025", "A", "Desktop", "Not Yet"),
+            SecurityTask("Update Password", "12/05/2025", "B", "Mobile", "In Progress"),
+            SecurityTask("Enable Firewall", "20/01/2025", "A", "Desktop", "Completed")
+        ])
+        writeToFile(self.path("bob"), [
+            SecurityTask("Patch Router", "someday", "A", "Desktop", "Not Yet"),
+            SecurityTask("Backup Laptop", "02/03/2025", "A", "Desktop", "In Progress")
+        ])
+        buildIndex(self.folder, shards=4, workers=1)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def path(self, user):
+        return os.path.join(self.folder, f"{user}.csv")
+
+    def test_find(self):
+        """Test queries on the indexed fields and due dates across users"""
+        index = GlobalIndex(self.folder)
+        self.assertEqual(index.getUsers(), ["alice", "bob"])
+        self.assertEqual(index.find(priority="A", category="Desktop"), {"alice": [0, 2], "bob": [0, 1]})
+        self.assertEqual(index.find(priority="A", exclude={"status": "Completed"}, due_before=datetime.date(2025, 3, 1)),
+                         {"alice": [0]}) # bob's tasks are due later or have no date
+        self.assertEqual(index.find(status=["In Progress", "Completed"], due_from=datetime.date(2025, 1, 20)),
+                         {"alice": [1, 2], "bob": [1]})
+        self.assertEqual(index.count(category="Tablet"), {})
+        self.assertEqual([task.getTaskDetails() for task in index.tasks("bob", [1])], ["Backup Laptop"])
+        with self.assertRaises(ValueError):
+            index.find(details="Router")
+
+    def test_count_and_shards_read(self):
+        """Test that count matches find, and that only the shards a query needs are read"""
+        queries = [
+            {"priority": "A", "category": "Desktop"},
+            {"exclude": {"status": "Completed"}, "due_before": datetime.date(2025, 4, 1)},
+            {"priority": "A", "due_from": datetime.date(2025, 1, 15)},
+            {"due_from": datetime.date(2025, 1, 15), "due_before": datetime.date(2025, 5, 12)}
+        ]
+        index = GlobalIndex(self.folder)
+        counts = [index.count(**query) for query in queries]
+        self.assertEqual(counts[2], {"alice": 1, "bob": 1})
+        self.assertEqual(counts, [{user: len(found) for user, found in index.find(**query).items()} for query in queries])
+
+        with patch("task_index._readShard", wraps=task_index._readShard) as readShard:
+            index = GlobalIndex(self.folder)
+            readShard.assert_not_called() # opening reads nothing but the settings
+            self.assertEqual(index.find(priority="A", users=["bob", "nobody"]), {"bob": [0, 1]})
+        self.assertEqual(sorted(call.args[1] for call in readShard.call_args_list),
+                         sorted({task_index.shardOf("bob", 4), task_index.shardOf("nobody", 4)}))
+
+    def test_updates_go_to_the_log(self):
+        """Test that saving a user appends to their shard's log, which is folded in once it is big enough"""
+        number = task_index.shardOf("alice", 4)
+        shard = task_index._shardPath(self.folder, number)
+        with open(shard) as f:
+            before = f.read()
+        index = GlobalIndex(self.folder)
+        index.updateUser(self.path("alice"), [SecurityTask("Audit Vpn", "01/01/2025", "C", "Tablet", "Not Yet")])
+        with open(shard) as f:
+            self.assertEqual(f.read(), before) # only the log was written
+        self.assertEqual(GlobalIndex(self.folder).find(category="Tablet"), {"alice": [0]})
+
+        with patch("task_index.LOG_MIN_BYTES", 0):
+            index.updateUser(self.path("alice"), [])
+        self.assertFalse(os.path.exists(task_index._logPath(self.folder, number)))
+        self.assertEqual(GlobalIndex(self.folder).find(category="Tablet"), {})
+
+    def test_parallel_build_matches(self):
+        """Test that building with worker processes gives the same index"""
+        serial = GlobalIndex(self.folder).find()
+        buildIndex(self.folder, shards=4, workers=2)
+        self.assertEqual(GlobalIndex(self.folder).find(), serial)
+
+    def test_writeToFile_updates_index(self):
+        """Test that a backend on the folder keeps the index up to date, touching only the user's shard"""
+        backend = CsvBackend(self.folder)
+        try:
+            writeToFile(self.path("bob"), [SecurityTask("Audit Vpn", "01/01/2025", "C", "Tablet", "Not Yet")])
+        finally:
+            backend.close()
+        index = GlobalIndex(self.folder)
+        self.assertEqual(index.find(category="Tablet"), {"bob": [0]})
+        self.assertEqual(index.find(category="Desktop"), {"alice": [0, 2]})
+        self.assertEqual(index.refresh(), 0) # the entry already matches the file
+
+        watcher = IndexWatcher(self.folder)
+        watcher.close()
+        writeToFile(self.path("alice"), []) # nobody is watching now
+        self.assertEqual(GlobalIndex(self.folder).find(category="Desktop"), {"alice": [0, 2]})
+
+    def test_hook_never_fails_the_write(self):
+        """Test that a shard the hook can't update is reported, and the user file is still saved once"""
+        with open(os.path.join(self.folder, ".index", "meta.json"), "w") as f:
+            f.write('{"version": 2, "shards": 4}') # left by an older release
+        backend = CsvBackend(self.folder)
+        try:
+            journal = TaskJournal(self.path("alice"))
+            tasks = journal.load()
+            tasks.reverse() # saved by rewriting the file
+            with patch('sys.stderr') as stderr:
+                self.assertFalse(journal.saveChanges(tasks))
+                tasks[0].setStatus("Completed")
+                self.assertFalse(journal.saveChanges(tasks))
+            journal.close()
+        finally:
+            backend.close()
+        self.assertIn("rebuild it", "".join(call.args[0] for call in stderr.write.call_args_list))
+        self.assertEqual([task.getTaskDetails() for task in TaskJournal(self.path("alice")).load()],
+                         ["Enable Firewall", "Update Password", "Install Antivirus"])
+
+    def test_refresh(self):
+        """Test that refresh picks up journal changes, new users and removed users"""
+        index = GlobalIndex(self.folder)
+        journal = TaskJournal(self.path("alice"))
+        tasks = journal.load()
+        tasks[1].setCategory("Desktop")
+        journal.recordUpdate(1, tasks[1])
+        journal.close()
+        writeToFile(self.path("carol"), [SecurityTask("Review Browser", "01/01/2025", "A", "Desktop", "Not Yet")])
+        os.remove(self.path("bob"))
+        self.assertEqual(index.refresh(), 3)
+        self.assertEqual(index.find(category="Desktop", priority=["A", "B"]), {"alice": [0, 1, 2], "carol": [0]})
+        self.assertEqual(GlobalIndex(self.folder).getUsers(), ["alice", "carol"]) # saved to the shards
+
+    def test_main_query(self):
+        """Test the query command's output"""
+        with patch('sys.stdout') as stdout:
+            main(["query", self.folder, "--priority", "A", "--category", "Desktop", "--due-before", "01/04/2025", "--open"])
+        self.assertEqual("".join(call.args[0] for call in stdout.write.call_args_list),
+                         "alice: 1 tasks\nbob: 1 tasks\n2 tasks for 2 users\n")
+
+
+    def test_main_query_tasks(self):
+        """Test that the query command lists the matching tasks with --tasks"""
+        with patch('sys.stdout') as stdout:
+            main(["query", self.folder, "--priority", "A", "--due-before", "01/02/2025", "--open", "--tasks"])
+        self.assertEqual("".join(call.args[0] for call in stdout.write.call_args_list),
+                         "alice: 1 tasks\n       1. Install Antivirus (10/01/2025, Not Yet)\n1 tasks for 1 users\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
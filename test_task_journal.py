@@ -0,0 +1,193 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from security_manager import SecurityTask, readFromFile, writeToFile, taskToRow, addWriteHook, removeWriteHook
+from task_journal import TaskJournal, journalPath
+from task_store import TaskStore
+
+
+class TestTaskJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmp.name, "testUser.csv")
+        self.tasks = [
+            SecurityTask("Install Antivirus", "10/05/2025", "A", "Desktop", "Not Yet"),
+            SecurityTask("Update Password", "12/05/2025", "B", "Mobile", "In Progress")
+        ]
+        writeToFile(self.filename, self.tasks)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_replay(self):
+        """Test that add, update and delete records replay onto the snapshot"""
+        journal = TaskJournal(self.filename)
+        self.tasks.append(SecurityTask("Enable Firewall", "01/06/2025", "C", "Tablet", "Not Yet"))
+        journal.recordAdd(self.tasks[-1])
+        self.tasks[0].setStatus("Completed")
+        journal.recordUpdate(0, self.tasks[0])
+        del self.tasks[1]
+        journal.recordDelete(1)
+        journal.close()
+
+        loaded = TaskJournal(self.filename).load()
+        self.assertEqual([taskToRow(t) for t in loaded], [taskToRow(t) for t in self.tasks])
+
+        # the snapshot itself is untouched until compaction
+        self.assertEqual(len(readFromFile(self.filename)), 2)
+
+    def test_append_size_is_constant(self):
+        """Test that each edit appends the same number of bytes whatever the list size"""
+        for count in (10, 1000):
+            writeToFile(self.filename, self.tasks[:1] * count)
+            if os.path.exists(journalPath(self.filename)):
+                os.remove(journalPath(self.filename))
+            journal = TaskJournal(self.filename)
+            journal.recordUpdate(0, self.tasks[0]) # first record also writes the base line
+            before = journal.getSize()
+            journal.recordUpdate(0, self.tasks[0])
+            journal.close()
+            self.assertLess(journal.getSize() - before, 100)
+
+    def test_saveChanges(self):
+        """Test that only the deleted, changed and added tasks are written"""
+        writeToFile(self.filename, self.tasks * 50)
+        journal = TaskJournal(self.filename)
+        tasks = journal.load(TaskStore)
+        self.assertFalse(any(task.isDirty() for task in tasks))
+
+        tasks[3].setStatus("Completed")
+        self.assertTrue(tasks[3].isDirty())
+        del tasks[0]
+        tasks.append(SecurityTask("Enable Firewall", "01/06/2025", "C", "Tablet", "Not Yet"))
+        with patch('task_journal.writeToFile') as write:
+            self.assertFalse(journal.saveChanges(tasks))
+        write.assert_not_called()
+        self.assertFalse(tasks[2].isDirty())
+        with open(journalPath(self.filename)) as f:
+            self.assertEqual([json.loads(line)["op"] for line in f], ["base", "delete", "update", "add"])
+
+        self.assertFalse(journal.saveChanges(tasks)) # nothing changed since
+        self.assertEqual(len(open(journalPath(self.filename)).readlines()), 4)
+        tasks[0].setPriority("C")
+        journal.saveChanges(tasks)
+        journal.close()
+        self.assertEqual([taskToRow(t) for t in TaskJournal(self.filename).load()], [taskToRow(t) for t in tasks])
+
+    def test_saveChanges_falls_back_to_compact(self):
+        """Test that a reordered list, or one where most tasks changed, is written out whole"""
+        journal = TaskJournal(self.filename)
+        tasks = journal.load()
+        tasks.reverse()
+        journal.saveChanges(tasks)
+        self.assertFalse(os.path.exists(journalPath(self.filename)))
+        self.assertEqual([taskToRow(t) for t in readFromFile(self.filename)], [taskToRow(t) for t in tasks])
+
+        for task in tasks:
+            task.setStatus("Completed")
+        journal.saveChanges(tasks)
+        self.assertFalse(os.path.exists(journalPath(self.filename)))
+        self.assertEqual({task.getStatus() for task in readFromFile(self.filename)}, {"Completed"})
+
+    def test_failures_after_rewrite(self):
+        """Test that the snapshot or a write hook failing after a rewrite is reported, and a rewrite failing
+        part way never makes the next save merge against the session's own change"""
+        journal = TaskJournal(self.filename)
+        tasks = journal.load()
+        tasks.reverse() # saved by compaction
+        def hook(file, tasks):
+            raise ValueError("rebuild the index")
+        addWriteHook(hook)
+        try:
+            with patch('task_journal.updateSnapshot', side_effect=OSError("disk full")), patch('sys.stderr') as stderr:
+                self.assertFalse(journal.saveChanges(tasks))
+        finally:
+            removeWriteHook(hook)
+        printed = "".join(call.args[0] for call in stderr.write.call_args_list)
+        self.assertIn("disk full", printed)
+        self.assertIn("rebuild the index", printed)
+
+        with open(journalPath(self.filename), "w") as f:
+            f.write("") # so the remove after the rename has something to fail on
+        tasks.append(SecurityTask("Enable Firewall", "01/06/2025", "C", "Tablet", "Not Yet"))
+        tasks.reverse()
+        with patch('task_journal.os.remove', side_effect=PermissionError("read only folder")):
+            with self.assertRaises(PermissionError):
+                journal.saveChanges(tasks)
+        tasks[0].setStatus("Completed")
+        self.assertFalse(journal.saveChanges(tasks))
+        journal.close()
+        self.assertEqual([taskToRow(t) for t in TaskJournal(self.filename).load()], [taskToRow(t) for t in tasks])
+
+    def test_isCurrent(self):
+        """Test that a journal can tell when another session wrote since it loaded or saved"""
+        journal = TaskJournal(self.filename)
+        tasks = journal.load()
+        self.assertTrue(journal.isCurrent())
+        tasks.append(SecurityTask("Enable Firewall", "01/06/2025", "C", "Tablet", "Not Yet"))
+        journal.recordAdd(tasks[-1])
+        self.assertTrue(journal.isCurrent()) # its own append doesn't count
+        other = TaskJournal(self.filename)
+        other.recordDelete(0)
+        other.close()
+        self.assertFalse(journal.isCurrent())
+        journal.close()
+
+    def test_compaction(self):
+        """Test that compaction folds the journal into the snapshot"""
+        journal = TaskJournal(self.filename, min_bytes=0, ratio=0.5)
+        self.assertFalse(journal.needsCompaction())
+        for _ in range(5):
+            task = SecurityTask("Enable Firewall", "01/06/2025", "C", "Tablet", "Not Yet")
+            self.tasks.append(task)
+            journal.recordAdd(task)
+
+        self.assertTrue(journal.compactIfNeeded(self.tasks))
+        self.assertFalse(os.path.exists(journalPath(self.filename)))
+        self.assertEqual(len(readFromFile(self.filename)), 7)
+        self.assertEqual(len(TaskJournal(self.filename).load()), 7)
+
+    def test_stale_journal_ignored(self):
+        """Test that a journal left behind after the snapshot was rewritten is not replayed twice"""
+        journal = TaskJournal(self.filename)
+        task = SecurityTask("Enable Firewall", "01/06/2025", "C", "Tablet", "Not Yet")
+        self.tasks.append(task)
+        journal.recordAdd(task)
+        journal.close()
+
+        # simulate a crash after the snapshot write but before the journal was removed
+        writeToFile(self.filename, self.tasks)
+        self.assertEqual(len(TaskJournal(self.filename).load()), 3)
+
+    def test_torn_last_record(self):
+        """Test that a half written last record is ignored"""
+        journal = TaskJournal(self.filename)
+        journal.recordDelete(0)
+        journal.close()
+        with open(journalPath(self.filename), "a") as f:
+            f.write('{"op":"add","row":["Half')
+
+        loaded = TaskJournal(self.filename).load()
+        self.assertEqual(len(loaded), 1)
+        self.assertEqual(loaded[0].getTaskDetails(), "Update Password")
+
+    def test_group_commit(self):
+        """Test that records inside the sync window share one fsync"""
+        journal = TaskJournal(self.filename, sync_window=60)
+        with patch("task_journal.os.fsync") as mock_fsync:
+            for task in self.tasks:
+                journal.recordAdd(task)
+            synced = mock_fsync.call_count # only the new journal's folder entry so far
+
+            journal.close() # closing syncs whatever is still waiting
+            self.assertEqual(mock_fsync.call_count, synced + 1)
+        self.assertEqual(synced, 1)
+        self.assertEqual(len(TaskJournal(self.filename).load()), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import os
+import tempfile
+import unittest
+
+from security_manager import SecurityTask, writeToFile, taskToRow
+from task_journal import TaskJournal
+import task_locking
+from task_locking import lockedFile, lockPath, mergeRows
+
+
+class TestMergeRows(unittest.TestCase):
+
+    def test_independent_changes(self):
+        """Test that adds and deletes from both sessions are all kept"""
+        base = [("a",), ("b",), ("c",)]
+        ours = [("a",), ("c",), ("d",)] # deleted b, added d
+        theirs = [("a",), ("b",), ("e",)] # deleted c, added e
+        self.assertEqual(mergeRows(base, ours, theirs), [("a",), ("e",), ("d",)])
+
+    def test_same_row_changed_twice(self):
+        """Test that when both sessions change one row neither change is lost"""
+        base = [("a", "Not Yet")]
+        ours = [("a", "Completed")]
+        theirs = [("a", "In Progress")]
+        self.assertEqual(mergeRows(base, ours, theirs), [("a", "In Progress"), ("a", "Completed")])
+
+    def test_duplicate_rows(self):
+        """Test that identical rows are counted rather than collapsed"""
+        base = [("a",), ("a",)]
+        ours = [("a",)]
+        theirs = [("a",), ("a",), ("a",)]
+        self.assertEqual(mergeRows(base, ours, theirs), [("a",), ("a",)])
+
+
+class TestConcurrentSessions(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmp.name, "testUser.csv")
+        writeToFile(self.filename, [
+            SecurityTask("Install Antivirus", "10/05/2025", "A", "Desktop", "Not Yet"),
+            SecurityTask("Update Password", "12/05/2025", "B", "Mobile", "In Progress")
+        ])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def details(self, tasks):
+        return [task.getTaskDetails() for task in tasks]
+
+    def test_no_conflict(self):
+        """Test that a session on its own never merges"""
+        journal = TaskJournal(self.filename)
+        tasks = journal.load()
+        tasks.append(SecurityTask("Enable Firewall", "01/06/2025", "C", "Tablet", "Not Yet"))
+        self.assertFalse(journal.recordAdd(tasks[-1]))
+        del tasks[0]
+        self.assertFalse(journal.recordDelete(0))
+        journal.close()
+        self.assertEqual(self.details(TaskJournal(self.filename).load()), ["Update Password", "Enable Firewall"])
+
+    def test_conflicting_sessions_are_merged(self):
+        """Test that two sessions on the same user both keep their changes"""
+        first = TaskJournal(self.filename)
+        first_tasks = first.load()
+        second = TaskJournal(self.filename)
+        second_tasks = second.load()
+
+        # first session deletes a task
+        del first_tasks[0]
+        self.assertFalse(first.recordDelete(0))
+
+        # second session, still looking at the old list, updates task 2; that position is
+        # out of date on disk, so replaying it blindly would hit the wrong task
+        second_tasks[1].setStatus("Completed")
+        self.assertTrue(second.recordUpdate(1, second_tasks[1]))
+
+        merged = [taskToRow(task) for task in TaskJournal(self.filename).load()]
+        self.assertEqual(merged, [["Update Password", "12/05/2025", "B", "Mobile", "Completed"]])
+        self.assertEqual([taskToRow(task) for task in second_tasks], merged)
+
+        # the first session sees the change on its next write and merges it in too
+        first_tasks.append(SecurityTask("Enable Firewall", "01/06/2025", "C", "Tablet", "Not Yet"))
+        self.assertTrue(first.recordAdd(first_tasks[-1]))
+        self.assertEqual(self.details(first_tasks), ["Update Password", "Enable Firewall"])
+        self.assertEqual(first_tasks[0].getStatus(), "Completed")
+        first.close()
+        second.close()
+
+    @unittest.skipIf(task_locking.fcntl is None, "fcntl is not available")
+    def test_lock_is_exclusive(self):
+        """Test that the lock really blocks another holder while held"""
+        fcntl = task_locking.fcntl
+        with lockedFile(self.filename):
+            with open(lockPath(self.filename), "a") as other:
+                with self.assertRaises(BlockingIOError):
+                    fcntl.flock(other.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        with open(lockPath(self.filename), "a") as other:
+            fcntl.flock(other.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB) # free again
+            fcntl.flock(other.fileno(), fcntl.LOCK_UN)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from security_manager import SecurityTask, readFromFile, writeToFile, viewTasks
+from task_journal import TaskJournal
+from task_metrics import METRICS, timed, writeMetrics, enableFromArgs
+
+
+class TestTaskMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "alice.csv")
+        self.tasks = [
+            SecurityTask("Install Antivirus", "10/05/2025", "A", "Desktop", "Not Yet"),
+            SecurityTask("Update Password", "12/05/2025", "B", "Mobile", "In Progress")
+        ]
+        METRICS.reset()
+        METRICS.enabled = True
+
+    def tearDown(self):
+        METRICS.enabled = False
+        METRICS.reset()
+        self.tmp.cleanup()
+
+    def test_operations_are_recorded(self):
+        """Test counts and bytes for the file, journal and view operations"""
+        writeToFile(self.path, self.tasks)
+        readFromFile(self.path)
+        journal = TaskJournal(self.path)
+        tasks = journal.load()
+        journal.recordDelete(0)
+        journal.close()
+        with patch('sys.stdout'):
+            viewTasks(tasks)
+
+        size = os.path.getsize(self.path)
+        self.assertEqual(METRICS.getCount("writeToFile"), 1)
+        self.assertEqual(METRICS.getCount("readFromFile"), 2) # once more by the journal load
+        self.assertEqual(METRICS.getBytes("writeToFile"), size)
+        self.assertEqual(METRICS.getBytes("readFromFile"), 2 * size)
+        self.assertEqual(METRICS.getCount("journal.delete"), 1)
+        self.assertEqual(METRICS.getBytes("journal.append"), os.path.getsize(journal.getPath()))
+        self.assertEqual(METRICS.getCount("viewTasks"), 1)
+
+    def test_disabled_records_nothing(self):
+        """Test that nothing is recorded while metrics are off"""
+        METRICS.enabled = False
+        writeToFile(self.path, self.tasks)
+        readFromFile(self.path)
+        self.assertEqual(METRICS.toDict(), {"operations": {}, "bytes": {}, "gauges": {}})
+
+    def test_histogram_and_exports(self):
+        """Test the histogram buckets and the JSON and Prometheus output"""
+        METRICS.observe("example", 0.0004)
+        METRICS.observe("example", 0.003)
+        METRICS.observe("example", 60)
+        METRICS.addBytes("example", 10)
+        stats = METRICS.toDict()["operations"]["example"]
+        self.assertEqual(stats["count"], 3)
+        self.assertEqual((stats["buckets"]["0.0005"], stats["buckets"]["0.005"], stats["buckets"]["+Inf"]), (1, 1, 1))
+        self.assertEqual(stats["max"], 60)
+
+        output = os.path.join(self.tmp.name, "metrics.json")
+        writeMetrics(output)
+        with open(output) as f:
+            self.assertEqual(json.load(f)["bytes"], {"example": 10})
+
+        text = METRICS.toPrometheus()
+        self.assertIn('security_manager_operation_seconds_bucket{operation="example",le="0.005"} 2', text)
+        self.assertIn('security_manager_operation_seconds_bucket{operation="example",le="+Inf"} 3', text)
+        self.assertIn('security_manager_operation_seconds_count{operation="example"} 3', text)
+        self.assertIn('security_manager_bytes_total{operation="example"} 10', text)
+
+        METRICS.setGauge("queue", 3)
+        METRICS.setGauge("queue", 1)
+        self.assertEqual(METRICS.getGauge("queue"), (1, 3))
+        text = METRICS.toPrometheus()
+        self.assertIn('security_manager_gauge{name="queue"} 1', text)
+        self.assertIn('security_manager_gauge_max{name="queue"} 3', text)
+
+    def test_timed_keeps_exceptions(self):
+        """Test that a failing call is still timed and its exception passed on"""
+        @timed("failing")
+        def failing():
+            raise ValueError("broken")
+
+        with self.assertRaises(ValueError):
+            failing()
+        self.assertEqual(METRICS.getCount("failing"), 1)
+
+    def test_enableFromArgs(self):
+        """Test that the metrics options are taken out of the arguments"""
+        METRICS.enabled = False
+        with patch('task_metrics.atexit.register') as register:
+            rest = enableFromArgs(["--batch", "alice", "--metrics", "out.prom", "--dry-run"])
+        self.assertEqual(rest, ["--batch", "alice", "--dry-run"])
+        self.assertTrue(METRICS.enabled)
+        register.assert_called_once()
+
+        METRICS.enabled = False
+        self.assertEqual(enableFromArgs(["--batch", "bob"]), ["--batch", "bob"])
+        self.assertFalse(METRICS.enabled)
+
+
+if __name__ == '__main__':
+    unittest.main()
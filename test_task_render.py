@@ -0,0 +1,71 @@
+import unittest
+from unittest.mock import patch
+
+from security_manager import SecurityTask, viewTasks, pageTasks
+from task_render import renderTasks
+
+
+class TestTaskRender(unittest.TestCase):
+
+    def setUp(self):
+        self.tasks = [
+            SecurityTask(f"Task {number:02d}", f"{28 - number:02d}/05/2025", "ABC"[number % 3], "Desktop", "Not Yet")
+            for number in range(25)
+        ]
+
+    def lines(self, text):
+        return text.rstrip("\n").split("\n")
+
+    def test_page(self):
+        """Test that offset and limit render just one page, numbered from the full list"""
+        lines = self.lines(renderTasks(self.tasks, offset=20, limit=10))
+        self.assertEqual(len(lines), 2 + 5) # header, divider and the last 5 tasks
+        self.assertTrue(lines[2].startswith("21    Task 20"))
+        self.assertTrue(lines[-1].startswith("25    Task 24"))
+
+    def test_sort_key(self):
+        """Test sorting by a named key or a function while keeping task numbers"""
+        lines = self.lines(renderTasks(self.tasks, limit=2, sort_key="due"))
+        self.assertTrue(lines[2].startswith("25    Task 24")) # due on the 4th, the earliest
+        self.assertTrue(lines[3].startswith("24    Task 23"))
+
+        lines = self.lines(renderTasks(self.tasks, offset=8, limit=1, sort_key="priority"))
+        self.assertEqual(lines[2].split()[4], "A")
+        lines = self.lines(renderTasks(self.tasks, offset=9, limit=1, sort_key="priority"))
+        self.assertEqual(lines[2].split()[4], "B")
+
+        lines = self.lines(renderTasks(self.tasks, limit=1, sort_key=lambda task: task.getTaskDetails(), numbers=range(101, 126)))
+        self.assertTrue(lines[2].startswith("101   Task 00"))
+
+    def test_column_widths(self):
+        """Test that a long value widens its column instead of pushing the others out of line"""
+        long_task = SecurityTask("A" * 40, "10/05/2025", "A", "Desktop", "Not Yet")
+        lines = self.lines(renderTasks([long_task, self.tasks[0]]))
+        self.assertEqual(lines[2].index("10/05/2025"), lines[3].index("28/05/2025"))
+        self.assertEqual(lines[0].index("Due Date"), lines[2].index("10/05/2025"))
+        self.assertGreater(len(lines[1]), 90)
+
+    def test_viewTasks_writes_once(self):
+        """Test that viewTasks writes the table with a single write"""
+        with patch('sys.stdout') as mock_stdout:
+            viewTasks(self.tasks, limit=20)
+        self.assertEqual(mock_stdout.write.call_count, 1)
+        self.assertEqual(len(self.lines(mock_stdout.write.call_args[0][0])), 22)
+
+    def test_pageTasks(self):
+        """Test paging through tasks until the user stops"""
+        with patch('builtins.input', return_value="") as mock_input, patch('sys.stdout') as mock_stdout:
+            pageTasks(self.tasks, page_size=10)
+        self.assertEqual(mock_input.call_count, 2) # asked after pages 1 and 2, not after the last
+        printed = ''.join(call[0][0] for call in mock_stdout.write.call_args_list)
+        self.assertIn("Task 24", printed)
+
+        with patch('builtins.input', return_value="q") as mock_input, patch('sys.stdout') as mock_stdout:
+            pageTasks(self.tasks, page_size=10)
+        self.assertEqual(mock_input.call_count, 1)
+        printed = ''.join(call[0][0] for call in mock_stdout.write.call_args_list)
+        self.assertNotIn("Task 10", printed)
+
+
+if __name__ == '__main__':
+    unittest.main()
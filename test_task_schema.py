@@ -0,0 +1,109 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from security_manager import FIELDNAMES, readFromFile, taskToRow
+from task_journal import journalPath
+from task_schema import checkUserFile, checkUserFiles, mendRow, rejectsPath, repairUserFile, main
+
+
+class TestTaskSchema(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = self.tmp.name
+        self.write("alice.csv", [
+            "Task Details,Due_Date,Priority,Category,Status",
+            "Install Antivirus,10/05/2025,A,Desktop,Not Yet",
+            "Update Password, Bank,12/05/2025,B,Mobile,In Progress", # unquoted comma in the details
+            "Enable Firewall,01/06/2025,A,Tablet,Completed,,",
+            "Broken row",
+            "Backup Files,someday,D,Desktop,Not Yet"
+        ])
+        self.write("bob.csv", [
+            ",".join(FIELDNAMES),
+            "Change Pin Code,01/01/2025,A,Mobile,Not Yet"
+        ])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, lines):
+        with open(os.path.join(self.folder, name), "w", newline='') as f:
+            f.write("\n".join(lines) + "\n")
+
+    def test_check(self):
+        """Test that malformed rows and invalid values are found with their line numbers"""
+        result = checkUserFile(os.path.join(self.folder, "alice.csv"))
+        self.assertEqual(result["rows"], 5)
+        self.assertEqual(result["header"], ["Task Details", "Due_Date", "Priority", "Category", "Status"])
+        self.assertEqual((result["malformed"], result["invalid"]), (3, 2)) # the mended row has valid values
+        self.assertEqual([problem["line"] for problem in result["problems"] if problem["kind"] == "malformed"], [3, 4, 5])
+        self.assertFalse(result["fixed"])
+
+        result = checkUserFile(os.path.join(self.folder, "bob.csv"))
+        self.assertEqual((result["rows"], result["malformed"], result["invalid"], result["header"]), (1, 0, 0, None))
+
+    def test_mendRow(self):
+        """Test which rows with the wrong number of fields can be mended"""
+        positions = [0, 1, 2, 3, 4]
+        self.assertEqual(mendRow(["a", "01/01/2025", "A", "Mobile", "Not Yet", ""], 5, positions),
+                         ["a", "01/01/2025", "A", "Mobile", "Not Yet"])
+        self.assertEqual(mendRow(["a", " b", "01/01/2025", "A", "Mobile", "Not Yet"], 5, positions),
+                         ["a, b", "01/01/2025", "A", "Mobile", "Not Yet"])
+        self.assertIsNone(mendRow(["a", "b", "A", "Mobile", "Not Yet", "x"], 5, positions)) # b isn't a date
+        self.assertIsNone(mendRow(["a"], 5, positions))
+
+    def test_fix(self):
+        """Test that fixing gives a readable file and keeps the rows it couldn't mend"""
+        path = os.path.join(self.folder, "alice.csv")
+        with self.assertRaises(ValueError):
+            readFromFile(path)
+
+        results = {os.path.basename(r["file"]): r for r in checkUserFiles(self.folder, fix=True, workers=2)}
+        self.assertTrue(results["alice.csv"]["fixed"])
+        self.assertEqual((results["alice.csv"]["mended"], results["alice.csv"]["rejected"]), (2, 1))
+        self.assertFalse(results["bob.csv"]["fixed"]) # nothing to fix
+
+        self.assertEqual([taskToRow(task) for task in readFromFile(path)], [
+            ["Install Antivirus", "10/05/2025", "A", "Desktop", "Not Yet"],
+            ["Update Password, Bank", "12/05/2025", "B", "Mobile", "In Progress"],
+            ["Enable Firewall", "01/06/2025", "A", "Tablet", "Completed"],
+            ["Backup Files", "someday", "D", "Desktop", "Not Yet"] # invalid values are only reported
+        ])
+        with open(rejectsPath(path)) as f:
+            self.assertEqual(f.read().strip(), "Broken row")
+        result = checkUserFile(path)
+        self.assertEqual((result["malformed"], result["header"]), (0, None))
+
+    def test_fix_skips_files_with_a_journal(self):
+        """Test that a file isn't rewritten while its journal refers to row positions"""
+        path = os.path.join(self.folder, "alice.csv")
+        with open(journalPath(path), "w") as f:
+            f.write('{"op": "delete", "index": 0}\n')
+        result = checkUserFile(path, fix=True)
+        self.assertFalse(result["fixed"])
+        self.assertIn("journal", result["error"])
+
+        # a journal started after the file was checked is still seen, under the lock
+        with open(path, "rb") as f:
+            before = f.read()
+        result = {"fixed": False, "mended": 0, "rejected": 0, "error": None}
+        repairUserFile(path, result)
+        self.assertFalse(result["fixed"])
+        self.assertIn("journal", result["error"])
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), before)
+
+    def test_main(self):
+        """Test the exit code and the summary line"""
+        with patch('builtins.print') as printed:
+            self.assertEqual(main([self.folder, "--workers", "1"]), 1)
+        self.assertEqual(printed.call_args.args[0], "Checked 2 files, 1 with rows that can't be read")
+        with patch('builtins.print'):
+            self.assertEqual(main([self.folder, "--fix", "--workers", "1"]), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from security_manager import SecurityTask, writeToFile, selectView
+from task_journal import TaskJournal
+from task_search import SearchIndex, TaskSearch, tokenize, openSearchIndex, searchPath
+from task_store import TaskStore
+
+
+class TestTaskSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.task1 = SecurityTask("Install Antivirus On Desktop", "10/05/2025", "A", "Desktop", "Not Yet")
+        self.task2 = SecurityTask("Update Password", "12/05/2025", "B", "Mobile", "In Progress")
+        self.task3 = SecurityTask("Antivirus scan, laptop", "01/06/2025", "A", "Tablet", "Completed")
+        self.store = TaskStore([self.task1, self.task2, self.task3])
+        self.index = SearchIndex(self.store)
+
+    def test_tokenize(self):
+        """Test that words are case folded and split on anything but letters and digits"""
+        self.assertEqual(tokenize("Antivirus scan, LAPTOP-2"), ["antivirus", "scan", "laptop", "2"])
+
+    def test_search(self):
+        """Test whole word, prefix and multi word searches"""
+        self.assertEqual(self.index.search("antivirus"), [self.task1, self.task3])
+        self.assertEqual(self.index.search("ANTIVIR desk"), [self.task1])
+        self.assertEqual(self.index.search("pass"), [self.task2])
+        self.assertEqual(self.index.search("antivirus password"), [])
+        self.assertEqual(self.index.search("virus"), []) # only the start of a word matches
+        self.assertEqual(self.index.search("  "), [])
+        self.assertEqual(self.index.search("a", limit=1), [self.task1])
+
+    def test_follows_store_changes(self):
+        """Test that adds, deletes and setter changes update the index"""
+        task4 = SecurityTask("Backup Desktop Files", "01/07/2025", "C", "Desktop", "Not Yet")
+        self.store.append(task4)
+        self.assertEqual(self.index.search("desktop"), [self.task1, task4])
+
+        self.task2.setTaskDetails("Enable Desktop Firewall")
+        self.assertEqual(self.index.search("desktop"), [self.task1, self.task2, task4])
+        self.assertEqual(self.index.search("password"), [])
+
+        del self.store[0]
+        self.assertEqual(self.index.search("desktop"), [self.task2, task4])
+        self.assertEqual(self.index.search("install"), [])
+
+        self.store.clear()
+        self.assertEqual(self.index.search("desktop"), [])
+        self.assertEqual(self.index.getWordCount(), 0)
+        self.store.extend([self.task2, task4])
+        self.assertEqual(self.index.search("desktop"), [self.task2, task4])
+
+        self.task2.setStatus("Completed") # other fields don't touch the index
+        self.assertEqual(self.index.search("firewall"), [self.task2])
+
+        self.index.close()
+        self.task2.setTaskDetails("Something Else")
+        self.assertEqual(self.index.search("firewall"), [self.task2])
+
+    def test_save_and_load(self):
+        """Test that a saved index is used again only while the user file is unchanged"""
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "alice.csv")
+            writeToFile(path, self.store)
+            journal = TaskJournal(path)
+            store = journal.load(TaskStore)
+            SearchIndex(store).save(path)
+            self.assertTrue(os.path.exists(searchPath(path)))
+
+            loaded = SearchIndex.load(store, path)
+            self.assertIsNotNone(loaded)
+            self.assertEqual(loaded.search("antivirus"), [store[0], store[2]])
+            store[1].setTaskDetails("Antivirus For Phone") # a loaded index keeps following the store
+            self.assertEqual(loaded.search("antivirus phone"), [store[1]])
+
+            journal.recordUpdate(1, store[1]) # the files changed since the index was saved
+            self.assertIsNone(SearchIndex.load(store, path))
+            self.assertEqual(openSearchIndex(store, path).search("phone"), [store[1]])
+
+            with open(searchPath(path), "wb") as f:
+                f.write(b"{}\nnot json")
+            self.assertIsNone(SearchIndex.load(store, path))
+
+    def test_selectView_search(self):
+        """Test the search view from the menu, with each task's number in the full list"""
+        search = TaskSearch(self.store)
+        with patch('builtins.input', side_effect=["f", "antivirus"]), patch('sys.stdout'):
+            chosen, numbers, sort_key = selectView(self.store, search.search)
+        self.assertEqual(chosen, [self.task1, self.task3])
+        self.assertEqual(numbers, [1, 3])
+        search.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import os
+import tempfile
+import unittest
+
+from security_manager import SecurityTask, taskToRow
+from task_journal import TaskJournal
+from task_server import TaskServer, TaskClient
+from task_storage import CsvBackend
+
+
+class TestTaskServer(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.storage = CsvBackend(self.tmp.name)
+        self.storage.writeTasks("alice", [
+            SecurityTask("Install Antivirus", "10/05/2025", "A", "Desktop", "Not Yet"),
+            SecurityTask("Update Password", "12/05/2025", "B", "Mobile", "In Progress"),
+            SecurityTask("Enable Firewall", "01/05/2025", "A", "Tablet", "Completed")
+        ])
+        self.server = TaskServer(self.storage, flush_interval=3600)
+        self.path = os.path.join(self.tmp.name, "tasks.sock")
+        await self.server.start(self.path)
+        self.client = await TaskClient.connect(self.path)
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        await self.server.stop()
+        self.tmp.cleanup()
+
+    def rows(self, user="alice"):
+        return [taskToRow(task) for task in self.storage.readTasks(user)]
+
+    async def test_view(self):
+        """Test viewing a page of tasks, sorted or in order"""
+        response = await self.client.request("view", user="alice", limit=2, id=7)
+        self.assertTrue(response["ok"])
+        self.assertEqual(response["id"], 7)
+        self.assertEqual(response["count"], 3)
+        self.assertEqual([task["task"] for task in response["tasks"]], [1, 2])
+        self.assertEqual(response["tasks"][0]["details"], "Install Antivirus")
+
+        response = await self.client.request("view", user="alice", sort="due")
+        self.assertEqual([task["task"] for task in response["tasks"]], [3, 1, 2])
+
+    async def test_changes_are_flushed(self):
+        """Test that changes are kept in memory and saved by a flush"""
+        before = self.rows()
+        response = await self.client.request(
+            "add", user="alice", details="backup files", due_date="01/06/2025",
+            priority="c", category="desktop", status="not yet"
+        )
+        self.assertEqual(response, {"ok": True, "count": 4})
+        await self.client.request("update", user="alice", task=2, status="Completed")
+        await self.client.request("delete", user="alice", task=1)
+        self.assertEqual(self.rows(), before) # not saved yet
+
+        self.assertEqual((await self.client.request("flush"))["flushed"], 1)
+        self.assertEqual(self.rows(), [
+            ["Update Password", "12/05/2025", "B", "Mobile", "Completed"],
+            ["Enable Firewall", "01/05/2025", "A", "Tablet", "Completed"],
+            ["Backup Files", "01/06/2025", "C", "Desktop", "Not Yet"]
+        ])
+        self.assertEqual((await self.client.request("flush"))["flushed"], 0)
+
+    async def test_new_user_saved_on_stop(self):
+        """Test that a new user gets a file and stopping the server saves their changes"""
+        await self.client.request(
+            "add", user="bob", details="Patch Router", due_date="01/06/2025",
+            priority="A", category="Desktop", status="Not Yet"
+        )
+        await self.client.close()
+        await self.server.stop()
+        self.assertEqual(self.rows("bob"), [["Patch Router", "01/06/2025", "A", "Desktop", "Not Yet"]])
+        self.assertFalse(os.path.exists(self.path))
+
+        # start again so tearDown has something to stop
+        self.server = TaskServer(self.storage, flush_interval=3600)
+        await self.server.start(self.path)
+        self.client = await TaskClient.connect(self.path)
+
+    def addElsewhere(self, details):
+        '''Add a task from another session, the way main() would'''
+        journal = TaskJournal(self.storage.userFile("alice"))
+        tasks = journal.load()
+        tasks.append(SecurityTask(details, "01/06/2025", "C", "Desktop", "Not Yet"))
+        journal.recordAdd(tasks[-1])
+        journal.close()
+
+    async def test_reloads_other_sessions_writes(self):
+        """Test that writes by another session show up, and are merged with changes not saved yet"""
+        await self.client.request("view", user="alice") # loaded
+        self.addElsewhere("Backup Files")
+        response = await self.client.request("view", user="alice")
+        self.assertEqual(response["count"], 4)
+        self.assertEqual(response["tasks"][3]["details"], "Backup Files")
+
+        await self.client.request("update", user="alice", task=1, status="Completed") # not saved yet
+        self.addElsewhere("Patch Router")
+        response = await self.client.request("view", user="alice")
+        self.assertEqual([task["details"] for task in response["tasks"]],
+                         ["Update Password", "Enable Firewall", "Backup Files", "Patch Router", "Install Antivirus"])
+        self.assertEqual(self.rows()[4], ["Install Antivirus", "10/05/2025", "A", "Desktop", "Completed"]) # saved by the merge
+        self.assertEqual((await self.client.request("flush"))["flushed"], 0)
+
+    async def test_idle_sessions_evicted(self):
+        """Test that only saved sessions without recent requests are unloaded"""
+        await self.client.close()
+        await self.server.stop()
+        self.server = TaskServer(self.storage, flush_interval=3600, idle_timeout=0)
+        await self.server.start(self.path)
+        self.client = await TaskClient.connect(self.path)
+
+        await self.client.request("update", user="alice", task=1, status="Completed")
+        self.assertEqual(await self.server.evictIdle(), 0) # changes not saved yet
+        await self.server.flush()
+        self.assertEqual(await self.server.evictIdle(), 1)
+        self.assertEqual(await self.server.evictIdle(), 0)
+        response = await self.client.request("view", user="alice") # loaded again
+        self.assertEqual(response["tasks"][0]["status"], "Completed")
+
+    async def test_filter(self):
+        """Test filters on the indexed fields and due dates"""
+        response = await self.client.request("filter", user="alice", priority="A")
+        self.assertEqual([task["task"] for task in response["tasks"]], [1, 3])
+
+        response = await self.client.request("filter", user="alice", exclude={"status": "Completed"}, overdue=True, today="11/05/2025")
+        self.assertEqual([task["task"] for task in response["tasks"]], [1])
+
+        response = await self.client.request("filter", user="alice", due_within=1, today="11/05/2025")
+        self.assertEqual([task["task"] for task in response["tasks"]], [2])
+
+    async def test_errors(self):
+        """Test that bad requests get an error response and the connection stays usable"""
+        for request in [
+            {"op": "view"},
+            {"op": "view", "user": "../etc"},
+            {"op": "update", "user": "alice", "task": 9, "status": "Completed"},
+            {"op": "view", "user": "alice", "sort": "colour"},
+            {"op": "view", "user": "alice", "limit": -1},
+            {"op": "filter", "user": "alice", "details": "x"},
+            {"op": "shout", "user": "alice"}
+        ]:
+            op = request.pop("op")
+            response = await self.client.request(op, **request)
+            self.assertFalse(response["ok"], request)
+            self.assertTrue(response["error"])
+        self.assertTrue((await self.client.request("view", user="alice"))["ok"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import struct
+import tempfile
+import unittest
+
+from security_manager import SecurityTask, writeToFile, readFromFile, taskToRow
+from task_journal import TaskJournal, journalPath
+from task_snapshot import (
+    HEADER, Snapshot, writeSnapshot, openSnapshot, snapshotPath, readTasks, exportCsv, main
+)
+
+
+class TestTaskSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "alice.csv")
+        self.tasks = [
+            SecurityTask("Install Antivirus", "10/05/2025", "A", "Desktop", "Not Yet"),
+            SecurityTask("Update Password, Bank", "12/05/2025", "B", "Mobile", "In Progress"),
+            SecurityTask("Enable Firewall – Home", "not a date", "A", "Tablet", "Completed")
+        ]
+        writeToFile(self.path, self.tasks)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def rows(self, tasks):
+        return [taskToRow(task) for task in tasks]
+
+    def test_round_trip(self):
+        """Test that a snapshot gives back exactly the tasks it was made from"""
+        writeSnapshot(self.path, self.tasks)
+        with openSnapshot(self.path) as snapshot:
+            self.assertEqual(len(snapshot), 3)
+            self.assertEqual(self.rows(snapshot.toList()), self.rows(self.tasks))
+            # single tasks and fields are decoded on their own
+            self.assertEqual(snapshot.details(2), "Enable Firewall – Home")
+            self.assertEqual(snapshot.value("due_date", 2), "not a date")
+            self.assertEqual(taskToRow(snapshot[-1]), taskToRow(self.tasks[2]))
+            self.assertEqual(self.rows(snapshot[1:]), self.rows(self.tasks[1:]))
+            self.assertEqual(snapshot.countBy("priority"), {"A": 2, "B": 1})
+            with self.assertRaises(IndexError):
+                snapshot[3]
+
+    def test_empty(self):
+        """Test a snapshot of a user with no tasks"""
+        writeToFile(self.path, [])
+        writeSnapshot(self.path, [])
+        with openSnapshot(self.path) as snapshot:
+            self.assertEqual(snapshot.toList(), [])
+
+    def test_out_of_date_or_unknown_version_is_ignored(self):
+        """Test that the CSV is read when the snapshot doesn't match it"""
+        self.assertIsNone(openSnapshot(self.path)) # no snapshot yet
+        writeSnapshot(self.path, self.tasks)
+        writeToFile(self.path, self.tasks[:1]) # changed by something that doesn't know about snapshots
+        self.assertIsNone(openSnapshot(self.path))
+        self.assertEqual(self.rows(readTasks(self.path)), self.rows(self.tasks[:1]))
+
+        writeSnapshot(self.path, self.tasks[:1])
+        with open(snapshotPath(self.path), "r+b") as f:
+            f.seek(4)
+            f.write(struct.pack("<H", 99)) # a future version
+        with self.assertRaises(ValueError):
+            Snapshot(snapshotPath(self.path))
+        self.assertIsNone(openSnapshot(self.path))
+
+        with open(snapshotPath(self.path), "wb") as f:
+            f.write(b"junk")
+        self.assertIsNone(openSnapshot(self.path))
+
+    def test_cut_short(self):
+        """Test that a truncated snapshot is rejected rather than read wrongly"""
+        writeSnapshot(self.path, self.tasks)
+        with open(snapshotPath(self.path), "r+b") as f:
+            f.truncate(HEADER.size + 40)
+        self.assertIsNone(openSnapshot(self.path))
+
+    def test_journal_keeps_snapshot_up_to_date(self):
+        """Test that loading uses the snapshot and compaction rewrites it"""
+        main(["build", self.path])
+        journal = TaskJournal(self.path)
+        tasks = journal.load()
+        self.assertEqual(self.rows(tasks), self.rows(self.tasks))
+        del tasks[0]
+        journal.recordDelete(0)
+        journal.compact(tasks)
+        with openSnapshot(self.path) as snapshot:
+            self.assertEqual(self.rows(snapshot.toList()), self.rows(self.tasks[1:]))
+
+    def test_export(self):
+        """Test writing the CSV back out from a snapshot"""
+        writeSnapshot(self.path, self.tasks)
+        copy = os.path.join(self.tmp.name, "copy.csv")
+        self.assertEqual(exportCsv(self.path, copy), 3)
+        self.assertEqual(self.rows(readFromFile(copy)), self.rows(self.tasks))
+
+        with self.assertRaises(ValueError):
+            exportCsv(self.path, self.path) # only the journal rewrites the user file
+
+    def test_export_refuses_stale_snapshot(self):
+        """Test that export refuses a snapshot that is missing journal changes or out of date"""
+        writeSnapshot(self.path, self.tasks)
+        copy = os.path.join(self.tmp.name, "copy.csv")
+        journal = TaskJournal(self.path)
+        tasks = journal.load()
+        tasks.append(SecurityTask("Patch Router", "02/06/2025", "C", "Desktop", "Not Yet"))
+        journal.saveChanges(tasks)
+        journal.close()
+        with self.assertRaises(ValueError):
+            exportCsv(self.path, copy)
+        self.assertFalse(os.path.exists(copy))
+        self.assertEqual(len(TaskJournal(self.path).load()), 4) # the journal change is still there
+
+        os.remove(journalPath(self.path))
+        writeToFile(self.path, self.tasks[:1]) # the CSV changed behind the snapshot's back
+        with self.assertRaises(ValueError):
+            exportCsv(self.path, copy)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,227 @@
+import datetime
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+from security_manager import SecurityTask, writeToFile, taskToRow
+from task_journal import TaskJournal
+from task_storage import CsvBackend, SqliteBackend, getBackend, importCsvUsers
+
+
+class BackendTests:
+    """Behaviour every storage backend has to share"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.backend = self.makeBackend()
+        self.tasks = [
+            SecurityTask("Install Antivirus", "10/05/2025", "A", "Desktop", "Not Yet"),
+            SecurityTask("Update Password", "12/05/2025", "B", "Mobile", "In Progress"),
+            SecurityTask("Enable Firewall", "01/06/2025", "A", "Tablet", "Completed")
+        ]
+
+    def tearDown(self):
+        self.backend.close()
+        self.tmp.cleanup()
+
+    def rows(self, tasks):
+        return [taskToRow(task) for task in tasks]
+
+    def test_create_read_write(self):
+        """Test creating a user and replacing their tasks"""
+        self.assertFalse(self.backend.exists("alice"))
+        self.assertEqual(self.backend.createUser("alice"), [])
+        self.assertTrue(self.backend.exists("alice"))
+        self.assertEqual(self.backend.readTasks("alice"), [])
+
+        self.backend.writeTasks("alice", self.tasks)
+        self.assertEqual(self.rows(self.backend.readTasks("alice")), self.rows(self.tasks))
+        self.backend.writeTasks("alice", self.tasks[:1])
+        self.assertEqual(self.rows(self.backend.readTasks("alice")), self.rows(self.tasks[:1]))
+
+    def test_single_changes(self):
+        """Test adding, replacing and removing one task at a time"""
+        self.backend.createUser("alice")
+        for task in self.tasks:
+            self.backend.appendTask("alice", task)
+        changed = SecurityTask("Update Password", "12/05/2025", "B", "Mobile", "Completed")
+        self.backend.replaceTask("alice", 1, changed)
+        self.backend.removeTask("alice", 0)
+
+        self.assertEqual(self.rows(self.backend.readTasks("alice")), self.rows([changed, self.tasks[2]]))
+
+        # the change log main() uses goes to the same place
+        log = self.backend.changeLog("alice")
+        log.recordDelete(0)
+        log.close()
+        self.assertEqual(self.rows(self.backend.readTasks("alice")), self.rows([self.tasks[2]]))
+
+    def test_saveChanges(self):
+        """Test that the change log saves the tasks changed since it loaded them"""
+        self.backend.writeTasks("alice", self.tasks * 4)
+        log = self.backend.changeLog("alice")
+        tasks = log.load()
+        tasks[1].setStatus("Completed")
+        del tasks[0]
+        tasks.append(SecurityTask("Backup Files", "01/07/2025", "C", "Desktop", "Not Yet"))
+        log.saveChanges(tasks)
+        log.close()
+        self.assertEqual(self.rows(self.backend.readTasks("alice")), self.rows(tasks))
+        self.assertFalse(tasks[0].isDirty())
+
+    def test_queryTasks(self):
+        """Test filtering a user's tasks"""
+        self.backend.writeTasks("alice", self.tasks)
+        self.backend.writeTasks("bob", [SecurityTask("Other", "01/01/2025", "A", "Desktop", "Not Yet")])
+
+        result = self.backend.queryTasks("alice", priority="A", exclude={"status": "Completed"})
+        self.assertEqual(self.rows(result), self.rows(self.tasks[:1]))
+        result = self.backend.queryTasks("alice", due_before=datetime.date(2025, 5, 31))
+        self.assertEqual(self.rows(result), self.rows(self.tasks[:2]))
+        result = self.backend.queryTasks("alice", category=["Mobile", "Tablet"])
+        self.assertEqual(self.rows(result), self.rows(self.tasks[1:]))
+
+        with self.assertRaises(ValueError):
+            self.backend.queryTasks("alice", details="Other")
+
+
+class TestCsvBackend(BackendTests, unittest.TestCase):
+
+    def makeBackend(self):
+        return CsvBackend(self.tmp.name)
+
+    def test_single_changes_use_journal(self):
+        """Test that single changes don't rewrite the user file"""
+        self.backend.writeTasks("alice", self.tasks)
+        before = os.stat(self.backend.path("alice")).st_mtime_ns
+        self.backend.removeTask("alice", 0)
+        self.assertEqual(os.stat(self.backend.path("alice")).st_mtime_ns, before)
+        self.assertEqual(len(self.backend.readTasks("alice")), 2)
+
+
+class TestSqliteBackend(BackendTests, unittest.TestCase):
+
+    def makeBackend(self):
+        return SqliteBackend(os.path.join(self.tmp.name, "tasks.db"))
+
+    def test_wal_and_indexes(self):
+        """Test that the database is in WAL mode with the expected indexes"""
+        connection = self.backend.connection
+        self.assertEqual(connection.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        indexes = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        self.assertTrue({"tasks_user_status", "tasks_user_priority", "tasks_user_due"} <= indexes)
+
+    def test_saveChanges_bulk(self):
+        """Test scattered changes saved in one go, and that changing most of the list rewrites it instead"""
+        from task_store import TaskStore
+        self.backend.writeTasks("alice", [SecurityTask(*taskToRow(task)) for task in self.tasks * 10])
+        log = self.backend.changeLog("alice")
+        tasks = log.load(TaskStore)
+        for index in (27, 15, 4):
+            del tasks[index]
+        tasks[0].setStatus("Completed")
+        tasks[20].setPriority("C")
+        tasks.append(SecurityTask("Backup Files", "01/07/2025", "C", "Desktop", "Not Yet"))
+        with unittest.mock.patch.object(self.backend, "writeTasks") as rewrite:
+            log.saveChanges(tasks)
+        rewrite.assert_not_called()
+        self.assertEqual(self.rows(self.backend.readTasks("alice")), self.rows(tasks))
+
+        tasks.updateWhere({"status": "Completed"}, category="Mobile")
+        tasks.deleteWhere(category="Desktop")
+        with unittest.mock.patch.object(self.backend, "writeTasks", wraps=self.backend.writeTasks) as rewrite:
+            log.saveChanges(tasks)
+        rewrite.assert_called_once()
+        log.close()
+        self.assertEqual(self.rows(self.backend.readTasks("alice")), self.rows(tasks))
+
+    def test_sessions_merge(self):
+        """Test that a change saved after another session deleted a row goes to the right task"""
+        self.backend.writeTasks("alice", [SecurityTask(f"t{number}", "01/01/2025", "A", "Desktop", "Not Yet")
+                                          for number in range(6)])
+        other = self.makeBackend()
+        try:
+            theirs = other.changeLog("alice")
+            their_tasks = theirs.load()
+            ours = self.backend.changeLog("alice")
+            tasks = ours.load()
+            del their_tasks[0]
+            self.assertFalse(theirs.saveChanges(their_tasks))
+            tasks[3].setStatus("Completed")
+            self.assertTrue(ours.saveChanges(tasks)) # merged with their delete
+        finally:
+            other.close()
+        saved = [f"{task.getTaskDetails()}:{task.getStatus()}" for task in self.backend.readTasks("alice")]
+        self.assertEqual(saved, ["t1:Not Yet", "t2:Not Yet", "t4:Not Yet", "t5:Not Yet", "t3:Completed"])
+        self.assertEqual(saved, [f"{task.getTaskDetails()}:{task.getStatus()}" for task in tasks])
+
+        tasks[0].setPriority("C") # saved by row id again now the session is up to date
+        self.assertFalse(ours.saveChanges(tasks))
+        self.assertEqual(self.rows(self.backend.readTasks("alice")), self.rows(tasks))
+
+    def test_isCurrent(self):
+        """Test that a change log can tell when another session wrote since it loaded or saved"""
+        self.backend.writeTasks("alice", [SecurityTask("t0", "01/01/2025", "A", "Desktop", "Not Yet")])
+        ours = self.backend.changeLog("alice")
+        tasks = ours.load()
+        self.assertTrue(ours.isCurrent())
+        tasks[0].setStatus("Completed")
+        ours.saveChanges(tasks)
+        self.assertTrue(ours.isCurrent()) # its own save doesn't count
+        other = self.makeBackend()
+        try:
+            other.appendTask("alice", SecurityTask("t1", "01/01/2025", "A", "Desktop", "Not Yet"))
+        finally:
+            other.close()
+        self.assertFalse(ours.isCurrent())
+
+    def test_compact_merges(self):
+        """Test that saving the whole list keeps a row another session added since it was loaded"""
+        self.backend.writeTasks("alice", self.tasks)
+        other = self.makeBackend()
+        try:
+            ours = self.backend.changeLog("alice")
+            tasks = ours.load()
+            other.appendTask("alice", SecurityTask("Backup Files", "01/07/2025", "C", "Desktop", "Not Yet"))
+            tasks.reverse() # only saved by writing the whole list
+            self.assertTrue(ours.saveChanges(tasks))
+        finally:
+            other.close()
+        self.assertEqual([task.getTaskDetails() for task in self.backend.readTasks("alice")],
+                         ["Install Antivirus", "Update Password", "Enable Firewall", "Backup Files"])
+        self.assertEqual(self.rows(self.backend.readTasks("alice")), self.rows(tasks))
+
+    def test_batch_rolls_back(self):
+        """Test that a failing batch leaves nothing behind"""
+        self.backend.writeTasks("alice", self.tasks)
+        with self.assertRaises(RuntimeError):
+            with self.backend.batch():
+                self.backend.removeTask("alice", 0)
+                raise RuntimeError("stop")
+        self.assertEqual(len(self.backend.readTasks("alice")), 3)
+
+    def test_importCsvUsers(self):
+        """Test copying the CSV user files, journals included, into the database"""
+        folder = os.path.join(self.tmp.name, "users")
+        os.makedirs(folder)
+        writeToFile(os.path.join(folder, "alice.csv"), self.tasks)
+        writeToFile(os.path.join(folder, "bob.csv"), self.tasks[:1])
+        journal = TaskJournal(os.path.join(folder, "bob.csv"))
+        journal.recordAdd(self.tasks[1])
+        journal.close()
+
+        self.assertEqual(importCsvUsers(self.backend, folder), 2)
+        self.assertEqual(self.rows(self.backend.readTasks("alice")), self.rows(self.tasks))
+        self.assertEqual(self.rows(self.backend.readTasks("bob")), self.rows(self.tasks[:2]))
+
+
+class TestGetBackend(unittest.TestCase):
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            getBackend("mongodb")
+
+
+if __name__ == '__main__':
+    unittest.main()
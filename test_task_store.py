@@ -0,0 +1,168 @@
+import datetime
+import unittest
+from unittest.mock import patch
+
+from security_manager import SecurityTask, deleteTask
+from task_store import TaskStore
+
+
+class TestTaskStore(unittest.TestCase):
+
+    def setUp(self):
+        self.task1 = SecurityTask("Install Antivirus", "10/05/2025", "A", "Desktop", "Not Yet")
+        self.task2 = SecurityTask("Update Password", "12/05/2025", "B", "Mobile", "In Progress")
+        self.task3 = SecurityTask("Enable Firewall", "10/05/2025", "A", "Tablet", "Completed")
+        self.store = TaskStore([self.task1, self.task2, self.task3])
+
+    def test_list_behaviour(self):
+        """Test that the store can be used like the list readFromFile returns"""
+        self.assertEqual(len(self.store), 3)
+        self.assertIs(self.store[0], self.task1)
+        self.assertIs(self.store[-1], self.task3)
+        self.assertEqual(list(self.store), [self.task1, self.task2, self.task3])
+
+        task4 = SecurityTask("Backup Files", "01/06/2025", "C", "Desktop", "Not Yet")
+        self.store.append(task4)
+        self.assertEqual(self.store.index(task4), 3)
+
+        # deleteTask works on the store just like on a list
+        with patch('builtins.input', return_value="y"), patch('sys.stdout'):
+            self.assertTrue(deleteTask(self.store, 1))
+        self.assertEqual(list(self.store), [self.task2, self.task3, task4])
+        self.assertIsNone(self.task1.getTaskId())
+
+    def test_stable_ids(self):
+        """Test that ids stay the same when other tasks are removed"""
+        task3_id = self.task3.getTaskId()
+        del self.store[0]
+        self.assertEqual(self.task3.getTaskId(), task3_id)
+        self.assertIs(self.store.getById(task3_id), self.task3)
+        self.assertIsNone(self.store.getById(self.task1.getTaskId()))
+
+        self.store.reverse()
+        self.assertEqual(self.task3.getTaskId(), task3_id)
+        self.assertIs(self.store[0], self.task3)
+
+    def test_clear(self):
+        """Test that clear() empties the list and the indexes and the store can be filled again"""
+        self.store.clear()
+        self.assertEqual(len(self.store), 0)
+        self.assertIsNone(self.task1.getTaskId())
+        self.assertEqual(self.store.values("priority"), [])
+        self.assertEqual(self.store.sortedByDue(), [])
+        self.assertEqual(self.store.countTasks(priority="A"), 0)
+        self.task1.setStatus("Completed") # no longer reports to the store
+
+        self.store.extend([self.task3, self.task1])
+        self.assertEqual(self.store.findTasks(priority="A", status="Completed"), [self.task3, self.task1])
+        self.assertEqual(self.store.dueBetween(include_completed=True), [self.task3, self.task1]) # same day, new ids
+        self.assertEqual(self.store.positionOf(self.task1), 1)
+
+    def test_findTasks(self):
+        """Test filtered queries on the indexed fields"""
+        self.assertEqual(self.store.findTasks(priority="A"), [self.task1, self.task3])
+        self.assertEqual(self.store.findTasks(priority="A", exclude={"status": "Completed"}), [self.task1])
+        self.assertEqual(self.store.findTasks(category=["Mobile", "Tablet"]), [self.task2, self.task3])
+        self.assertEqual(self.store.findTasks(due_date=datetime.date(2025, 5, 10)), [self.task1, self.task3])
+        self.assertEqual(self.store.findTasks(priority="C"), [])
+        self.assertEqual(self.store.countTasks(exclude={"status": "Completed"}), 2)
+        self.assertEqual(self.store.countTasks(), 3)
+
+        with self.assertRaises(ValueError):
+            self.store.findTasks(details="Install Antivirus")
+
+    def test_findTasks_exclusions(self):
+        """Test exclusions together with other conditions and due date ranges"""
+        may_10 = datetime.date(2025, 5, 10)
+        self.assertEqual(self.store.findTasks(priority="A", exclude={"status": ["Completed", "Not Yet"]}), [])
+        self.assertEqual(self.store.findTasks(exclude={"priority": "A", "status": "Gone"}), [self.task2])
+        self.assertEqual(self.store.findTasks(due_from=may_10, exclude={"category": "Tablet"}), [self.task1, self.task2])
+        self.assertEqual(self.store.findTasks(category="Tablet", exclude={"due_date": may_10}), [])
+        self.assertEqual(self.store.findTasks(priority="Z", exclude={"status": "Completed"}), [])
+        self.assertEqual(self.store.countTasks(priority=["A", "B"], due_before=datetime.date(2025, 5, 11),
+                                               exclude={"status": "Not Yet"}), 1)
+
+    def test_indexes_follow_setters(self):
+        """Test that changing a task through its setters updates the indexes"""
+        self.task2.setPriority("A")
+        self.task1.setStatus("Completed")
+        self.assertEqual(self.store.findTasks(priority="A", status="Completed"), [self.task1, self.task3])
+        self.assertEqual(self.store.findTasks(priority="B"), [])
+        self.assertNotIn("B", self.store.values("priority"))
+
+        replacement = SecurityTask("Backup Files", "01/06/2025", "C", "Desktop", "Not Yet")
+        self.store[0] = replacement
+        self.assertEqual(self.store.findTasks(category="Desktop"), [replacement])
+
+        # a task taken out of the store no longer reports to it
+        self.task1.setCategory("Tablet")
+        self.assertEqual(self.store.findTasks(category="Tablet"), [self.task3])
+
+    def test_due_date_views(self):
+        """Test the overdue, due soon and sorted views from the due date index"""
+        today = datetime.date(2025, 5, 11)
+        undated = SecurityTask("Backup Files", "someday", "C", "Desktop", "Not Yet")
+        self.store.append(undated)
+
+        # task3 is due before today as well but is completed
+        self.assertEqual(self.store.overdue(today), [self.task1])
+        self.assertEqual(self.store.dueWithin(1, today), [self.task2])
+        self.assertEqual(self.store.dueWithin(0, today), [])
+        self.assertEqual(self.store.dueWithin(10 ** 6, today), [self.task2])
+        self.assertEqual(self.store.dueBetween(include_completed=True), [self.task1, self.task3, self.task2])
+        self.assertEqual(self.store.sortedByDue(), [self.task1, self.task3, self.task2, undated])
+
+        # the index follows changes and deletes
+        self.task2.setDueDate("01/01/2025")
+        self.assertEqual(self.store.overdue(today), [self.task2, self.task1])
+        del self.store[0]
+        self.assertEqual(self.store.overdue(today), [self.task2])
+        self.assertEqual([self.store.positionOf(task) for task in self.store.sortedByDue()], [0, 1, 2])
+
+
+    def test_bulk_changes(self):
+        """Test that updateWhere and deleteWhere change every matching task and keep the indexes right"""
+        task4 = SecurityTask("Backup Files", "01/06/2025", "C", "Desktop", "Completed")
+        self.store.append(task4)
+        self.assertEqual(self.store.countTasks(priority="A", due_before=datetime.date(2025, 5, 11)), 2)
+
+        # task3 is already completed, so only task1 changes
+        self.assertEqual(self.store.updateWhere({"status": "Completed"}, priority="A"), 1)
+        self.assertTrue(self.task1.isDirty())
+        self.assertFalse(self.task3.isDirty())
+        self.assertEqual(self.store.findTasks(status="Completed"), [self.task1, self.task3, task4])
+        with self.assertRaises(ValueError):
+            self.store.updateWhere({"colour": "red"})
+
+        self.assertEqual(self.store.deleteWhere(status="Completed", due_before=datetime.date(2025, 5, 11)), 2)
+        self.assertEqual(list(self.store), [self.task2, task4])
+        self.assertEqual(self.store.positionOf(task4), 1)
+        self.assertEqual(self.store.sortedByDue(), [self.task2, task4])
+        self.assertEqual(self.store.deleteWhere(category="Tablet"), 0)
+
+
+    def test_slice_assignment_and_contains(self):
+        """Test that slice assignment and membership checks behave like a list"""
+        task4 = SecurityTask("Backup Files", "01/06/2025", "C", "Desktop", "Not Yet")
+        task1_id = self.task1.getTaskId()
+        self.store[0:2] = [self.task1, task4]
+        self.assertEqual(list(self.store), [self.task1, task4, self.task3])
+        self.assertEqual(self.task1.getTaskId(), task1_id) # kept its id
+        self.assertIsNone(self.task2.getTaskId())
+        self.assertEqual(self.store.findTasks(category="Desktop"), [self.task1, task4])
+
+        self.store[1:] = []
+        self.assertEqual(list(self.store), [self.task1])
+        with self.assertRaises(ValueError):
+            self.store[0:0] = [self.task1] # already in the store
+        with self.assertRaises(ValueError):
+            self.store[::2] = [self.task2, self.task3]
+        self.assertEqual(list(self.store), [self.task1])
+
+        self.assertFalse(None in self.store)
+        self.assertFalse("Install Antivirus" in self.store)
+        self.assertFalse(self.task2 in self.store)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import signal
+import tempfile
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+from security_manager import SecurityTask, writeToFile, taskToRow
+from task_journal import TaskJournal
+from task_metrics import METRICS
+from task_store import TaskStore
+from task_writer import WriteBehind
+
+
+class TestWriteBehind(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "alice.csv")
+        writeToFile(self.path, [
+            SecurityTask("Install Antivirus", "10/05/2025", "A", "Desktop", "Not Yet"),
+            SecurityTask("Update Password", "12/05/2025", "B", "Mobile", "In Progress")
+        ])
+        self.journal = TaskJournal(self.path)
+        self.tasks = self.journal.load(TaskStore)
+
+    def tearDown(self):
+        self.journal.close()
+        self.tmp.cleanup()
+
+    def saved(self):
+        return [taskToRow(task) for task in TaskJournal(self.path).load()]
+
+    def test_coalesces_edits(self):
+        """Test that edits made close together are saved with one write"""
+        writer = WriteBehind(self.journal, self.tasks, delay=0.05).start()
+        with patch.object(self.journal, "saveChanges", wraps=self.journal.saveChanges) as save:
+            self.tasks[0].setStatus("Completed")
+            writer.changed()
+            self.tasks.append(SecurityTask("Enable Firewall", "01/06/2025", "C", "Tablet", "Not Yet"))
+            writer.changed()
+            with writer.idle():
+                time.sleep(0.3)
+            self.assertEqual(save.call_count, 1)
+            writer.close()
+        self.assertEqual(self.saved(), [taskToRow(task) for task in self.tasks])
+
+    def test_only_saves_while_idle(self):
+        """Test that nothing is saved while main() is using the tasks"""
+        journal = Mock()
+        journal.saveChanges.return_value = True # as if another session's changes were merged in
+        writer = WriteBehind(journal, self.tasks, delay=0).start()
+        writer.changed()
+        time.sleep(0.1)
+        journal.saveChanges.assert_not_called()
+        with writer.idle():
+            time.sleep(0.1)
+        journal.saveChanges.assert_called_once_with(self.tasks)
+        self.assertTrue(writer.takeMerged())
+        self.assertFalse(writer.takeMerged())
+        writer.close()
+
+    def test_close_saves_everything(self):
+        """Test that closing saves changes the thread hasn't got to yet"""
+        writer = WriteBehind(self.journal, self.tasks, delay=60).start()
+        del self.tasks[0]
+        writer.changed()
+        writer.close()
+        self.assertEqual(self.saved(), [taskToRow(task) for task in self.tasks])
+        with self.assertRaises(ValueError):
+            writer.changed()
+
+    def test_failed_save_is_tried_again(self):
+        """Test that a failed save is reported and tried again on close"""
+        journal = Mock()
+        journal.saveChanges.side_effect = [OSError("disk full"), False]
+        writer = WriteBehind(journal, self.tasks, delay=0).start()
+        writer.changed()
+        with patch('sys.stderr'), writer.idle():
+            time.sleep(0.1)
+        self.assertIsInstance(writer.getError(), OSError)
+        writer.close()
+        self.assertIsNone(writer.getError())
+        self.assertEqual(journal.saveChanges.call_count, 2)
+
+    def test_metrics(self):
+        """Test the queue depth gauge and the latency of each save"""
+        METRICS.reset()
+        METRICS.enabled = True
+        try:
+            writer = WriteBehind(Mock(**{"saveChanges.return_value": False}), self.tasks, delay=60).start()
+            writer.changed()
+            writer.changed()
+            writer.close()
+            self.assertEqual(METRICS.getGauge("writer.queue_depth"), (0, 2))
+            self.assertEqual(METRICS.getCount("writer.latency"), 1)
+        finally:
+            METRICS.enabled = False
+            METRICS.reset()
+
+    def test_signal_exits_through_close(self):
+        """Test that SIGTERM becomes SystemExit, so main() unwinds and atexit closes the writer"""
+        previous = signal.getsignal(signal.SIGTERM)
+        writer = WriteBehind(self.journal, self.tasks, delay=60).start()
+        try:
+            writer.flushOnSignals(["SIGTERM"])
+            self.tasks[1].setPriority("A")
+            writer.changed()
+            with self.assertRaises(SystemExit) as raised:
+                os.kill(os.getpid(), signal.SIGTERM)
+                time.sleep(1)
+            self.assertEqual(raised.exception.code, 128 + signal.SIGTERM)
+        finally:
+            signal.signal(signal.SIGTERM, previous)
+            writer.close() # what atexit does
+        self.assertEqual(self.saved()[1][2], "A")
+
+
+if __name__ == '__main__':
+    unittest.main()
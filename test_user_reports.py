@@ -0,0 +1,66 @@
+import datetime
+import os
+import tempfile
+import unittest
+
+from security_manager import SecurityTask, writeToFile
+from user_reports import findUserFiles, summariseUserFile, fleetReport
+
+
+class TestUserReports(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = self.tmp.name
+        self.today = datetime.date(2025, 6, 1)
+        writeToFile(os.path.join(self.folder, "alice.csv"), [
+            SecurityTask("Install Antivirus", "10/05/2025", "A", "Desktop", "Not Yet"),
+            SecurityTask("Update Password", "12/07/2025", "B", "Mobile", "In Progress")
+        ])
+        writeToFile(os.path.join(self.folder, "bob.csv"), [
+            SecurityTask("Enable Firewall", "01/05/2025", "A", "Desktop", "Completed"),
+            SecurityTask("Change Pin Code", "20/05/2025", "A", "Mobile", "In Progress"),
+            SecurityTask("Backup Files", "15/05/2025", "C", "Desktop", "Not Yet")
+        ])
+        with open(os.path.join(self.folder, "broken.csv"), "w") as f:
+            f.write("Details,When\nSomething,01/01/2025\n")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_summariseUserFile(self):
+        """Test the summary of a single user file"""
+        summary = summariseUserFile(os.path.join(self.folder, "bob.csv"), self.today)
+        self.assertEqual(summary["user"], "bob")
+        self.assertEqual(summary["tasks"], 3)
+        self.assertEqual(summary["priority"], {"A": 2, "C": 1})
+        self.assertEqual([t["task"] for t in summary["overdue"]], ["Change Pin Code", "Backup Files"])
+
+        summary = summariseUserFile(os.path.join(self.folder, "bob.csv"), self.today, overdue_priorities=["A"])
+        self.assertEqual([t["task"] for t in summary["overdue"]], ["Change Pin Code"])
+
+        summary = summariseUserFile(os.path.join(self.folder, "broken.csv"), self.today)
+        self.assertIn("missing column", summary["error"]) # found by the header check, not a KeyError per row
+        self.assertEqual(sorted(os.listdir(self.folder)), ["alice.csv", "bob.csv", "broken.csv"]) # no lock files
+
+    def test_fleetReport(self):
+        """Test that serial and parallel reports merge to the same totals"""
+        self.assertEqual(len(findUserFiles(self.folder)), 3)
+        serial = fleetReport(self.folder, workers=1, today=self.today)
+        parallel = fleetReport(self.folder, workers=2, today=self.today, chunksize=1)
+
+        for report in (serial, parallel):
+            self.assertEqual(report.users, 2)
+            self.assertEqual(report.tasks, 5)
+            self.assertEqual(report.status, {"Not Yet": 2, "In Progress": 2, "Completed": 1})
+            self.assertEqual(report.category, {"Desktop": 3, "Mobile": 2})
+            self.assertEqual(list(report.errors), ["broken"])
+
+            by_category = report.overdueByCategory("A")
+            self.assertEqual({c: [t["user"] for t in tasks] for c, tasks in by_category.items()},
+                             {"Desktop": ["alice"], "Mobile": ["bob"]})
+        self.assertEqual(serial.toDict()["priority"], parallel.toDict()["priority"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+# Fleet wide reporting across every user file in the users/ folder.
+#
+# Each user file is parsed with readFromFile (plus any journal changes not yet
+# compacted into it) in a pool of worker processes. Every worker sends back a
+# small summary, the counts and the user's overdue tasks, and the parent merges
+# the summaries as they arrive instead of ever holding the tasks themselves.
+#
+#   python user_reports.py [folder] [--workers N] [--priority A] [--json]
+
+import argparse
+import datetime
+import glob
+import json
+import multiprocessing
+import os
+from collections import Counter
+from functools import partial
+
+from security_manager import parseDueDate
+from task_journal import TaskJournal
+
+
+def findUserFiles(folder="users"):
+    '''Every user file in the folder'''
+    return sorted(glob.glob(os.path.join(folder, "*.csv")))
+
+
+def summariseUserFile(path, today=None, overdue_priorities=None, cache=None):
+    '''Counts and overdue tasks for one user file (runs in a worker process unless a TaskCache is used)'''
+    today = today or datetime.date.today()
+    user = os.path.splitext(os.path.basename(path))[0]
+    summary = {
+        "user": user,
+        "tasks": 0,
+        "status": Counter(),
+        "priority": Counter(),
+        "category": Counter(),
+        "overdue": [],
+        "error": None
+    }
+    try:
+        if cache is not None:
+            tasks = cache.get(path) # only parsed again if the file changed
+        else:
+            tasks = TaskJournal(path).read() # readFromFile plus the user's journal
+    except (OSError, KeyError, ValueError, UnicodeDecodeError) as error:
+        summary["error"] = f"{type(error).__name__}: {error}"
+        return summary
+
+    overdue_by_date = {} # due date string -> is it overdue, most dates repeat a lot
+    for task in tasks:
+        status = task.getStatus()
+        priority = task.getPriority()
+        summary["status"][status] += 1
+        summary["priority"][priority] += 1
+        summary["category"][task.getCategory()] += 1
+
+        if status == "Completed" or (overdue_priorities and priority not in overdue_priorities):
+            continue
+        due_date = task.getDueDate()
+        if due_date not in overdue_by_date:
+            parsed = parseDueDate(due_date)
+            overdue_by_date[due_date] = parsed is not None and parsed < today
+        if overdue_by_date[due_date]:
+            summary["overdue"].append({
+                "user": user,
+                "task": task.getTaskDetails(),
+                "due_date": due_date,
+                "priority": priority,
+                "category": task.getCategory(),
+                "status": status
+            })
+    summary["tasks"] = len(tasks)
+    return summary
+
+
+class FleetReport:
+    def __init__(self):
+        self.users = 0
+        self.tasks = 0
+        self.status = Counter()
+        self.priority = Counter()
+        self.category = Counter()
+        self.overdue = [] # overdue task dicts from every user
+        self.errors = {} # user -> error message for files that couldn't be read
+
+    def merge(self, summary):
+        '''Add one user's summary to the totals'''
+        if summary["error"]:
+            self.errors[summary["user"]] = summary["error"]
+            return
+        self.users += 1
+        self.tasks += summary["tasks"]
+        self.status.update(summary["status"])
+        self.priority.update(summary["priority"])
+        self.category.update(summary["category"])
+        self.overdue.extend(summary["overdue"])
+
+    def overdueByCategory(self, priority=None):
+        '''Overdue tasks grouped by category, optionally only for one priority'''
+        grouped = {}
+        for task in self.overdue:
+            if priority is None or task["priority"] == priority:
+                grouped.setdefault(task["category"], []).append(task)
+        return grouped
+
+    def toDict(self):
+        return {
+            "users": self.users,
+            "tasks": self.tasks,
+            "status": dict(self.status),
+            "priority": dict(self.priority),
+            "category": dict(self.category),
+            "overdue": self.overdue,
+            "errors": self.errors
+        }
+
+
+def fleetReport(folder="users", workers=None, today=None, overdue_priorities=None, chunksize=8, cache=None):
+    '''Parse every user file in parallel and merge the summaries into a FleetReport
+
+    With a TaskCache the files are summarised in this process instead, so a
+    program making reports over and over only parses the files that changed.
+    '''
+    files = findUserFiles(folder)
+    summarise = partial(
+        summariseUserFile, today=today or datetime.date.today(), overdue_priorities=overdue_priorities, cache=cache
+    )
+    report = FleetReport()
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(files) <= 1 or cache is not None:
+        for path in files:
+            report.merge(summarise(path))
+        return report
+
+    with multiprocessing.Pool(workers) as pool:
+        # merge each summary as soon as any worker finishes it
+        for summary in pool.imap_unordered(summarise, files, chunksize=chunksize):
+            report.merge(summary)
+    return report
+
+
+def printReport(report, priority=None):
+    '''Print the totals and the overdue tasks per category'''
+    print(f"Users: {report.users}   Tasks: {report.tasks}")
+    for title, counts in (("Status", report.status), ("Priority", report.priority), ("Category", report.category)):
+        print(f"\n{title}:")
+        for value, count in counts.most_common():
+            print(f"  {value:<15} {count:>10}")
+
+    heading = f"priority {priority} " if priority else ""
+    print(f"\nOverdue {heading}tasks by category:")
+    for category, tasks in sorted(report.overdueByCategory(priority).items()):
+        print(f"\n  {category} ({len(tasks)})")
+        for task in sorted(tasks, key=lambda t: (t["user"], t["task"])):
+            print(f"    {task['user']:<20} {task['task']:<30} {task['due_date']:<12} {task['status']}")
+
+    for user, error in sorted(report.errors.items()):
+        print(f"\nCould not read {user}: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report on the tasks of every user")
+    parser.add_argument("folder", nargs="?", default="users")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--priority", default=None, help="only list overdue tasks with this priority")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    priorities = [args.priority] if args.priority else None
+    report = fleetReport(args.folder, workers=args.workers, overdue_priorities=priorities)
+    if args.json:
+        print(json.dumps(report.toDict(), indent=2))
+    else:
+        printReport(report, args.priority)
+
+
+if __name__ == "__main__":
+    main()